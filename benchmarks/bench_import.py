@@ -0,0 +1,90 @@
+"""
+Import time of each elopackage module and the heavy dependencies it loads
+
+Every module is imported in a fresh interpreter, so worker processes and command line runs see the same cost. Exits
+with status 1 if a module of the core rating path loads a dependency it should not (e.g matplotlib pulled back in by
+player.py), so it can gate CI:
+
+    python benchmarks/bench_import.py --repeat 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Modules and the dependencies they are allowed to load at import time
+ALLOWED = {
+    'elopackage.player': set(),
+    'elopackage.elo': {'numpy'},
+    'elopackage.kernels': {'numpy'},
+    'elopackage.predict': {'numpy'},
+    'elopackage.engine': {'numpy'},
+    'elopackage.results': {'numpy', 'pandas'},
+    'elopackage.preprocess': {'numpy', 'pandas'},
+    'elopackage.batch': {'numpy', 'pandas', 'scipy'},
+    'elopackage.plotting': {'numpy', 'matplotlib', 'scipy'},
+}
+HEAVY = ['numpy', 'pandas', 'scipy', 'matplotlib', 'numba']
+# Optional accelerators - allowed wherever installed, along with whatever they import themselves (numba loads scipy)
+OPTIONAL = ['numba']
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+'''
+
+
+def import_module(module):
+    """
+    Import module in a fresh interpreter
+
+    :return: dict - seconds, loaded (heavy dependencies in sys.modules afterwards)
+    """
+    out = subprocess.run([sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY)],
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out)
+
+
+def optional_dependencies():
+    """
+    :return: dict - {optional accelerator: heavy dependencies it loads} for the installed ones
+    """
+    deps = {}
+    for module in OPTIONAL:
+        try:
+            deps[module] = set(import_module(module)['loaded'])
+        except subprocess.CalledProcessError:
+            pass
+    return deps
+
+
+def measure(module, repeat, optional=None):
+    runs = [import_module(module) for _ in range(repeat)]
+    loaded = runs[0]['loaded']
+    allowed = set(ALLOWED[module])
+    for accelerator, deps in (optional or {}).items():
+        if accelerator in loaded:
+            allowed |= deps
+    return {'module': module,
+            'seconds': statistics.median(r['seconds'] for r in runs),
+            'loaded': loaded,
+            'unexpected': sorted(set(loaded) - allowed)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3, help='fresh interpreters per module - the median is kept')
+    parser.add_argument('--modules', nargs='+', default=list(ALLOWED), choices=list(ALLOWED))
+    args = parser.parse_args()
+
+    optional = optional_dependencies()
+    results = [measure(m, args.repeat, optional) for m in args.modules]
+    print(json.dumps(results, indent=2))
+    failed = [r['module'] for r in results if r['unexpected']]
+    if failed:
+        print(f'Unexpected heavy imports in: {", ".join(failed)}', file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,153 @@
+"""
+Per-stage benchmarks of the rating pipeline on synthetic results
+
+Writes one JSON record per (stage, rows) with wall time, throughput and peak traced memory, so runs can be compared
+across versions:
+
+    python benchmarks/bench_pipeline.py --rows 10000 100000 1000000 --output bench.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import warnings
+from pathlib import Path
+import numpy as np
+from synthetic import generate_results
+from elopackage.elo import Elo
+from elopackage.kernels import HAVE_NUMBA
+from elopackage.player import Player
+from elopackage.preprocess import preprocess_tour_data
+from elopackage.results import ResultsTable
+
+
+def measure(func, n_items, memory=True):
+    """
+    Time func, then run it again under tracemalloc for peak memory
+
+    :return: dict - seconds, items_per_second, peak_bytes (None if memory is False)
+    """
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {'seconds': seconds, 'items_per_second': n_items / seconds if seconds else None, 'peak_bytes': peak}
+
+
+def add_players_to_dict_loop(df):
+    results = ResultsTable(df)
+    for row in results.df.itertuples():
+        results.add_players_to_dict(row, results.df)
+
+
+def register_players(df):
+    ResultsTable(df).register_players()
+
+
+def check_prediction(df, engine, **kwargs):
+    return lambda: ResultsTable(df).check_prediction(engine=engine, **kwargs)
+
+
+def elo_stages(n):
+    """
+    Scalar Elo calls on n player pairs, and the batch equivalents
+    """
+    rng = np.random.default_rng(0)
+    rating_a, rating_b = rng.normal(1500, 300, n), rng.normal(1500, 300, n)
+    sd_a, sd_b = np.full(n, 400.0), np.full(n, 400.0)
+    mov = rng.integers(1, 40, n)
+    players_a = [Player('a', 1, rating=r) for r in rating_a.tolist()]
+    players_b = [Player('b', 2, rating=r) for r in rating_b.tolist()]
+    elo = Elo('bench')
+
+    return {
+        'elo.expected': lambda: [elo.expected(a, b) for a, b in zip(players_a, players_b)],
+        'elo.expected_rv': lambda: [elo.expected_rv(a, b) for a, b in zip(players_a, players_b)],
+        'elo.rating_diff_mov': lambda: [elo.rating_diff_mov(a, b, 1, mov=m, auto_corr_val=2200)
+                                        for a, b, m in zip(players_a, players_b, mov.tolist())],
+        'elo.expected_batch': lambda: elo.expected_batch(rating_a - rating_b, sd_a),
+        'elo.expected_rv_batch': lambda: elo.expected_rv_batch(rating_a - rating_b, sd_a, sd_b),
+        'elo.rating_diff_mov_batch': lambda: elo.rating_diff_mov_batch(rating_a - rating_b, sd_a, 180, 1, mov=mov,
+                                                                       auto_corr_val=2200),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).parent).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(rows, max_python_rows, memory):
+    records = []
+
+    def record(stage, n, func):
+        result = {'stage': stage, 'rows': n, **measure(func, n, memory=memory)}
+        records.append(result)
+        print(json.dumps(result))
+
+    for n_rows in rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_file = Path(tmp) / 'results.csv'
+            generate_results(n_rows).to_csv(csv_file, index=False)
+            record('preprocess_tour_data', n_rows, lambda: preprocess_tour_data(csv_file))
+            df = preprocess_tour_data(csv_file)
+        n = len(df)
+
+        record('ResultsTable.register_players', n, lambda: register_players(df))
+        record('check_prediction[array]', n, check_prediction(df, 'array', backend='python'))
+        record('check_prediction[array,mov,acf]', n, check_prediction(df, 'array', backend='python', mov=True,
+                                                                      acf=2200))
+        if HAVE_NUMBA:
+            # Compile outside the timed runs
+            check_prediction(df.head(10), 'array', backend='numba')()
+            record('check_prediction[numba]', n, check_prediction(df, 'array', backend='numba'))
+            record('check_prediction[numba,mov,acf]', n, check_prediction(df, 'array', backend='numba', mov=True,
+                                                                          acf=2200))
+
+        # The row by row stages take minutes beyond ~10^5 rows
+        if n_rows <= max_python_rows:
+            record('ResultsTable.add_players_to_dict', n, lambda: add_players_to_dict_loop(df))
+            record('check_prediction[python]', n, check_prediction(df, 'python'))
+            record('check_prediction[python,mov,acf]', n, check_prediction(df, 'python', mov=True, acf=2200))
+
+        n_elo = min(n_rows, max_python_rows)
+        for stage, func in elo_stages(n_elo).items():
+            record(stage, n_elo, func)
+
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000], help='synthetic results sizes')
+    parser.add_argument('--max-python-rows', type=int, default=100000,
+                        help='largest size to run the row by row stages and scalar Elo calls at')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc peak memory runs')
+    parser.add_argument('--output', help='JSON file to write results to')
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')
+    records = run(args.rows, args.max_python_rows, memory=not args.no_memory)
+    report = {'git_revision': git_revision(), 'python': platform.python_version(), 'machine': platform.machine(),
+              'results': records}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
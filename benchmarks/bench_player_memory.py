@@ -0,0 +1,72 @@
+"""
+Memory per Player and allocations per doubles match
+
+Compares the slotted Player with an equivalent Player that has a __dict__, and Team with
+ResultsTable.convert_double_to_single.
+
+    python benchmarks/bench_player_memory.py
+"""
+import json
+import time
+import tracemalloc
+from elopackage.history import RatingHistory
+from elopackage.player import Player, Team
+from elopackage.results import ResultsTable
+from elopackage.elo import Elo
+
+
+class DictPlayer(Player):
+    # A subclass without __slots__ gets a __dict__ - the Player layout before __slots__ was added
+    pass
+
+
+def bytes_per_player(cls, n=100000):
+    history = RatingHistory(capacity=n)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    players = [cls(f'name_{i}', float(i), history=history) for i in range(n)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Names are allocated either way
+    names = sum(len(p.name) + 49 for p in players)
+    return (after - before - names) / n
+
+
+def bytes_per_doubles_match(combine, n=100000):
+    """
+    Memory allocated for the two teams of a doubles match - the teams are kept alive so they can be measured
+    """
+    players = [Player(f'name_{i}', float(i), rating=1500 + i) for i in range(4)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    teams = [(combine(players[0], players[1]), combine(players[2], players[3])) for _ in range(n)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(teams)
+
+
+def seconds_per_doubles_match(combine, n=100000):
+    elo = Elo('bench')
+    players = [Player(f'name_{i}', float(i), rating=1500 + i) for i in range(4)]
+    start = time.perf_counter()
+    for _ in range(n):
+        team_w = combine(players[0], players[1])
+        team_l = combine(players[2], players[3])
+        elo.rating_diff_mov(team_w, team_l, 1)
+        elo.expected(team_w, team_l)
+    return (time.perf_counter() - start) / n
+
+
+if __name__ == '__main__':
+    results = {
+        'bytes_per_player': {'slots': bytes_per_player(Player), 'dict': bytes_per_player(DictPlayer)},
+        'bytes_per_doubles_match': {
+            'team': bytes_per_doubles_match(Team),
+            'convert_double_to_single': bytes_per_doubles_match(ResultsTable.convert_double_to_single),
+        },
+        'seconds_per_doubles_match': {
+            'team': seconds_per_doubles_match(Team),
+            'convert_double_to_single': seconds_per_doubles_match(ResultsTable.convert_double_to_single),
+        },
+    }
+    print(json.dumps(results, indent=2))
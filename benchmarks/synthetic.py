@@ -0,0 +1,99 @@
+"""
+Synthetic tournament results with the same schema as player_tournament_results_2019_downsampled_15_prc.csv
+
+    python benchmarks/synthetic.py 1000000 results_1m.csv
+"""
+import sys
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['losing_team_p1', 'losing_team_p1_tsid', 'losing_team_p2', 'losing_team_p2_tsid', 'losing_team_scores',
+           'match_date', 'winning_team_p1', 'winning_team_p1_tsid', 'winning_team_p2', 'winning_team_p2_tsid',
+           'winning_team_scores']
+JUNK_DATES = ['Suffolk One', 'TBC', '']
+
+
+def _format_scores(games):
+    """
+    "[21, 15]" strings from a (n, max games) array padded with -1
+    """
+    out = []
+    for row in games.tolist():
+        out.append('[' + ', '.join(str(g) for g in row if g >= 0) + ']')
+    return out
+
+
+def _scores(rng, n):
+    """
+    Winning and losing score strings for n matches of one to three games
+    """
+    n_games = rng.choice([1, 2, 3], size=n, p=[0.26, 0.55, 0.19])
+    loser_pts = rng.integers(0, 20, size=(n, 3))
+    winner_pts = np.maximum(21, loser_pts + 2)
+
+    # In three game matches the winner drops one of the first two games
+    lost_game = rng.integers(0, 2, size=n)
+    swap = (n_games == 3)[:, None] & (np.arange(3)[None, :] == lost_game[:, None])
+    winner_pts, loser_pts = np.where(swap, loser_pts, winner_pts), np.where(swap, winner_pts, loser_pts)
+
+    unplayed = np.arange(3)[None, :] >= n_games[:, None]
+    winner_pts[unplayed] = -1
+    loser_pts[unplayed] = -1
+    return _format_scores(winner_pts), _format_scores(loser_pts)
+
+
+def generate_results(n_rows, n_players=None, doubles_frac=0.35, missing_tsid_frac=0.01, na_score_frac=0.02,
+                     junk_date_frac=0.05, start_date='2015-01-03', seed=0):
+    """
+    Generate raw tournament results
+
+    :param n_rows: int - number of matches
+    :param n_players: int - size of the player pool. Default n_rows // 10, at least 100
+    :param doubles_frac: float - fraction of doubles matches
+    :param missing_tsid_frac: float - fraction of player slots without a tsid
+    :param na_score_frac: float - fraction of matches with an 'n/a' score
+    :param junk_date_frac: float - fraction of matches with an unparseable match_date
+    :param start_date: str - date of the first tournament - one tournament day per week follows
+    :param seed: int - random seed
+    :return: pd DataFrame - raw results, as read from the CSV
+    """
+    rng = np.random.default_rng(seed)
+    if n_players is None:
+        n_players = max(100, n_rows // 10)
+
+    tsids = rng.choice(np.arange(1000000, 1000000 + 10 * n_players), size=n_players, replace=False).astype(float)
+    names = np.array([f'Player {i}' for i in range(n_players)], dtype=object)
+
+    # Stronger players play more often
+    weights = rng.pareto(2.0, size=n_players) + 1
+    weights /= weights.sum()
+    slots = rng.choice(n_players, size=(n_rows, 4), p=weights)
+
+    doubles = rng.random(n_rows) < doubles_frac
+    df = pd.DataFrame(index=np.arange(n_rows))
+    for j, col in enumerate(['winning_team_p1', 'winning_team_p2', 'losing_team_p1', 'losing_team_p2']):
+        present = doubles if col.endswith('p2') else np.ones(n_rows, dtype=bool)
+        tsid = np.where(present, tsids[slots[:, j]], np.nan)
+        tsid[present & (rng.random(n_rows) < missing_tsid_frac)] = np.nan
+        name = names[slots[:, j]].copy()
+        name[~present] = np.nan
+        df[col] = name
+        df[f'{col}_tsid'] = tsid
+
+    df['winning_team_scores'], df['losing_team_scores'] = _scores(rng, n_rows)
+    na = rng.random(n_rows) < na_score_frac
+    df.loc[na, 'winning_team_scores'] = 'n/a'
+    df.loc[na, 'losing_team_scores'] = 'n/a'
+
+    n_days = max(1, n_rows // 500)
+    days = pd.Timestamp(start_date) + pd.to_timedelta(7 * rng.integers(0, n_days, size=n_rows), unit='D')
+    match_date = pd.Series(days.strftime('%a %d/%m/%Y'), dtype=object)
+    junk = rng.random(n_rows) < junk_date_frac
+    match_date[junk] = rng.choice(JUNK_DATES, size=junk.sum())
+    df['match_date'] = match_date.to_numpy()
+
+    return df[COLUMNS]
+
+
+if __name__ == '__main__':
+    generate_results(int(sys.argv[1])).to_csv(sys.argv[2], index=False)
@@ -14,7 +14,9 @@ def setup_package():
     package_dir={'':'src'},
     zip_safe=False,
     include_package_data = True,
-    install_requires=['numpy','pandas','scipy','matplotlib','pathlib']
+    install_requires=['numpy','pandas','scipy','matplotlib','pathlib'],
+    extras_require={'numba': ['numba']},
+    entry_points={'console_scripts': ['elo-rate=elopackage.cli:main']}
   )
 
 if __name__ == "__main__":
@@ -0,0 +1,136 @@
+import math
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+from scipy.sparse import csr_matrix
+from scipy.special import expit
+from elopackage.player import DEFAULT_RATING, DEFAULT_SD
+from elopackage.schedule import empty_output
+
+LN10 = math.log(10)
+
+
+class BradleyTerry:
+    def __init__(self, prior_sd=DEFAULT_SD, half_life=None, tol=1e-8, max_iter=1000):
+        """
+        Ratings fitted to the whole results table at once - maximum likelihood of the logistic model of Elo.expected
+
+        Team A beats team B with probability 1 / (1 + 10 ** ((rb - ra) / sd)), doubles teams rated as the mean of
+        their players with an sd of sqrt(2) * p1 sd as in Team. Unlike the sequential replay the fit doesn't depend on
+        match order. A normal prior centred on the starting rating keeps ratings of unbeaten (or winless) players
+        finite. The negative log likelihood is minimised with L-BFGS over a sparse match x player incidence matrix.
+
+        :param prior_sd: float - sd of the prior on every rating - smaller values shrink ratings towards 1500.
+                         Default 400
+        :param half_life: float - days after which a match counts half as much, weighting recent form. Default None -
+                          every match counts the same
+        :param tol: float - convergence tolerance of L-BFGS. Default 1e-8
+        :param max_iter: int - maximum L-BFGS iterations. Default 1000
+        """
+        self.prior_sd = prior_sd
+        self.half_life = half_life
+        self.tol = tol
+        self.max_iter = max_iter
+        # scipy OptimizeResult of the last fit
+        self.result = None
+
+    def weights(self, dates):
+        """
+        Weight of each match - halving every half_life days before the latest match. Matches without a date are
+        weighted as the oldest match
+
+        :param dates: np.array (datetime64) - match date per match, or None
+        :return: np.array (float64) or None - None if every match counts the same
+        """
+        if self.half_life is None or dates is None:
+            return None
+        dates = np.asarray(dates, dtype='datetime64[ns]')
+        dated = ~np.isnat(dates)
+        if not dated.any():
+            return None
+        age = (dates[dated].max() - dates) / np.timedelta64(1, 'D')
+        age[~dated] = age[dated].max()
+        return 0.5 ** (age / self.half_life)
+
+    @staticmethod
+    def incidence(matches, n_players):
+        """
+        Sparse (n_matches, n_players) matrix whose product with the ratings is team A rating - team B rating
+
+        :param matches: MatchArrays
+        :param n_players: int
+        :return: scipy.sparse.csr_matrix
+        """
+        players = np.asarray(matches.players)
+        share = np.where(matches.doubles, 0.5, 1.0)
+        coef = np.column_stack([share, share, -share, -share])
+        present = players >= 0
+        rows = np.broadcast_to(np.arange(len(players))[:, None], players.shape)
+        return csr_matrix((coef[present], (rows[present], players[present])), shape=(len(players), n_players))
+
+    def fit(self, engine, matches, dates=None):
+        """
+        Fit engine.ratings to matches in place and score every match with the fitted ratings
+
+        engine.sds set the scale of each match as in Elo.expected. engine.match_counts become the number of matches
+        of each player.
+
+        :param engine: RatingEngine - every player of matches interned
+        :param matches: MatchArrays
+        :param dates: np.array (datetime64) - match date per match, for half_life. Default None
+        :return: dict - same per match arrays as RatingEngine.replay - rating_prior holds the fitted ratings,
+                 pts_chg is 0 and hist_len_min / hist_len_max count matches played up to and including each match
+        """
+        n_players = len(engine.ratings)
+        x = self.incidence(matches, n_players)
+        xt = x.T.tocsr()
+        scale = LN10 / _team_sds(engine, matches)
+        weights = self.weights(dates)
+        if weights is None:
+            weights = np.ones(len(matches))
+        precision = 1 / self.prior_sd ** 2
+
+        def objective(r):
+            z = scale * (x @ r)
+            loss = weights @ np.logaddexp(0, -z) + precision * (r @ r) / 2
+            grad = -(xt @ (weights * expit(-z) * scale)) + precision * r
+            return loss, grad
+
+        # Ratings relative to the starting rating, the mean of the prior
+        start = np.asarray(engine.ratings, dtype=np.float64) - DEFAULT_RATING
+        self.result = minimize(objective, start, jac=True, method='L-BFGS-B',
+                               options={'maxiter': self.max_iter, 'ftol': self.tol, 'gtol': self.tol})
+        engine.ratings = self.result.x + DEFAULT_RATING
+        return self._output(engine, matches)
+
+    @staticmethod
+    def _output(engine, matches):
+        n = len(matches)
+        players = np.asarray(matches.players)
+        present = players >= 0
+        output = empty_output(n)
+        rating_diff = BradleyTerry.incidence(matches, len(engine.ratings)) @ engine.ratings
+        with np.errstate(over='ignore'):
+            output['prediction'] = 1 / (1 + 10 ** (-rating_diff / _team_sds(engine, matches)))
+        output['rating_prior'] = np.where(present, engine.ratings[np.maximum(players, 0)], np.nan)
+        output['pts_chg'] = np.where(present, 0.0, np.nan)
+        output['processed'][:] = True
+
+        # Matches played so far by each player, counting this one - as the sequential replay's history lengths
+        flat = players[present]
+        played = pd.Series(flat).groupby(flat).cumcount().to_numpy() + 1
+        hist = np.zeros(players.shape, dtype=np.int64)
+        hist[present] = played
+        big = np.iinfo(np.int64).max
+        output['hist_len_min'] = np.where(present, hist, big).min(axis=1)
+        output['hist_len_max'] = hist.max(axis=1)
+        engine.match_counts = np.bincount(flat, minlength=len(engine.ratings)).astype(np.int64)
+        return output
+
+
+def _team_sds(engine, matches):
+    """
+    sd of team A per match, as in Elo.expected - doubles teams use sqrt(2) * p1 sd as in Team
+    """
+    sds = np.asarray(engine.sds, dtype=np.float64)[matches.players[:, 0]]
+    return np.where(matches.doubles, np.sqrt(sds ** 2 + sds ** 2), sds)
@@ -0,0 +1,243 @@
+import argparse
+import queue
+import sys
+import threading
+import time
+import warnings
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from elopackage.engine import RatingEngine
+from elopackage.evaluation import LEGACY_COLUMNS
+from elopackage.metrics import MetricSet
+from elopackage.preprocess import iter_preprocess_tour_data
+from elopackage.registry import TSID_COLS
+
+# Match columns written to predictions.csv ahead of the evaluation columns
+MATCH_COLUMNS = ['match_date_dt'] + TSID_COLS + ['Doubles', 'pts_diff']
+# Queue item marking the end of a stage's output
+DONE = object()
+
+
+class Progress:
+    def __init__(self, stream=sys.stderr, every=1.0):
+        """
+        Rows read, rated, skipped and written so far, with throughput - reported at most once every every seconds
+
+        Rows are skipped when they have no match date, or are dated on or before the high water mark of the state
+        the run continued from - see RatingEngine.ingest
+
+        :param stream: file like - None reports nothing. Default sys.stderr
+        :param every: float - seconds between reports. Default 1
+        """
+        self.stream = stream
+        self.every = every
+        self.start = time.perf_counter()
+        self.last = -np.inf
+        self.rows_read = 0
+        self.rows_rated = 0
+        self.rows_written = 0
+        self.rows_undated = 0
+        self.rows_already_rated = 0
+        self.lock = threading.Lock()
+
+    def add(self, stage, n):
+        with self.lock:
+            setattr(self, f'rows_{stage}', getattr(self, f'rows_{stage}') + n)
+
+    def report(self, message=None, force=False):
+        now = time.perf_counter()
+        if self.stream is None or (not force and now - self.last < self.every):
+            return
+        self.last = now
+        seconds = now - self.start
+        line = (f'[{seconds:8.1f}s] read {self.rows_read:,} rated {self.rows_rated:,} written {self.rows_written:,}'
+                f' rows - {self.rows_rated / max(seconds, 1e-9):,.0f} matches/s')
+        if self.rows_undated or self.rows_already_rated:
+            line += f' - skipped {self.rows_undated:,} undated, {self.rows_already_rated:,} already rated'
+        print(line if message is None else f'{line} - {message}', file=self.stream, flush=True)
+
+
+def _put(out, item, stop):
+    """
+    Put item on a bounded queue, blocking while it is full - False if the pipeline stopped first
+    """
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _read(paths, chunksize, out, progress, stop):
+    """
+    Reader stage - preprocess each results file in date sorted chunks onto out
+    """
+    try:
+        for path in paths:
+            for batch in iter_preprocess_tour_data(path, chunksize=chunksize):
+                # Unparsed dates were already reported as a warning - not carried with every chunk
+                batch.attrs = {}
+                progress.add('read', len(batch))
+                if not _put(out, (path, batch), stop):
+                    return
+        _put(out, DONE, stop)
+    except BaseException as e:
+        _put(out, e, stop)
+
+
+def _write(predictions_path, items, progress, errors, failed):
+    """
+    Writer stage - append rated chunks to predictions_path - on error the error is kept in errors and failed is set
+    """
+    header = True
+    try:
+        while True:
+            item = items.get()
+            if item is DONE:
+                return
+            columns = [c for c in MATCH_COLUMNS if c in item.columns] + LEGACY_COLUMNS
+            item[columns].to_csv(predictions_path, mode='w' if header else 'a', header=header, index=False)
+            header = False
+            progress.add('written', len(item))
+    except BaseException as e:
+        errors.append(e)
+        failed.set()
+        # Keep draining so the rating stage never blocks on a full queue
+        while items.get() is not DONE:
+            pass
+
+
+def run(paths, output_dir, state=None, kfactor=None, sd=None, mov=False, acf=None, chunksize=100000, queue_size=4,
+        cold_start_threshold=0, save_state=True, progress=None):
+    """
+    Rate results files in a pipeline of three threads - reading, rating and writing overlap
+
+    A reader thread preprocesses the files in date sorted chunks (see iter_preprocess_tour_data), the calling thread
+    rates each chunk on a RatingEngine (see RatingEngine.ingest) and a writer thread appends the predictions to
+    disk. The stages are joined by bounded queues of queue_size chunks, so memory stays bounded when one stage is
+    slower than the others. Files are rated in the order given; with a state file only matches dated after its high
+    water mark are rated. Matches without a date are not rated, as in RatingEngine.ingest - they couldn't be told
+    apart from already rated matches on the next run. Skipped rows are counted in progress and reported with a
+    warning.
+
+    Writes to output_dir:
+        predictions.csv - per match: date, tsids, Doubles, pts_diff and the evaluation columns of check_prediction
+        ratings.csv - final rating of every player, highest first
+        metrics.csv - Brier score, log loss and accuracy - overall and by match type
+        state.npz - rating state, to continue from with state= on the next run (if save_state)
+
+    :param paths: list - results CSV files, each date sorted on its own
+    :param output_dir: str or Path - created if missing
+    :param state: str or Path - RatingEngine state file to start from - see RatingEngine.save. Default None - all
+                  players start at 1500
+    :param kfactor: float - kfactor of new players
+    :param sd: float - sd of new players
+    :param mov: bool - Whether to include MOV in rating diff. Default to False
+    :param acf: int - Auto-corr-factor in rating diff - typically ~ 1500-2500. Default to None
+    :param chunksize: int - rows per chunk. Default 100,000
+    :param queue_size: int - chunks held between two stages. Default 4
+    :param cold_start_threshold: int - minimum rating history length of all players for a prediction to be scored.
+                                 Default 0
+    :param save_state: bool - write state.npz. Default True
+    :param progress: Progress - Default None - reports to stderr
+    :return: MetricSet
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    progress = Progress() if progress is None else progress
+    engine = RatingEngine() if state is None else RatingEngine.load(state)
+    # Chunks of one file can end part way through a date - every chunk is compared to the starting mark
+    since = engine.high_water_mark
+    metrics = MetricSet(cold_start_threshold=cold_start_threshold, by=['match_type'])
+
+    read_queue = queue.Queue(maxsize=queue_size)
+    write_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+    writer_failed = threading.Event()
+    reader = threading.Thread(target=_read, args=(paths, chunksize, read_queue, progress, stop), daemon=True,
+                              name='elo-read')
+    writer = threading.Thread(target=_write, daemon=True, name='elo-write',
+                              args=(output_dir / 'predictions.csv', write_queue, progress, errors, writer_failed))
+    reader.start()
+    writer.start()
+
+    try:
+        current = None
+        while True:
+            item = read_queue.get()
+            if item is DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            # Fail fast rather than rate the rest of the files with nowhere to write them
+            if errors:
+                raise errors[0]
+            path, batch = item
+            if path != current:
+                current = path
+                progress.report(f'rating {path}', force=True)
+            dates = batch['match_date_dt']
+            undated = int(dates.isna().sum())
+            already_rated = 0 if np.isnat(since) else int((dates <= since).sum())
+            rated = engine.ingest(batch, kfactor=kfactor, sd=sd, mov=mov, acf=acf, since=since, metrics=metrics)
+            progress.add('rated', len(rated))
+            progress.add('undated', undated)
+            progress.add('already_rated', already_rated)
+            if not _put(write_queue, rated, writer_failed):
+                raise errors[0]
+            progress.report()
+    finally:
+        stop.set()
+        write_queue.put(DONE)
+        writer.join()
+    if errors:
+        raise errors[0]
+
+    ratings = pd.DataFrame({'tsid': engine.tsids, 'name': engine.names, 'rating': engine.ratings,
+                            'match_count': engine.match_counts})
+    ratings.sort_values('rating', ascending=False, kind='stable').to_csv(output_dir / 'ratings.csv', index=False)
+    metrics.results().to_csv(output_dir / 'metrics.csv')
+    if save_state:
+        engine.save(output_dir / 'state.npz')
+    if progress.rows_undated:
+        warnings.warn(f'{progress.rows_undated} matches without a match date were not rated')
+    progress.report('done', force=True)
+    return metrics
+
+
+def main(argv=None):
+    """
+    Console entry point - elo-rate results.csv [more.csv ...] -o output_dir
+    """
+    parser = argparse.ArgumentParser(prog='elo-rate', description='Rate tournament results files and write final '
+                                     'ratings, per match predictions and metrics')
+    parser.add_argument('paths', nargs='+', help='results CSV files, rated in the order given')
+    parser.add_argument('-o', '--output-dir', default='.', help='directory to write outputs to. Default .')
+    parser.add_argument('--state', help='rating state to continue from, e.g state.npz of an earlier run')
+    parser.add_argument('--no-save-state', dest='save_state', action='store_false', help="don't write state.npz")
+    parser.add_argument('--kfactor', type=float, help='kfactor of new players')
+    parser.add_argument('--sd', type=float, help='sd of new players')
+    parser.add_argument('--mov', action='store_true', help='include margin of victory in rating changes')
+    parser.add_argument('--acf', type=float, help='auto-correlation factor of the margin of victory, e.g 530')
+    parser.add_argument('--cold-start-threshold', type=int, default=0,
+                        help='minimum rating history length of all players for a prediction to be scored')
+    parser.add_argument('--chunksize', type=int, default=100000, help='rows per chunk. Default 100000')
+    parser.add_argument('--queue-size', type=int, default=4, help='chunks buffered between stages. Default 4')
+    parser.add_argument('-q', '--quiet', action='store_true', help='no progress reports')
+    args = parser.parse_args(argv)
+
+    progress = Progress(stream=None if args.quiet else sys.stderr)
+    metrics = run(args.paths, args.output_dir, state=args.state, kfactor=args.kfactor, sd=args.sd, mov=args.mov,
+                  acf=args.acf, chunksize=args.chunksize, queue_size=args.queue_size,
+                  cold_start_threshold=args.cold_start_threshold, save_state=args.save_state, progress=progress)
+    if not args.quiet:
+        print(metrics.results().to_string(), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
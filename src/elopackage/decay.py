@@ -0,0 +1,108 @@
+import math
+import numpy as np
+import pandas as pd
+from elopackage.player import DEFAULT_SD
+
+DAY = pd.Timedelta(days=1)
+
+
+class InactivityDecay:
+    def __init__(self, growth=15.0, shrink=0.5, sd_min=None, sd_max=None):
+        """
+        Rating uncertainty which grows while a player is inactive and shrinks as they play
+
+        Nothing is maintained per day. A player's sd is caught up only when they next play (catch_up) or when it is
+        read for a date (effective_sd): sqrt(sd ** 2 + growth ** 2 * days inactive), capped at sd_max. After each
+        match the sd keeps a shrink fraction of its excess over sd_min. A player who never misses a day keeps an sd
+        of sd_min.
+
+        :param growth: float - sd growth per square root of a day inactive. Default 15 - 400 grows to ~500 over a year
+        :param shrink: float - fraction of the sd above sd_min kept after a match. Default 0.5
+        :param sd_min: float - sd matches shrink towards. Default None - the sd passed to check_prediction, or 400
+        :param sd_max: float - largest effective sd. Default None - 1.5 * sd_min
+        """
+        self.growth = growth
+        self.shrink = shrink
+        self.sd_min = sd_min
+        self.sd_max = sd_max
+
+    def bounds(self):
+        """
+        :return: tuple (float) - sd_min, sd_max with defaults resolved
+        """
+        sd_min = DEFAULT_SD if self.sd_min is None else self.sd_min
+        return sd_min, 1.5 * sd_min if self.sd_max is None else self.sd_max
+
+    def for_sd(self, sd):
+        """
+        Copy with sd_min, if left to default, set to a base sd, e.g the sd passed to check_prediction
+
+        :param sd: float - base sd of the players
+        :return: InactivityDecay
+        """
+        return InactivityDecay(self.growth, self.shrink, sd if self.sd_min is None else self.sd_min, self.sd_max)
+
+    def effective_sd(self, sd, last_played, date):
+        """
+        sd after the inactivity between last_played and date - vectorized over arrays of players
+
+        :param sd: float or np.array (float) - sd at last_played
+        :param last_played: datetime like or np.array (datetime64) - date of the player's last match, None / NaT if
+                            they have not played
+        :param date: datetime like - date to evaluate at
+        :return: float or np.array (float)
+        """
+        if np.ndim(sd) == 0:
+            if last_played is None or pd.isna(last_played) or pd.isna(date):
+                return sd
+            days = max((pd.Timestamp(date) - pd.Timestamp(last_played)) / DAY, 0)
+            return min(math.sqrt(sd ** 2 + self.growth ** 2 * days), max(sd, self.bounds()[1]))
+
+        sd = np.asarray(sd, dtype=np.float64)
+        last_played = np.asarray(last_played, dtype='datetime64[ns]')
+        days = (np.datetime64(pd.Timestamp(date), 'ns') - last_played) / np.timedelta64(1, 'D')
+        days = np.where(np.isnan(days), 0, np.maximum(days, 0))
+        return np.minimum(np.sqrt(sd ** 2 + self.growth ** 2 * days), np.maximum(sd, self.bounds()[1]))
+
+    def player_sd(self, player, date):
+        """
+        Effective sd of a Player or Team on date, without changing it
+
+        :param player: Player or Team object
+        :param date: datetime like
+        :return: float
+        """
+        if hasattr(player, 'p1'):
+            # Team sd follows p1 - see Team.sd
+            sd = self.player_sd(player.p1, date)
+            return math.sqrt(sd ** 2 + sd ** 2)
+        return self.effective_sd(player.sd, player.last_played, date)
+
+    def catch_up(self, players, date):
+        """
+        Apply each player's inactivity up to date to their sd - called as they appear in a match
+
+        :param players: list of Player objects
+        :param date: datetime like - match date. Players are left unchanged if it is missing
+        :return: None
+        """
+        if pd.isna(date):
+            return
+        for p in dict.fromkeys(players):
+            p.sd = self.effective_sd(p.sd, p.last_played, date)
+            p.last_played = date
+
+    def played(self, players, date):
+        """
+        Shrink each player's sd after a match
+
+        :param players: list of Player objects
+        :param date: datetime like - match date
+        :return: None
+        """
+        sd_min = self.bounds()[0]
+        for p in dict.fromkeys(players):
+            if p.sd > sd_min:
+                p.sd = sd_min + (p.sd - sd_min) * self.shrink
+            if not pd.isna(date):
+                p.last_played = date
@@ -1,55 +1,140 @@
 import numpy as np
-import scipy.stats as stats
 import math
 
 
 class Elo:
-    def __init__(self, title):
+    def __init__(self, title, decay=None):
+        '''
+        args:
+            title - str
+            decay - InactivityDecay - sd growth with inactivity, applied when a date is passed to expected /
+                    expected_rv / rating_diff_mov. Default None
+        '''
         self.title = title
+        self.decay = decay
 
-    def expected(self, player_a, player_b):
+    def sd(self, player, date=None):
+        '''
+        sd of a player on date - their effective sd after inactivity if there is a decay model, else player.sd
+
+        args:
+            player - Player or Team object
+            date - datetime like - Default None
+
+        returns:
+            sd - float
+        '''
+        if self.decay is None or date is None:
+            return player.sd
+        return self.decay.player_sd(player, date)
+
+    def expected(self, player_a, player_b, date=None):
         '''
         Calculated the expected probability of Player A beating Player B
 
         args:
-            player_a - Player object
-            player_b - Player object
+            player_a - Player or Team object
+            player_b - Player or Team object
+            date - datetime like - date of the match, for effective sds under a decay model. Default None
 
         returns:
             expected_prob - float - probability of Player A winning (0 -> 1)
 
         '''
-        expected_prob = 1 / (1 + 10 ** ((player_b.rating - player_a.rating) / player_a.sd))
+        expected_prob = 1 / (1 + 10 ** ((player_b.rating - player_a.rating) / self.sd(player_a, date)))
         return expected_prob
 
-    def expected_rv(self, player_a, player_b):
+    def expected_rv(self, player_a, player_b, date=None):
         '''
         Calculated the expected probability of Player A beating Player B
 
         args:
-            player_a - Player object
-            player_b - Player object
+            player_a - Player or Team object
+            player_b - Player or Team object
+            date - datetime like - date of the match, for effective sds under a decay model. Default None
 
         returns:
             expected_prob - float - probability of Player A winning (0 -> 1)
 
         '''
         new_mean = player_a.rating - player_b.rating
-        new_std = math.sqrt(player_a.sd ** 2 + player_b.sd ** 2)
-        return 1 - stats.norm(loc=new_mean, scale=new_std).cdf(0)
+        new_std = math.sqrt(self.sd(player_a, date) ** 2 + self.sd(player_b, date) ** 2)
+        # P(X > 0) for X ~ N(new_mean, new_std) == standard normal CDF at new_mean / new_std
+        # scipy is imported on first use, so the logistic rating path loads NumPy only
+        from scipy.special import ndtr
+        return float(ndtr(new_mean / new_std))
+
+    @staticmethod
+    def expected_batch(rating_diff, sd):
+        '''
+        Vectorized Elo.expected over arrays of matches
+
+        args:
+            rating_diff - array like (float) - Player A rating - Player B rating
+            sd - array like (float) or float - sd of Player A
+
+        returns:
+            expected_prob - np.array (float) - probability of Player A winning (0 -> 1)
+
+        '''
+        rating_diff = np.asarray(rating_diff, dtype=np.float64)
+        with np.errstate(over='ignore'):
+            return 1 / (1 + np.power(10.0, -rating_diff / sd))
+
+    @staticmethod
+    def expected_rv_batch(rating_diff, sd_a, sd_b):
+        '''
+        Vectorized Elo.expected_rv over arrays of matches
+
+        args:
+            rating_diff - array like (float) - Player A rating - Player B rating
+            sd_a - array like (float) or float - sd of Player A
+            sd_b - array like (float) or float - sd of Player B
+
+        returns:
+            expected_prob - np.array (float) - probability of Player A winning (0 -> 1)
+
+        '''
+        rating_diff = np.asarray(rating_diff, dtype=np.float64)
+        new_std = np.sqrt(np.square(sd_a) + np.square(sd_b))
+        from scipy.special import ndtr
+        return ndtr(rating_diff / new_std)
 
-    def rating_diff_mov(self, player_a, player_b, score, mov=None, auto_corr_val=None):
+    def expected_table(self, idx_a, idx_b, ratings, sds, rv=False):
+        '''
+        Probability of Player A beating Player B for arrays of player indices into a rating table
+
+        args:
+            idx_a - array like (int) - index of Player A in ratings/sds
+            idx_b - array like (int) - index of Player B in ratings/sds
+            ratings - np.array (float) - rating per player index e.g RatingEngine.ratings
+            sds - np.array (float) - sd per player index e.g RatingEngine.sds
+            rv - bool - use the normal CDF (expected_rv) rather than the logistic function (expected). Default False
+
+        returns:
+            expected_prob - np.array (float) - probability of Player A winning (0 -> 1)
+
+        '''
+        ratings = np.asarray(ratings, dtype=np.float64)
+        sds = np.asarray(sds, dtype=np.float64)
+        rating_diff = ratings[idx_a] - ratings[idx_b]
+        if rv:
+            return self.expected_rv_batch(rating_diff, sds[idx_a], sds[idx_b])
+        return self.expected_batch(rating_diff, sds[idx_a])
+
+    def rating_diff_mov(self, player_a, player_b, score, mov=None, auto_corr_val=None, date=None):
         """
         Calculate the change in rating of Player A, based on score:
 
         Score: Limited choice of: 1 - Win, 0 - Lose
 
         args:
-            palyer_a - elo object
-            palyer_b - elo object
+            palyer_a - Player or Team object
+            palyer_b - Player or Team object
             score - int - 0, 1
             mov - int - margin of victory - Default None
             auto_cor_val - int - factor by which to adjust scores to prevent auto-correlation typically ~2200. Default None
+            date - datetime like - date of the match, for effective sds under a decay model. Default None
 
         returns:
             player_a_rate_diff - float - value to adjust rating
@@ -79,6 +164,43 @@ class Elo:
         else:
             mov_kfactor = 1
 
-        player_a_rate_diff = (score - self.expected(player_a, player_b)) * player_a.kfactor * mov_kfactor * auto_corr
+        player_a_rate_diff = ((score - self.expected(player_a, player_b, date)) * player_a.kfactor * mov_kfactor *
+                              auto_corr)
         return player_a_rate_diff
 
+    def rating_diff_mov_batch(self, rating_diff, sd, kfactor, score, mov=None, auto_corr_val=None):
+        """
+        Vectorized Elo.rating_diff_mov - change in rating of Player A for arrays of matches
+
+        args:
+            rating_diff - array like (float) - Player A rating - Player B rating
+            sd - array like (float) or float - sd of Player A
+            kfactor - array like (float) or float - kfactor of Player A
+            score - array like (int) or int - 0, 1
+            mov - array like (float) - margin of victory - Default None. Zero margins are treated as no MOV, as in
+                  rating_diff_mov
+            auto_corr_val - float - factor by which to adjust scores to prevent auto-correlation. Default None
+
+        returns:
+            player_a_rate_diff - np.array (float) - value to adjust rating
+        """
+        score = np.asarray(score)
+        if not np.isin(score, [0, 1]).all():
+            raise ValueError("Allowable value for score are: 1=Win, 0=Lose")
+
+        rating_diff = np.asarray(rating_diff, dtype=np.float64)
+
+        if auto_corr_val:
+            with np.errstate(over='ignore'):
+                auto_corr = 2 / (1 + np.exp(rating_diff / auto_corr_val))
+        else:
+            auto_corr = 1
+
+        if mov is not None:
+            mov = np.abs(np.asarray(mov, dtype=np.float64))
+            mov_kfactor = np.where(mov != 0, np.log(1 + mov), 1)
+        else:
+            mov_kfactor = 1
+
+        player_a_rate_diff = (score - self.expected_batch(rating_diff, sd)) * kfactor * mov_kfactor * auto_corr
+        return player_a_rate_diff
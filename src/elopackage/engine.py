@@ -0,0 +1,423 @@
+import math
+import numpy as np
+from elopackage import kernels
+from elopackage.evaluation import EvalOutput, LEGACY_COLUMNS
+from elopackage.player import DEFAULT_RATING, DEFAULT_KFACTOR, DEFAULT_SD
+from elopackage.registry import build_player_registry, DUMMY_TSID_START
+from elopackage.schedule import empty_output, replay_sharded
+
+
+class MatchArrays:
+    def __init__(self, players, doubles, pts_diff):
+        """
+        Pre-extracted match columns used by the array engine
+
+        :param players: np.array (int64) - shape (n_matches, 4) - player index per role (p1w, p2w, p1l, p2l), -1 if empty
+        :param doubles: np.array (bool) - doubles flag per match
+        :param pts_diff: np.array (float64) - margin of victory per match
+        """
+        self.players = players
+        self.doubles = doubles
+        self.pts_diff = pts_diff
+
+    def __len__(self):
+        return len(self.doubles)
+
+
+class RatingEngine:
+    def __init__(self):
+        """
+        Player state held in contiguous arrays, indexed by an interned player index
+        """
+        self.tsids = []
+        self.names = []
+        self.index = {}
+        self.ratings = np.empty(0, dtype=np.float64)
+        self.sds = np.empty(0, dtype=np.float64)
+        self.kfactors = np.empty(0, dtype=np.float64)
+        self.match_counts = np.empty(0, dtype=np.int64)
+        self.dummy_tsid = DUMMY_TSID_START
+        # Date of the latest match applied - np.datetime64('NaT') if none
+        self.high_water_mark = np.datetime64('NaT', 'ns')
+
+    def __len__(self):
+        return len(self.tsids)
+
+    def load_players(self, player_dict):
+        """
+        Intern every Player in player_dict and copy its state into the engine arrays
+
+        :param player_dict: dict - {tsid: Player}
+        :return: None
+        """
+        self.tsids = list(player_dict.keys())
+        self.index = {t: i for i, t in enumerate(self.tsids)}
+        players = list(player_dict.values())
+        self.names = [p.name for p in players]
+        self.ratings = np.array([p.rating for p in players], dtype=np.float64)
+        self.sds = np.array([p.sd for p in players], dtype=np.float64)
+        self.kfactors = np.array([p.kfactor for p in players], dtype=np.float64)
+        self.match_counts = np.array([p.match_count for p in players], dtype=np.int64)
+
+    def add_players(self, new_players, kfactor=None, sd=None):
+        """
+        Intern new players with a starting rating of 1500
+
+        :param new_players: list - (tsid, name) per new player
+        :param kfactor: float - kfactor to assign to new players - Player defaults apply if None
+        :param sd: float - sd to assign to new players - Player defaults apply if None
+        :return: None
+        """
+        n = len(new_players)
+        for t, name in new_players:
+            self.index[t] = len(self.tsids)
+            self.tsids.append(t)
+            self.names.append(name)
+
+        # Same truthiness as Player.__init__
+        self.ratings = np.concatenate([self.ratings, np.full(n, DEFAULT_RATING, dtype=np.float64)])
+        self.sds = np.concatenate([self.sds, np.full(n, sd if sd else DEFAULT_SD, dtype=np.float64)])
+        self.kfactors = np.concatenate([self.kfactors, np.full(n, kfactor if kfactor else DEFAULT_KFACTOR,
+                                                               dtype=np.float64)])
+        self.match_counts = np.concatenate([self.match_counts, np.zeros(n, dtype=np.int64)])
+
+    def save(self, path):
+        """
+        Save the full rating state to a binary .npz file
+
+        :param path: str or Path - file to write
+        :return: None
+        """
+        names = np.array(['' if n != n else n for n in self.names], dtype=str)
+        np.savez(path,
+                 tsids=np.array(self.tsids, dtype=np.float64),
+                 names=names,
+                 ratings=self.ratings,
+                 sds=self.sds,
+                 kfactors=self.kfactors,
+                 match_counts=self.match_counts,
+                 dummy_tsid=np.array(self.dummy_tsid, dtype=np.int64),
+                 high_water_mark=np.array(self.high_water_mark, dtype='datetime64[ns]'))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a rating state saved with save
+
+        :param path: str or Path - .npz file
+        :return: RatingEngine
+        """
+        engine = cls()
+        with np.load(path, allow_pickle=False) as state:
+            engine.tsids = [int(t) if t >= DUMMY_TSID_START else t for t in state['tsids'].tolist()]
+            engine.names = [n if n else np.nan for n in state['names'].tolist()]
+            engine.index = {t: i for i, t in enumerate(engine.tsids)}
+            engine.ratings = state['ratings']
+            engine.sds = state['sds']
+            engine.kfactors = state['kfactors']
+            engine.match_counts = state['match_counts']
+            engine.dummy_tsid = int(state['dummy_tsid'])
+            engine.high_water_mark = state['high_water_mark'][()]
+        return engine
+
+    def ingest(self, df, kfactor=None, sd=None, mov=False, acf=None, since=None, metrics=None):
+        """
+        Apply only the matches after the high water mark on top of the current rating state
+
+        Matches without a match_date_dt are ignored. The high water mark moves to the latest match date applied.
+        When one date sorted table is ingested in several batches, pass the high water mark from before the first
+        batch as since, so matches on the date a batch ends at are not dropped from the next batch.
+
+        :param df: pd DataFrame - preprocessed results sorted by match_date_dt - see preprocess_tour_data
+        :param kfactor: float - kfactor to assign to new players
+        :param sd: float - sd to assign to new players
+        :param mov: bool - Whether to include MOV in rating diff. Default to False
+        :param acf: int - Auto-corr-factor in rating diff - typically ~ 1500-2500. Default to None
+        :param since: np.datetime64 - apply matches dated after since. Default None - the high water mark
+        :param metrics: MetricSet - scores the ingested matches. Default None
+        :return: pd DataFrame - the ingested matches with the same evaluation columns as check_prediction
+        """
+        import pandas as pd
+        dates = df['match_date_dt'].to_numpy(dtype='datetime64[ns]')
+        since = self.high_water_mark if since is None else np.datetime64(since, 'ns')
+        if np.isnat(since):
+            new_rows = ~np.isnat(dates)
+        else:
+            new_rows = dates > since
+        df = df[new_rows].reset_index(drop=True)
+
+        registry = build_player_registry(df, self.tsids, self.dummy_tsid)
+        self.dummy_tsid = registry.dummy_tsid
+        self.add_players(registry.new_players(), kfactor=kfactor, sd=sd)
+
+        matches = MatchArrays(registry.players, df['Doubles'].to_numpy(dtype=bool),
+                              df['pts_diff'].to_numpy(dtype=np.float64))
+        output = self.replay(matches, mov=mov, acf=acf)
+        if len(df):
+            latest = dates[new_rows].max()
+            if np.isnat(self.high_water_mark) or latest > self.high_water_mark:
+                self.high_water_mark = latest
+        if metrics is not None:
+            metrics.update_batch(output['prediction'], output['hist_len_min'], doubles=matches.doubles,
+                                 columns=df, dates=dates[new_rows], processed=output['processed'])
+
+        df_new_cols = self.eval_cols(matches, output, np.array(self.names, dtype=object))
+        return pd.concat([df, df_new_cols], axis=1)
+
+    def replay(self, matches, mov=False, acf=None, backend='auto'):
+        """
+        Sequentially apply every match in matches to the engine ratings
+
+        Reproduces ResultsTable.singles_match_update / doubles_match_update, Elo.rating_diff_mov and
+        ResultsTable.divide_doubles_points. Matches which raise an OverflowError are skipped, as in the original
+        loop.
+
+        :param matches: MatchArrays
+        :param mov: bool - Whether to include MOV in rating diff. Default to False
+        :param acf: int - Auto-corr-factor in rating diff - typically ~ 1500-2500. Default to None
+        :param backend: str - 'numba' runs the loop compiled (requires numba), 'python' in the interpreter, 'waves'
+                        applies waves of player-disjoint matches as batched array operations and 'parallel' also
+                        shards player communities across processes - see replay_parallel. Default 'auto' - numba if
+                        installed, else python. Only numba reaches 10-100x the Player loop - python is ~7-11x
+        :return: dict - per match arrays: prediction, rating_prior (n, 4), pts_chg (n, 4), hist_len_min,
+                        hist_len_max and processed (bool)
+        """
+        if backend == 'auto':
+            backend = 'numba' if kernels.HAVE_NUMBA else 'python'
+        if backend == 'numba':
+            return self._replay_compiled(matches, mov=mov, acf=acf)
+        if backend in ('waves', 'parallel'):
+            return self.replay_parallel(matches, mov=mov, acf=acf, max_workers=1 if backend == 'waves' else None)
+        if backend != 'python':
+            raise ValueError(f"backend must be 'auto', 'numba', 'python', 'waves' or 'parallel', not {backend!r}")
+
+        n = len(matches)
+        # Python lists index far faster than numpy scalars in a sequential loop
+        ratings = self.ratings.tolist()
+        sds = self.sds.tolist()
+        kfactors = self.kfactors.tolist()
+        counts = self.match_counts.tolist()
+
+        w1s, w2s, l1s, l2s = (matches.players[:, j].tolist() for j in range(4))
+        doubles = matches.doubles.tolist()
+        pts_diff = matches.pts_diff.tolist()
+
+        prediction = [math.nan] * n
+        # Flat (n * 4) lists in role order p1w, p2w, p1l, p2l
+        prior = [math.nan] * (4 * n)
+        pts_chg = [math.nan] * (4 * n)
+        hist_min = [0] * n
+        hist_max = [0] * n
+        processed = [False] * n
+        split_points = self._split_points
+
+        for i in range(n):
+            a, c = w1s[i], l1s[i]
+            try:
+                if mov and pts_diff[i]:
+                    mov_kfactor = math.log(1 + abs(pts_diff[i]))
+                else:
+                    mov_kfactor = 1
+
+                if doubles[i]:
+                    b, d = w2s[i], l2s[i]
+                    rw = (ratings[a] + ratings[b]) / 2
+                    rl = (ratings[c] + ratings[d]) / 2
+                    sdw = math.sqrt(sds[a] ** 2 + sds[a] ** 2)
+                    sdl = math.sqrt(sds[c] ** 2 + sds[c] ** 2)
+                    # Doubles teams always have the default kfactor - see Team
+                    kw = kl = DEFAULT_KFACTOR
+                else:
+                    rw, rl = ratings[a], ratings[c]
+                    sdw, sdl = sds[a], sds[c]
+                    kw, kl = kfactors[a], kfactors[c]
+
+                expected_w = 1 / (1 + 10 ** ((rl - rw) / sdw))
+                expected_l = 1 / (1 + 10 ** ((rw - rl) / sdl))
+
+                if acf:
+                    auto_w = 2 / (1 + math.exp((rw - rl) / acf))
+                    auto_l = 2 / (1 + math.exp((rl - rw) / acf))
+                else:
+                    auto_w = auto_l = 1
+
+                winner_pts_change = (1 - expected_w) * kw * mov_kfactor * auto_w
+                loser_pts_change = (0 - expected_l) * kl * mov_kfactor * auto_l
+
+                if doubles[i]:
+                    p1w_pts, p2w_pts = split_points(ratings[a], ratings[b], sds[a], winner_pts_change)
+                    p1l_pts, p2l_pts = split_points(ratings[c], ratings[d], sds[c], loser_pts_change)
+
+            except OverflowError:
+                continue
+
+            prediction[i] = expected_w
+            processed[i] = True
+            j = 4 * i
+
+            if doubles[i]:
+                hist = (counts[a], counts[b], counts[c], counts[d])
+                hist_min[i] = min(hist) + 1
+                hist_max[i] = max(hist) + 1
+                prior[j:j + 4] = ratings[a], ratings[b], ratings[c], ratings[d]
+                pts_chg[j:j + 4] = p1w_pts, p2w_pts, p1l_pts, p2l_pts
+                ratings[a] += p1w_pts
+                ratings[b] += p2w_pts
+                ratings[c] += p1l_pts
+                ratings[d] += p2l_pts
+                counts[b] += 1
+                counts[d] += 1
+            else:
+                ha, hc = counts[a], counts[c]
+                hist_min[i] = (ha if ha < hc else hc) + 1
+                hist_max[i] = (ha if ha > hc else hc) + 1
+                prior[j] = ratings[a]
+                prior[j + 2] = ratings[c]
+                pts_chg[j] = winner_pts_change
+                pts_chg[j + 2] = loser_pts_change
+                ratings[a] += winner_pts_change
+                ratings[c] += loser_pts_change
+            counts[a] += 1
+            counts[c] += 1
+
+        self.ratings = np.array(ratings, dtype=np.float64)
+        self.match_counts = np.array(counts, dtype=np.int64)
+
+        return {'prediction': np.array(prediction, dtype=np.float64),
+                'rating_prior': np.array(prior, dtype=np.float64).reshape(n, 4),
+                'pts_chg': np.array(pts_chg, dtype=np.float64).reshape(n, 4),
+                'hist_len_min': np.array(hist_min, dtype=np.int64),
+                'hist_len_max': np.array(hist_max, dtype=np.int64),
+                'processed': np.array(processed, dtype=bool)}
+
+    def replay_parallel(self, matches, mov=False, acf=None, max_workers=None):
+        """
+        replay scheduled for batching and multiple cores, with the same results as the sequential replay
+
+        Matches are split into waves of player-disjoint matches, each applied as one batched array operation, and
+        disconnected player communities are replayed in separate worker processes - see schedule.
+
+        :param matches: MatchArrays
+        :param mov: bool - Whether to include MOV in rating diff. Default to False
+        :param acf: int - Auto-corr-factor in rating diff - typically ~ 1500-2500. Default to None
+        :param max_workers: int - number of worker processes. 1 replays in this process. Default os.cpu_count()
+        :return: dict - same per match arrays as replay
+        """
+        ratings = self.ratings.astype(np.float64)
+        counts = self.match_counts.astype(np.int64)
+        output = replay_sharded(ratings, np.asarray(self.sds, dtype=np.float64),
+                                np.asarray(self.kfactors, dtype=np.float64), counts,
+                                np.asarray(matches.players, dtype=np.int64), np.asarray(matches.doubles, dtype=bool),
+                                np.asarray(matches.pts_diff, dtype=np.float64), mov=mov, acf=acf,
+                                max_workers=max_workers)
+        self.ratings = ratings
+        self.match_counts = counts
+        return output
+
+    def _replay_compiled(self, matches, mov=False, acf=None):
+        """
+        replay with the loop compiled by numba - see kernels.replay_loop
+        """
+        if kernels.compiled_replay_loop is None:
+            raise ImportError("backend='numba' requires numba - pip install numba")
+
+        n = len(matches)
+        ratings = self.ratings.astype(np.float64)
+        counts = self.match_counts.astype(np.int64)
+        output = empty_output(n)
+
+        kernels.compiled_replay_loop(ratings, np.asarray(self.sds, dtype=np.float64),
+                                     np.asarray(self.kfactors, dtype=np.float64), counts,
+                                     np.asarray(matches.players, dtype=np.int64),
+                                     np.asarray(matches.doubles, dtype=np.bool_),
+                                     np.asarray(matches.pts_diff, dtype=np.float64), bool(mov),
+                                     float(acf) if acf else 0.0, float(DEFAULT_KFACTOR), output['prediction'],
+                                     output['rating_prior'], output['pts_chg'], output['hist_len_min'],
+                                     output['hist_len_max'], output['processed'])
+
+        self.ratings = ratings
+        self.match_counts = counts
+        return output
+
+    @staticmethod
+    def _split_points(r1, r2, sd1, pts_to_share):
+        """
+        Array engine equivalent of ResultsTable.divide_doubles_points
+        """
+        try:
+            p1w_prc = 1 / (1 + math.exp((r1 - r2) / sd1))
+        except OverflowError:
+            p1w_prc = 0
+        return p1w_prc * pts_to_share, (1 - p1w_prc) * pts_to_share
+
+    def count_split_overflows(self, matches, replay_output):
+        """
+        Number of doubles points splits in the replay which overflowed in _split_points
+
+        Worked out after the replay from the recorded prior ratings so the replay loop doesn't pay for counting.
+
+        :param matches: MatchArrays
+        :param replay_output: dict - returned by replay
+        :return: int
+        """
+        doubles = replay_output['processed'] & matches.doubles
+        prior = replay_output['rating_prior'][doubles]
+        players = matches.players[doubles]
+        # math.exp overflows above log(max float)
+        limit = math.log(np.finfo(np.float64).max)
+        winners = (prior[:, 0] - prior[:, 1]) / self.sds[players[:, 0]] > limit
+        losers = (prior[:, 2] - prior[:, 3]) / self.sds[players[:, 2]] > limit
+        return int(winners.sum() + losers.sum())
+
+    def eval_cols(self, matches, replay_output, names):
+        """
+        Build the same evaluation columns as ResultsTable.append_to_eval_cols from replay output
+
+        :param matches: MatchArrays
+        :param replay_output: dict - returned by replay
+        :param names: np.array (object) - player name per interned index
+        :return: pd DataFrame
+        """
+        return EvalOutput(matches, replay_output, names).to_frame(LEGACY_COLUMNS)
+
+    def sync_players(self, player_dict, replay_output, matches, dates=None):
+        """
+        Write engine ratings and rating histories back onto the Player objects in player_dict
+
+        :param player_dict: dict - {tsid: Player}
+        :param replay_output: dict - returned by replay
+        :param matches: MatchArrays
+        :param dates: np.array (datetime64) - match date per match, recorded in shared RatingHistory stores. Default
+                      None
+        :return: None
+        """
+        processed = replay_output['processed']
+        post = replay_output['rating_prior'] + replay_output['pts_chg']
+        idx = matches.players[processed].ravel()
+        ratings = post[processed].ravel()
+        match_idx = np.repeat(np.flatnonzero(processed), 4)
+        filled = idx >= 0
+        idx, ratings, match_idx = idx[filled], ratings[filled], match_idx[filled]
+
+        players = [player_dict[t] for t in self.tsids]
+        for p, rating, match_count in zip(players, self.ratings.tolist(), self.match_counts.tolist()):
+            p.rating = rating
+            p.match_count = match_count
+
+        # Players sharing a RatingHistory store are written in one bulk append, in match order
+        history_idx = np.array([-1 if p.history is None else p.history_idx for p in players], dtype=np.int64)
+        stores = {id(p.history): p.history for p in players if p.history is not None}
+        for store in stores.values():
+            in_store = np.array([p.history is store for p in players], dtype=bool)[idx]
+            store.extend(history_idx[idx[in_store]], match_idx[in_store], ratings[in_store],
+                         None if dates is None else dates[match_idx[in_store]])
+
+        unbound = history_idx[idx] < 0
+        if unbound.any():
+            idx, ratings = idx[unbound], ratings[unbound]
+            # Stable sort keeps match order within each player
+            order = np.argsort(idx, kind='stable')
+            idx, ratings = idx[order], ratings[order]
+            starts = np.searchsorted(idx, np.arange(len(self.tsids) + 1))
+            for i in np.unique(idx).tolist():
+                players[i].rating_history.extend(ratings[starts[i]:starts[i + 1]].tolist())
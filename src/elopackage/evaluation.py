@@ -0,0 +1,120 @@
+import numpy as np
+from elopackage.metrics import brier_score
+from elopackage.registry import ROLES
+
+# Columns of ResultsTable.append_to_eval_cols - player names as objects
+LEGACY_COLUMNS = (['prediction', 'actual'] + [f'{p}_name' for p in ROLES] + [f'{p}_rating_prior' for p in ROLES] +
+                  [f'{p}_rating_post' for p in ROLES] + ['min_rating_hist_len'])
+# Typed equivalent - int32 player indices instead of names
+TYPED_COLUMNS = (['prediction', 'actual'] + [f'{p}_idx' for p in ROLES] + [f'{p}_rating_prior' for p in ROLES] +
+                 [f'{p}_rating_post' for p in ROLES] + ['min_rating_hist_len'])
+
+
+class EvalOutput:
+    def __init__(self, matches, replay_output, names=None, float_dtype=np.float64):
+        """
+        Evaluation columns of a replay, built lazily and only for the columns and rows asked for
+
+        Holds the replay output arrays rather than per match Python objects. Columns are those of LEGACY_COLUMNS and
+        TYPED_COLUMNS.
+
+        :param matches: MatchArrays
+        :param replay_output: dict - returned by RatingEngine.replay
+        :param names: np.array (object) - player name per interned index, for the {role}_name columns. Default None
+        :param float_dtype: np.dtype - dtype of prediction and rating columns, e.g np.float32. Default np.float64
+        """
+        self.matches = matches
+        self.output = replay_output
+        self.names = names
+        self.float_dtype = float_dtype
+
+    def __len__(self):
+        return len(self.matches)
+
+    def column(self, name, rows=slice(None)):
+        """
+        Build one evaluation column
+
+        actual and min_rating_hist_len are int64, or float64 with nan for unprocessed matches when there are any -
+        as in append_to_eval_cols. {role}_idx is int32 and -1 where the role is empty or the match was unprocessed.
+
+        :param name: str - column from LEGACY_COLUMNS or TYPED_COLUMNS
+        :param rows: slice or np.array - rows to build. Default all
+        :return: np.array
+        """
+        processed = self.output['processed'][rows]
+        all_processed = self.output['processed'].all()
+
+        if name == 'prediction':
+            return self.output['prediction'][rows].astype(self.float_dtype, copy=False)
+        if name == 'actual':
+            return np.ones(len(processed), dtype=np.int64) if all_processed else np.where(processed, 1.0, np.nan)
+        if name == 'min_rating_hist_len':
+            # append_to_eval_cols records the longest rating history of the match participants
+            hist = self.output['hist_len_max'][rows]
+            return hist if all_processed else np.where(processed, hist, np.nan)
+
+        role, _, field = name.partition('_')
+        if role not in ROLES:
+            raise KeyError(name)
+        j = ROLES.index(role)
+
+        if field == 'idx' or field == 'name':
+            idx = self.matches.players[rows, j]
+            filled = processed & (idx >= 0)
+            if field == 'idx':
+                return np.where(filled, idx, -1).astype(np.int32)
+            if self.names is None:
+                raise ValueError(f'{name} needs player names - pass names to EvalOutput')
+            col = np.full(len(idx), np.nan, dtype=object)
+            col[filled] = self.names[idx[filled]]
+            return col
+
+        prior = self.output['rating_prior'][rows, j]
+        if field == 'rating_prior':
+            return prior.astype(self.float_dtype, copy=False)
+        if field == 'rating_post':
+            return (prior + self.output['pts_chg'][rows, j]).astype(self.float_dtype, copy=False)
+        raise KeyError(name)
+
+    def to_frame(self, columns=TYPED_COLUMNS, rows=slice(None)):
+        """
+        :param columns: list (str) - columns to materialise. Default TYPED_COLUMNS
+        :param rows: slice or np.array - rows to build. Default all
+        :return: pd DataFrame
+        """
+        import pandas as pd
+        return pd.DataFrame({c: self.column(c, rows) for c in columns})
+
+    def iter_chunks(self, columns=TYPED_COLUMNS, chunksize=100000):
+        """
+        Yield the evaluation columns chunksize rows at a time, so only one chunk is materialised at once
+
+        :return: generator of pd DataFrame
+        """
+        import pandas as pd
+        for start in range(0, len(self), chunksize):
+            chunk = self.to_frame(columns, slice(start, start + chunksize))
+            chunk.index = pd.RangeIndex(start, start + len(chunk))
+            yield chunk
+
+    def to_csv(self, path, columns=TYPED_COLUMNS, chunksize=100000):
+        """
+        Stream the evaluation columns to a CSV file chunk by chunk
+
+        :param path: str or Path - file to write
+        :return: None
+        """
+        with open(path, 'w', newline='') as f:
+            for i, chunk in enumerate(self.iter_chunks(columns, chunksize)):
+                chunk.to_csv(f, header=i == 0, index=False)
+
+    def briers_score(self, cold_start_threshold=0):
+        """
+        Brier score of the processed predictions whose players all have at least cold_start_threshold matches in
+        their rating history - as returned by check_prediction
+
+        :return: float
+        """
+        scored = self.output['processed'] & (self.output['hist_len_min'] >= cold_start_threshold)
+        return brier_score(self.output['prediction'][scored])
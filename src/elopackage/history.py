@@ -0,0 +1,283 @@
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+COLUMNS = {'player_idx': np.int32, 'match_idx': np.int64, 'rating': np.float64, 'match_date': np.int64}
+# match_date of starting ratings and matches without a date - NaT as int64 nanoseconds
+NAT = np.iinfo(np.int64).min
+
+
+class RatingHistory:
+    def __init__(self, capacity=1024):
+        """
+        Append-only columnar store of every rating held by every player
+
+        Each entry is (player_idx, match_idx, rating, match_date). A player's first entry is their starting rating with
+        match_idx -1 and no match_date. Per player offsets are only built when a history is read, and the as-of-date
+        index only when a point in time is queried - see as_of_index.
+
+        :param capacity: int - number of entries to allocate up front - grows by doubling
+        """
+        self.n = 0
+        self.n_players = 0
+        self.path = None
+        self._columns = {c: np.empty(capacity, dtype=dtype) for c, dtype in COLUMNS.items()}
+        self._order = None
+        self._starts = None
+        self._as_of_index = None
+
+    def __len__(self):
+        return self.n
+
+    def add_player(self, rating):
+        """
+        Register a player and record their starting rating
+
+        :param rating: float - starting rating
+        :return: int - player_idx of the new player
+        """
+        player_idx = self.n_players
+        self.n_players += 1
+        self.append(player_idx, -1, rating)
+        return player_idx
+
+    def append(self, player_idx, match_idx, rating, match_date=None):
+        """
+        Record a single rating
+
+        :param player_idx: int - from add_player
+        :param match_idx: int - position of the match in the results table, -1 if unknown
+        :param rating: float - rating after the match
+        :param match_date: datetime like, or int nanoseconds since epoch (NAT if unknown) as pre-converted for a
+                           whole table. Default None - unknown
+        :return: None
+        """
+        if self.n == len(self._columns['rating']):
+            self._grow(self.n + 1)
+        i = self.n
+        self._columns['player_idx'][i] = player_idx
+        self._columns['match_idx'][i] = match_idx
+        self._columns['rating'][i] = rating
+        self._columns['match_date'][i] = _to_ns(match_date)
+        self.n += 1
+
+    def extend(self, player_idx, match_idx, rating, match_date=None):
+        """
+        Record many ratings at once - entries for each player must be in match order
+
+        :param player_idx: np.array (int)
+        :param match_idx: np.array (int)
+        :param rating: np.array (float)
+        :param match_date: np.array (datetime64) - Default None - unknown
+        :return: None
+        """
+        k = len(rating)
+        if self.n + k > len(self._columns['rating']):
+            self._grow(self.n + k)
+        if match_date is None:
+            match_date = NAT
+        else:
+            match_date = np.asarray(match_date, dtype='datetime64[ns]').view(np.int64)
+        for c, values in zip(COLUMNS, (player_idx, match_idx, rating, match_date)):
+            self._columns[c][self.n:self.n + k] = values
+        self.n += k
+
+    def column(self, name):
+        """
+        Entries recorded so far for one of player_idx, match_idx, rating, match_date (int64 nanoseconds), in the order
+        they were recorded
+        """
+        return self._columns[name][:self.n]
+
+    def _build_index(self):
+        if self._order is None or len(self._order) != self.n:
+            player_idx = self.column('player_idx')
+            self._order = np.argsort(player_idx, kind='stable')
+            self._starts = np.searchsorted(player_idx[self._order], np.arange(self.n_players + 1))
+
+    def player_entries(self, player_idx):
+        """
+        Positions of a player's entries in the store, in the order they were recorded
+
+        :param player_idx: int
+        :return: np.array (int)
+        """
+        self._build_index()
+        return self._order[self._starts[player_idx]:self._starts[player_idx + 1]]
+
+    def player_ratings(self, player_idx):
+        """
+        Rating history of a single player, starting rating first
+
+        :param player_idx: int
+        :return: np.array (float64)
+        """
+        return self.column('rating')[self.player_entries(player_idx)]
+
+    def history_lengths(self):
+        """
+        Number of entries per player_idx - equivalent to len(rating_history)
+
+        :return: np.array (int64)
+        """
+        return np.bincount(self.column('player_idx'), minlength=self.n_players)
+
+    def as_of_index(self, checkpoint_every=None):
+        """
+        Point in time index over the history recorded so far - rebuilt only when entries have been added since
+
+        :param checkpoint_every: int - entries between full snapshots. Default None - see AsOfIndex
+        :return: AsOfIndex
+        """
+        index = self._as_of_index
+        if (index is None or index.n != self.n or index.n_players != self.n_players or
+                (checkpoint_every is not None and index.checkpoint_every != checkpoint_every)):
+            index = self._as_of_index = AsOfIndex(self.column('player_idx'), self.column('match_idx'),
+                                                  self.column('rating'), self.column('match_date'), self.n_players,
+                                                  checkpoint_every=checkpoint_every)
+        return index
+
+    def ratings_as_of(self, date):
+        """
+        Rating of every player after all matches dated on or before date
+
+        :param date: datetime like
+        :return: np.array (float64) - rating per player_idx, nan for players with no dated match on or before date
+        """
+        return self.as_of_index().ratings_as_of(date)
+
+    def rating_as_of(self, player_idx, date):
+        """
+        Rating of a single player after all their matches dated on or before date
+
+        :param player_idx: int
+        :param date: datetime like
+        :return: float - nan if the player has no dated match on or before date
+        """
+        return self.as_of_index().rating_as_of(player_idx, date)
+
+    def spill(self, path):
+        """
+        Move the store to memory-mapped files in directory path, for histories too long to hold in memory
+
+        Later appends grow the files.
+
+        :param path: str or Path - directory
+        :return: None
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        capacity = len(self._columns['rating'])
+        for c, dtype in COLUMNS.items():
+            mm = self._open_memmap(c, dtype, capacity)
+            mm[:self.n] = self._columns[c][:self.n]
+            self._columns[c] = mm
+
+    def _open_memmap(self, column, dtype, capacity):
+        f = self.path / f'{column}.bin'
+        with open(f, 'ab') as fh:
+            fh.truncate(capacity * np.dtype(dtype).itemsize)
+        return np.memmap(f, dtype=dtype, mode='r+', shape=(capacity,))
+
+    def _grow(self, min_capacity):
+        capacity = max(min_capacity, 2 * len(self._columns['rating']))
+        for c, dtype in COLUMNS.items():
+            if self.path is None:
+                grown = np.empty(capacity, dtype=dtype)
+                grown[:self.n] = self._columns[c][:self.n]
+            else:
+                self._columns[c].flush()
+                grown = self._open_memmap(c, dtype, capacity)
+            self._columns[c] = grown
+
+
+def _to_ns(date):
+    # Fast path for dates converted once per table, e.g by ResultsTable.check_prediction
+    if type(date) is int:
+        return date
+    if date is None or pd.isna(date):
+        return NAT
+    return pd.Timestamp(date).as_unit('ns').value
+
+
+class AsOfIndex:
+    def __init__(self, player_idx, match_idx, rating, match_date, n_players, checkpoint_every=None):
+        """
+        Ratings as of a date - the entries of a RatingHistory sorted by match date, with a full snapshot of every
+        player's rating each checkpoint_every entries
+
+        A query binary searches the date, starts from the checkpoint before it and applies at most checkpoint_every
+        entries on top. A player's starting rating is dated at their first dated match, so players who have not played
+        by a date have no rating as of it. Matches without a date are never reached. Within a date, entries keep the
+        order they were recorded in.
+
+        :param player_idx: np.array (int)
+        :param match_idx: np.array (int) - -1 for starting ratings
+        :param rating: np.array (float)
+        :param match_date: np.array (int64) - nanoseconds, NAT if unknown
+        :param n_players: int
+        :param checkpoint_every: int - Default None - max(n_players, 4096), so snapshots take about as much memory as
+                                 the entries themselves
+        """
+        self.n = len(rating)
+        self.n_players = n_players
+        self.checkpoint_every = checkpoint_every or max(n_players, 4096)
+
+        never = np.iinfo(np.int64).max
+        player_idx = np.asarray(player_idx)
+        keys = np.where(match_date == NAT, never, match_date)
+        starting = np.asarray(match_idx) < 0
+        # Starting entries are recorded before the replay, so the stable sort keeps them ahead of the first match
+        first_match = np.full(n_players, never, dtype=np.int64)
+        np.minimum.at(first_match, player_idx[~starting], keys[~starting])
+        keys[starting] = first_match[player_idx[starting]]
+        order = np.argsort(keys, kind='stable')
+        self.dates = keys[order]
+        self.player_idx = player_idx[order]
+        self.rating = np.asarray(rating)[order]
+
+        k = self.checkpoint_every
+        self.checkpoints = np.empty((self.n // k + 1, n_players), dtype=np.float64)
+        state = np.full(n_players, np.nan)
+        for c in range(len(self.checkpoints)):
+            if c:
+                self._apply(state, (c - 1) * k, c * k)
+            self.checkpoints[c] = state
+
+        # Entries of each player in date order, for single player lookups
+        self._player_order = np.argsort(self.player_idx, kind='stable')
+        self._player_starts = np.searchsorted(self.player_idx[self._player_order], np.arange(n_players + 1))
+
+    def _apply(self, state, start, stop):
+        # Last entry of each player within [start, stop) wins
+        players = self.player_idx[start:stop][::-1]
+        players, last = np.unique(players, return_index=True)
+        state[players] = self.rating[start:stop][::-1][last]
+
+    def _position(self, date):
+        return int(np.searchsorted(self.dates, _to_ns(date), side='right'))
+
+    def ratings_as_of(self, date):
+        """
+        Rating of every player after all matches dated on or before date
+
+        :param date: datetime like
+        :return: np.array (float64) - rating per player_idx, nan for players who have not played by date
+        """
+        pos = self._position(date)
+        c = pos // self.checkpoint_every
+        state = self.checkpoints[c].copy()
+        self._apply(state, c * self.checkpoint_every, pos)
+        return state
+
+    def rating_as_of(self, player_idx, date):
+        """
+        Rating of a single player after all their matches dated on or before date
+
+        :param player_idx: int
+        :param date: datetime like
+        :return: float - nan if the player has not played by date
+        """
+        entries = self._player_order[self._player_starts[player_idx]:self._player_starts[player_idx + 1]]
+        i = int(np.searchsorted(self.dates[entries], _to_ns(date), side='right'))
+        return float(self.rating[entries[i - 1]]) if i else np.nan
@@ -0,0 +1,59 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class Instrumentation:
+    def __init__(self, sink=None):
+        """
+        Opt-in stage timers and counters for rating runs - pass to ResultsTable(df, instrumentation=...)
+
+        :param sink: callable - called as sink(kind, name, value) with kind 'timer' when a stage finishes and kind
+                     'counter' for every counter when flush is called. Default None
+        """
+        self.sink = sink
+        self.timers = defaultdict(float)
+        self.counters = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time a block of code and add it to timer name
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        """
+        Add seconds to timer name - for hot loops where a context manager per iteration is too costly
+        """
+        self.timers[name] += seconds
+        if self.sink is not None:
+            self.sink('timer', name, seconds)
+
+    def count(self, name, n=1):
+        """
+        Add n to counter name
+        """
+        self.counters[name] += n
+
+    def flush(self):
+        """
+        Send every counter to the sink
+        """
+        if self.sink is not None:
+            for name, value in self.counters.items():
+                self.sink('counter', name, value)
+
+    def report(self):
+        """
+        :return: dict - {'timers': {name: seconds}, 'counters': {name: int}}
+        """
+        return {'timers': dict(self.timers), 'counters': dict(self.counters)}
+
+    def reset(self):
+        self.timers.clear()
+        self.counters.clear()
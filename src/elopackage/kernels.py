@@ -0,0 +1,115 @@
+import math
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+HAVE_NUMBA = numba is not None
+
+# Largest exponents math.exp and 10 ** accept - beyond these they raise OverflowError where compiled code returns
+# inf instead. Checking the exponent first gives the same result either way
+EXP_LIMIT = math.log(np.finfo(np.float64).max)
+POW10_LIMIT = float(np.nextafter(math.log10(np.finfo(np.float64).max), 0))
+
+
+def replay_loop(ratings, sds, kfactors, counts, players, doubles, pts_diff, mov, acf, default_kfactor, prediction,
+                prior, pts_chg, hist_min, hist_max, processed):
+    """
+    RatingEngine.replay over NumPy arrays, written so numba can compile it - see compiled_replay_loop
+
+    ratings and counts are updated in place and the per match outputs are written into the preallocated prediction,
+    prior (n, 4), pts_chg (n, 4), hist_min, hist_max and processed arrays. Matches which would raise an OverflowError
+    in the Python replay are skipped.
+
+    :param acf: float - Auto-corr-factor, 0 for None
+    :return: None
+    """
+    for i in range(len(doubles)):
+        a = players[i, 0]
+        c = players[i, 2]
+
+        if mov and pts_diff[i] != 0:
+            mov_kfactor = math.log(1 + abs(pts_diff[i]))
+        else:
+            mov_kfactor = 1.0
+
+        if doubles[i]:
+            b = players[i, 1]
+            d = players[i, 3]
+            rw = (ratings[a] + ratings[b]) / 2
+            rl = (ratings[c] + ratings[d]) / 2
+            sdw = math.sqrt(sds[a] ** 2 + sds[a] ** 2)
+            sdl = math.sqrt(sds[c] ** 2 + sds[c] ** 2)
+            # Doubles teams always have the default kfactor - see Team
+            kw = default_kfactor
+            kl = default_kfactor
+        else:
+            b = -1
+            d = -1
+            rw = ratings[a]
+            rl = ratings[c]
+            sdw = sds[a]
+            sdl = sds[c]
+            kw = kfactors[a]
+            kl = kfactors[c]
+
+        if (rl - rw) / sdw > POW10_LIMIT or (rw - rl) / sdl > POW10_LIMIT:
+            continue
+        expected_w = 1 / (1 + 10 ** ((rl - rw) / sdw))
+        expected_l = 1 / (1 + 10 ** ((rw - rl) / sdl))
+
+        if acf != 0:
+            if (rw - rl) / acf > EXP_LIMIT or (rl - rw) / acf > EXP_LIMIT:
+                continue
+            auto_w = 2 / (1 + math.exp((rw - rl) / acf))
+            auto_l = 2 / (1 + math.exp((rl - rw) / acf))
+        else:
+            auto_w = 1.0
+            auto_l = 1.0
+
+        winner_pts_change = (1 - expected_w) * kw * mov_kfactor * auto_w
+        loser_pts_change = (0 - expected_l) * kl * mov_kfactor * auto_l
+
+        prediction[i] = expected_w
+        processed[i] = True
+
+        if doubles[i]:
+            # Split as in ResultsTable.divide_doubles_points - all points to p2 on overflow
+            x = (ratings[a] - ratings[b]) / sds[a]
+            p1w_prc = 0.0 if x > EXP_LIMIT else 1 / (1 + math.exp(x))
+            x = (ratings[c] - ratings[d]) / sds[c]
+            p1l_prc = 0.0 if x > EXP_LIMIT else 1 / (1 + math.exp(x))
+
+            hist_min[i] = min(counts[a], counts[b], counts[c], counts[d]) + 1
+            hist_max[i] = max(counts[a], counts[b], counts[c], counts[d]) + 1
+            prior[i, 0] = ratings[a]
+            prior[i, 1] = ratings[b]
+            prior[i, 2] = ratings[c]
+            prior[i, 3] = ratings[d]
+            pts_chg[i, 0] = p1w_prc * winner_pts_change
+            pts_chg[i, 1] = (1 - p1w_prc) * winner_pts_change
+            pts_chg[i, 2] = p1l_prc * loser_pts_change
+            pts_chg[i, 3] = (1 - p1l_prc) * loser_pts_change
+            ratings[a] += pts_chg[i, 0]
+            ratings[b] += pts_chg[i, 1]
+            ratings[c] += pts_chg[i, 2]
+            ratings[d] += pts_chg[i, 3]
+            counts[b] += 1
+            counts[d] += 1
+        else:
+            hist_min[i] = min(counts[a], counts[c]) + 1
+            hist_max[i] = max(counts[a], counts[c]) + 1
+            prior[i, 0] = ratings[a]
+            prior[i, 2] = ratings[c]
+            pts_chg[i, 0] = winner_pts_change
+            pts_chg[i, 2] = loser_pts_change
+            ratings[a] += winner_pts_change
+            ratings[c] += loser_pts_change
+        counts[a] += 1
+        counts[c] += 1
+
+
+# Compiled on first call and cached to disk, so later processes skip compilation
+compiled_replay_loop = numba.njit(cache=True, nogil=True)(replay_loop) if HAVE_NUMBA else None
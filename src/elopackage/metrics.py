@@ -0,0 +1,428 @@
+import abc
+import copy
+import math
+from collections import deque
+import numpy as np
+
+
+def brier_score(predictions, actual=1):
+    """
+    Mean squared error of predictions
+
+    :param predictions: array like (float) - predicted probability of the outcome
+    :param actual: array like (int) or int - outcome, 1 or 0. Default 1 - the winner is always team A
+    :return: float
+    """
+    predictions = np.asarray(predictions, dtype=np.float64)
+    return float(np.mean((predictions - actual) ** 2))
+
+
+def log_loss(predictions, actual=1):
+    """
+    Mean negative log likelihood of the outcomes - inf if a certain prediction was wrong
+
+    :return: float
+    """
+    predictions = np.asarray(predictions, dtype=np.float64)
+    with np.errstate(divide='ignore'):
+        return float(np.mean(-np.log(np.where(np.asarray(actual) == 1, predictions, 1 - predictions))))
+
+
+def accuracy(predictions, actual=1):
+    """
+    Fraction of predictions on the right side of 0.5
+
+    :return: float
+    """
+    predictions = np.asarray(predictions, dtype=np.float64)
+    return float(np.mean((predictions > 0.5) == (np.asarray(actual) == 1)))
+
+
+class Metric(abc.ABC):
+    # Name of the metric in MetricSet.results
+    name = None
+
+    def __init__(self):
+        """
+        Mean of a per prediction loss, accumulated one prediction or one batch at a time in O(1) memory
+        """
+        self.total = 0.0
+        self.n = 0
+
+    @abc.abstractmethod
+    def loss(self, prediction, actual):
+        """
+        :param prediction: float - predicted probability of the outcome
+        :param actual: int - outcome, 1 or 0
+        :return: float - loss of a single prediction
+        """
+
+    @abc.abstractmethod
+    def loss_batch(self, predictions, actual):
+        """
+        :param predictions: np.array (float)
+        :param actual: np.array (int) or int
+        :return: np.array (float) - loss of each prediction
+        """
+
+    def update(self, prediction, actual=1, date=None):
+        """
+        Add a single prediction
+
+        :param prediction: float - predicted probability of the outcome
+        :param actual: int - outcome, 1 or 0. Default 1
+        :param date: np.datetime64 - match date, used by TimeWindowed. Default None
+        :return: None
+        """
+        self.total += self.loss(prediction, actual)
+        self.n += 1
+
+    def update_batch(self, predictions, actual=1, dates=None):
+        """
+        Add many predictions at once - vectorized
+
+        :param predictions: np.array (float)
+        :param actual: np.array (int) or int. Default 1
+        :param dates: np.array (datetime64). Default None
+        :return: None
+        """
+        if len(predictions):
+            self.total += float(np.sum(self.loss_batch(np.asarray(predictions, dtype=np.float64), actual)))
+            self.n += len(predictions)
+
+    def result(self):
+        """
+        :return: float - nan if no predictions were added
+        """
+        return self.total / self.n if self.n else math.nan
+
+
+class BrierScore(Metric):
+    name = 'briers_score'
+
+    def loss(self, prediction, actual):
+        return (prediction - actual) ** 2
+
+    def loss_batch(self, predictions, actual):
+        return (predictions - actual) ** 2
+
+
+class LogLoss(Metric):
+    name = 'log_loss'
+
+    def loss(self, prediction, actual):
+        p = prediction if actual == 1 else 1 - prediction
+        return -math.log(p) if p > 0 else math.inf
+
+    def loss_batch(self, predictions, actual):
+        with np.errstate(divide='ignore'):
+            return -np.log(np.where(np.asarray(actual) == 1, predictions, 1 - predictions))
+
+
+class Accuracy(Metric):
+    name = 'accuracy'
+
+    def loss(self, prediction, actual):
+        return 1.0 if (prediction > 0.5) == (actual == 1) else 0.0
+
+    def loss_batch(self, predictions, actual):
+        return (predictions > 0.5) == (np.asarray(actual) == 1)
+
+
+class Calibration(Metric):
+    name = 'calibration'
+
+    def __init__(self, n_bins=10, symmetric=True):
+        """
+        Reliability curve - mean prediction against observed outcome rate in n_bins equal width prediction bins
+
+        :param n_bins: int - Default 10
+        :param symmetric: bool - also add each match from team B's side, 1 - prediction with the opposite outcome.
+                          The winner is always team A in the results table, so otherwise every outcome is 1.
+                          Default True
+        """
+        super().__init__()
+        self.n_bins = n_bins
+        self.symmetric = symmetric
+        self.counts = np.zeros(n_bins, dtype=np.int64)
+        self.sum_predictions = np.zeros(n_bins)
+        self.sum_actual = np.zeros(n_bins)
+
+    def loss(self, prediction, actual):
+        # Signed error - its mean is the calibration in the large, the bins of result() break it down
+        return prediction - actual
+
+    def loss_batch(self, predictions, actual):
+        return predictions - actual
+
+    def update(self, prediction, actual=1, date=None):
+        b = min(int(prediction * self.n_bins), self.n_bins - 1)
+        self.counts[b] += 1
+        self.sum_predictions[b] += prediction
+        self.sum_actual[b] += actual
+        if self.symmetric:
+            b = min(int((1 - prediction) * self.n_bins), self.n_bins - 1)
+            self.counts[b] += 1
+            self.sum_predictions[b] += 1 - prediction
+            self.sum_actual[b] += 1 - actual
+        self.n += 1
+
+    def update_batch(self, predictions, actual=1, dates=None):
+        predictions = np.asarray(predictions, dtype=np.float64)
+        if self.symmetric:
+            actual = np.broadcast_to(np.asarray(actual, dtype=np.float64), predictions.shape)
+            self._add(np.concatenate([predictions, 1 - predictions]), np.concatenate([actual, 1 - actual]))
+        else:
+            self._add(predictions, actual)
+        self.n += len(predictions)
+
+    def _add(self, predictions, actual):
+        bins = np.minimum((predictions * self.n_bins).astype(np.int64), self.n_bins - 1)
+        actual = np.broadcast_to(np.asarray(actual, dtype=np.float64), predictions.shape)
+        self.counts += np.bincount(bins, minlength=self.n_bins)
+        self.sum_predictions += np.bincount(bins, weights=predictions, minlength=self.n_bins)
+        self.sum_actual += np.bincount(bins, weights=actual, minlength=self.n_bins)
+
+    def result(self):
+        """
+        :return: pd DataFrame - one row per bin: bin_lower, bin_upper, count, mean_prediction, observed_rate
+        """
+        import pandas as pd
+        edges = np.linspace(0, 1, self.n_bins + 1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return pd.DataFrame({'bin_lower': edges[:-1], 'bin_upper': edges[1:], 'count': self.counts,
+                                 'mean_prediction': self.sum_predictions / self.counts,
+                                 'observed_rate': self.sum_actual / self.counts})
+
+
+class Rolling(Metric):
+    def __init__(self, metric, window=1000):
+        """
+        metric over the last window predictions only - keeps the last window losses
+
+        :param metric: Metric - e.g BrierScore()
+        :param window: int - number of predictions. Default 1000
+        """
+        super().__init__()
+        self.metric = metric
+        self.window = window
+        self.name = f'rolling_{metric.name}'
+        self._losses = deque(maxlen=window)
+
+    def loss(self, prediction, actual):
+        return self.metric.loss(prediction, actual)
+
+    def loss_batch(self, predictions, actual):
+        return self.metric.loss_batch(predictions, actual)
+
+    def update(self, prediction, actual=1, date=None):
+        if len(self._losses) == self.window:
+            self.total -= self._losses[0]
+        loss = self.loss(prediction, actual)
+        self._losses.append(loss)
+        self.total += loss
+        self.n += 1
+
+    def update_batch(self, predictions, actual=1, dates=None):
+        losses = self.loss_batch(np.asarray(predictions, dtype=np.float64), actual)
+        self._losses.extend(np.asarray(losses, dtype=np.float64)[-self.window:].tolist())
+        # Recomputed rather than adjusted so a batch never accumulates rounding error
+        self.total = math.fsum(self._losses)
+        self.n += len(predictions)
+
+    def result(self):
+        return self.total / len(self._losses) if self._losses else math.nan
+
+    @staticmethod
+    def series(metric, predictions, actual=1, window=1000):
+        """
+        Post hoc rolling score after every prediction
+
+        :return: np.array (float) - metric over the (up to) window predictions ending at each prediction
+        """
+        losses = np.asarray(metric.loss_batch(np.asarray(predictions, dtype=np.float64), actual), dtype=np.float64)
+        cumsum = np.concatenate([[0.0], np.cumsum(losses)])
+        end = np.arange(1, len(losses) + 1)
+        start = np.maximum(end - window, 0)
+        return (cumsum[end] - cumsum[start]) / (end - start)
+
+
+class TimeWindowed(Metric):
+    def __init__(self, metric, freq='M'):
+        """
+        metric per calendar period of match date - keeps one accumulator per period
+
+        :param metric: Metric - e.g BrierScore()
+        :param freq: str - NumPy datetime unit of the periods: 'D', 'W', 'M' or 'Y'. Default 'M'
+        """
+        super().__init__()
+        self.metric = metric
+        self.freq = freq
+        self.name = f'{metric.name}_by_{freq}'
+        self.periods = {}
+
+    def loss(self, prediction, actual):
+        return self.metric.loss(prediction, actual)
+
+    def loss_batch(self, predictions, actual):
+        return self.metric.loss_batch(predictions, actual)
+
+    def _period_metric(self, period):
+        m = self.periods.get(period)
+        if m is None:
+            m = self.periods[period] = copy.deepcopy(self.metric)
+        return m
+
+    def update(self, prediction, actual=1, date=None):
+        import pandas as pd
+        if date is None or pd.isna(date):
+            return
+        self._period_metric(np.datetime64(pd.Timestamp(date), self.freq)).update(prediction, actual)
+        self.n += 1
+
+    def update_batch(self, predictions, actual=1, dates=None):
+        import pandas as pd
+        if dates is None:
+            return
+        predictions = np.asarray(predictions, dtype=np.float64)
+        periods = np.asarray(dates, dtype='datetime64[ns]').astype(f'datetime64[{self.freq}]')
+        actual = np.broadcast_to(np.asarray(actual), predictions.shape)
+        dated = ~np.isnat(periods)
+        codes, uniques = pd.factorize(periods[dated])
+        for i, period in enumerate(uniques):
+            rows = codes == i
+            self._period_metric(np.datetime64(period, self.freq)).update_batch(predictions[dated][rows],
+                                                                               actual[dated][rows])
+        self.n += int(dated.sum())
+
+    def result(self):
+        """
+        :return: pd Series - metric per period, in period order
+        """
+        import pandas as pd
+        periods = sorted(self.periods)
+        return pd.Series([self.periods[p].result() for p in periods], index=pd.Index(periods, name='period'),
+                         name=self.metric.name)
+
+
+class MetricSet:
+    def __init__(self, metrics=None, cold_start_threshold=None, by=None):
+        """
+        Metrics accumulated over a replay, overall and per slice of matches
+
+        Pass to ResultsTable.check_prediction(metrics=...) to score predictions as they are made, without keeping
+        prediction lists.
+
+        :param metrics: list of Metric - Default BrierScore, LogLoss, Accuracy
+        :param cold_start_threshold: int - minimum rating history length of all players for a prediction to be scored.
+                                     Default None - the ResultsTable's cold_start_threshold in check_prediction, else 0
+        :param by: list (str) - slices to score separately as well: 'match_type' (singles / doubles) or a results
+                   column e.g 'event_title'. Default None
+        """
+        self.templates = metrics if metrics is not None else [BrierScore(), LogLoss(), Accuracy()]
+        self.cold_start_threshold = cold_start_threshold
+        self.by = list(by) if by else []
+        self.slices = {}
+
+    def metrics(self, key=('all', None)):
+        """
+        Metric objects of one slice, e.g ('match_type', 'doubles') or ('event_title', 'MS')
+
+        :return: list of Metric
+        """
+        m = self.slices.get(key)
+        if m is None:
+            m = self.slices[key] = [copy.deepcopy(t) for t in self.templates]
+        return m
+
+    def _column(self, columns, b):
+        if columns is None or b not in columns:
+            raise KeyError(f'MetricSet is sliced by {b!r}, which is not a column of the results table')
+        return columns[b]
+
+    def _keys(self, doubles, columns):
+        keys = [('all', None)]
+        for b in self.by:
+            if b == 'match_type':
+                keys.append((b, 'doubles' if doubles else 'singles'))
+            else:
+                keys.append((b, self._column(columns, b)))
+        return keys
+
+    def update(self, prediction, hist_len, doubles=False, columns=None, date=None, actual=1):
+        """
+        Score a single prediction
+
+        :param prediction: float - probability of team A winning
+        :param hist_len: int - shortest rating history length among the players
+        :param doubles: bool - doubles match. Default False
+        :param columns: dict - values of the slicing columns for this match, e.g a results row. Default None
+        :param date: np.datetime64 - match date. Default None
+        :param actual: int - outcome. Default 1
+        :return: None
+        """
+        if hist_len < (self.cold_start_threshold or 0):
+            return
+        self.metrics()
+        for key in self._keys(doubles, columns):
+            for m in self.metrics(key):
+                m.update(prediction, actual, date)
+
+    def update_batch(self, predictions, hist_len, doubles=None, columns=None, dates=None, processed=None, actual=1):
+        """
+        Score many predictions at once - vectorized per slice
+
+        :param predictions: np.array (float)
+        :param hist_len: np.array (int) - shortest rating history length among the players of each match
+        :param doubles: np.array (bool) - Default None - all singles
+        :param columns: dict or pd DataFrame - slicing column name to per match values. Default None
+        :param dates: np.array (datetime64) - Default None
+        :param processed: np.array (bool) - matches to score, e.g replay output. Default None - all
+        :param actual: np.array (int) or int - Default 1
+        :return: None
+        """
+        import pandas as pd
+        predictions = np.asarray(predictions, dtype=np.float64)
+        keep = np.asarray(hist_len) >= (self.cold_start_threshold or 0)
+        if processed is not None:
+            keep &= processed
+        actual = np.broadcast_to(np.asarray(actual), predictions.shape)
+        if doubles is None:
+            doubles = np.zeros(len(predictions), dtype=bool)
+        if dates is not None:
+            dates = np.asarray(dates, dtype='datetime64[ns]')
+
+        def score(key, rows):
+            if key[0] != 'all' and not rows.any():
+                return
+            for m in self.metrics(key):
+                m.update_batch(predictions[rows], actual[rows], None if dates is None else dates[rows])
+
+        score(('all', None), keep)
+        for b in self.by:
+            if b == 'match_type':
+                score((b, 'singles'), keep & ~doubles)
+                score((b, 'doubles'), keep & doubles)
+            else:
+                codes, uniques = pd.factorize(np.asarray(self._column(columns, b)), use_na_sentinel=False)
+                for i, value in enumerate(uniques):
+                    score((b, value), keep & (codes == i))
+
+    def results(self):
+        """
+        Scalar metrics per slice - calibration curves and time windowed metrics are read with metrics(key)
+
+        :return: pd DataFrame - one row per slice (slice, value), one column per metric plus n_predictions
+        """
+        import pandas as pd
+        order = ['all'] + self.by
+        rows = []
+        for (name, value), metrics in sorted(self.slices.items(), key=lambda kv: (order.index(kv[0][0]),
+                                                                                   str(kv[0][1]))):
+            row = {'slice': name, 'value': value, 'n_predictions': metrics[0].n if metrics else 0}
+            for m in metrics:
+                result = m.result()
+                if np.isscalar(result):
+                    row[m.name] = result
+            rows.append(row)
+        return pd.DataFrame(rows).set_index(['slice', 'value'])
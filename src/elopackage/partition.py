@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+from elopackage.engine import MatchArrays, RatingEngine
+from elopackage.metrics import MetricSet
+from elopackage.player import DEFAULT_RATING, DEFAULT_KFACTOR, DEFAULT_SD
+from elopackage.registry import build_player_registry, TSID_COLS, NAME_COLS
+
+
+class PartitionedRatings:
+    def __init__(self, by, keys, registry, slot_partition, slot_player, engine, output, metrics):
+        """
+        Independent ratings per partition of a results table - see rate_partitions
+
+        Every (partition, player) pair that played has its own slot in engine.
+
+        :param by: str - column the results table was partitioned by
+        :param keys: np.array - partition key per partition code
+        :param registry: PlayerRegistry - players shared by every partition
+        :param slot_partition: np.array (int64) - partition code per slot
+        :param slot_player: np.array (int64) - registry player index per slot
+        :param engine: RatingEngine - ratings, sds, kfactors and match counts per slot
+        :param output: dict - per match arrays returned by RatingEngine.replay
+        :param metrics: MetricSet - sliced by the by column
+        """
+        self.by = by
+        self.keys = keys
+        self.registry = registry
+        self.slot_partition = slot_partition
+        self.slot_player = slot_player
+        self.engine = engine
+        self.output = output
+        self.metrics = metrics
+
+    def __len__(self):
+        return len(self.keys)
+
+    def to_frame(self):
+        """
+        Ratings of every player in every partition they played in
+
+        :return: pd DataFrame - by, tsid, name, rating, match_count
+        """
+        return pd.DataFrame({self.by: np.asarray(self.keys, dtype=object)[self.slot_partition],
+                             'tsid': self.registry.tsids[self.slot_player],
+                             'name': self.registry.names[self.slot_player],
+                             'rating': self.engine.ratings,
+                             'match_count': self.engine.match_counts})
+
+    def ratings(self, key):
+        """
+        Ratings of one partition, e.g 'MS'
+
+        :param key: value of the by column
+        :return: pd DataFrame - tsid, name, rating, match_count - sorted by rating
+        """
+        slots = self.slot_partition == pd.Index(self.keys).get_loc(key)
+        df = self.to_frame()[slots].drop(columns=self.by)
+        return df.sort_values('rating', ascending=False, kind='stable').reset_index(drop=True)
+
+    def results(self):
+        """
+        Metrics per partition - metrics must be sliced by the by column
+
+        :return: pd DataFrame - one row per partition, one column per metric plus n_predictions
+        """
+        return self.metrics.results().loc[self.by]
+
+
+def rate_partitions(df, by='event_title', kfactor=None, sd=None, mov=False, acf=None, backend='auto',
+                    max_workers=None, metrics=None, cold_start_threshold=0):
+    """
+    Rate every partition of a date sorted results table independently, in one replay over the match stream
+
+    Players are interned once and shared by all partitions. Each (partition, player) pair gets its own rating slot, so
+    the partitions never share ratings, yet one replay covers them all. With backend='parallel' the partitions are
+    disconnected player communities and are replayed in separate worker processes - see RatingEngine.replay_parallel.
+    Rows with a missing key form a partition of their own.
+
+    :param df: pd DataFrame - preprocessed results sorted by match_date_dt - see preprocess_tour_data. Not modified
+    :param by: str - partition column e.g event_title (MS, WS, MD, WD, XD) or any other results column.
+               Default 'event_title'
+    :param kfactor: float - kfactor of every player
+    :param sd: float - sd of every player
+    :param mov: bool - Whether to include MOV in rating diff. Default to False
+    :param acf: int - Auto-corr-factor in rating diff - typically ~ 1500-2500. Default to None
+    :param backend: str - replay backend - see RatingEngine.replay. Default 'auto'
+    :param max_workers: int - worker processes for backend='parallel'. Default os.cpu_count()
+    :param metrics: MetricSet - Default None - Brier score, log loss and accuracy per partition
+    :param cold_start_threshold: int - minimum rating history length of all players for a prediction to be scored,
+                                 counted within the partition. Default 0
+    :return: PartitionedRatings
+    """
+    if by not in df.columns:
+        raise KeyError(f'cannot partition by {by!r}, which is not a column of the results table')
+    columns = [c for c in TSID_COLS + NAME_COLS + ['Doubles', 'pts_diff', 'match_date_dt', by] if c in df.columns]
+    # Temp tsids are written into the copy rather than the caller's table
+    df = df[list(dict.fromkeys(columns))].copy()
+    registry = build_player_registry(df)
+    n_players = len(registry)
+
+    codes, keys = pd.factorize(df[by], use_na_sentinel=False)
+    players = registry.players
+    filled = players >= 0
+    slots, pairs = pd.factorize((codes[:, None] * n_players + players)[filled])
+    slot_players = np.full(players.shape, -1, dtype=np.int64)
+    slot_players[filled] = slots
+
+    n_slots = len(pairs)
+    engine = RatingEngine()
+    # Same truthiness as Player.__init__
+    engine.ratings = np.full(n_slots, DEFAULT_RATING, dtype=np.float64)
+    engine.sds = np.full(n_slots, sd if sd else DEFAULT_SD, dtype=np.float64)
+    engine.kfactors = np.full(n_slots, kfactor if kfactor else DEFAULT_KFACTOR, dtype=np.float64)
+    engine.match_counts = np.zeros(n_slots, dtype=np.int64)
+
+    doubles = df['Doubles'].to_numpy(dtype=bool)
+    matches = MatchArrays(slot_players, doubles, df['pts_diff'].to_numpy(dtype=np.float64))
+    if backend == 'parallel':
+        output = engine.replay_parallel(matches, mov=mov, acf=acf, max_workers=max_workers)
+    else:
+        output = engine.replay(matches, mov=mov, acf=acf, backend=backend)
+
+    if metrics is None:
+        metrics = MetricSet(cold_start_threshold=cold_start_threshold, by=[by])
+    elif metrics.cold_start_threshold is None:
+        metrics.cold_start_threshold = cold_start_threshold
+    dates = df['match_date_dt'].to_numpy() if 'match_date_dt' in df.columns else None
+    metrics.update_batch(output['prediction'], output['hist_len_min'], doubles=doubles,
+                         columns={by: np.asarray(keys, dtype=object)[codes]}, dates=dates,
+                         processed=output['processed'])
+
+    return PartitionedRatings(by, keys, registry, pairs // n_players, pairs % n_players, engine, output, metrics)
@@ -1,43 +1,77 @@
-import matplotlib.pyplot as plt
-import numpy as np
-import scipy.stats as stats
 import math
 
+DEFAULT_RATING = 1500
+DEFAULT_KFACTOR = 180
+DEFAULT_SD = 400
+
 
 class Player:
-    def __init__(self, name, tsid, rating=None, kfactor=None, sd=None):
+    # No per instance __dict__ - ResultsTable holds one Player per tsid
+    __slots__ = ('name', 'tsid', 'rating', 'kfactor', 'sd', 'match_count', 'history', 'history_idx',
+                 '_rating_history', 'last_played')
+
+    def __init__(self, name, tsid, rating=None, kfactor=None, sd=None, history=None):
+        """
+        :param history: RatingHistory - shared store to record rating history in. Default None - history is kept
+                        in a list on the player
+        """
         self.name = name
         self.tsid = tsid
 
         if rating:
             self.rating = rating
         else:
-            self.rating = 1500
-
-        self.rating_history = [self.rating]
+            self.rating = DEFAULT_RATING
+
+        self.match_count = 0
+        # Date of the latest match - only tracked with an InactivityDecay, see ResultsTable.check_prediction
+        self.last_played = None
+        self.history = history
+        if history is None:
+            self._rating_history = [self.rating]
+        else:
+            self.history_idx = history.add_player(self.rating)
 
         if kfactor:
             self.kfactor = kfactor
         else:
-            self.kfactor = 180
+            self.kfactor = DEFAULT_KFACTOR
 
         if sd:
             self.sd = sd
         else:
-            self.sd = 400
+            self.sd = DEFAULT_SD
+
+    @property
+    def rating_history(self):
+        """
+        Player rating after every match, starting rating first - read from the shared RatingHistory if there is one
 
-    def update_rating(self, delta):
+        Always a list. With a shared RatingHistory it is a copy - use history.player_ratings(history_idx) for a NumPy
+        array without the conversion
+        """
+        if self.history is None:
+            return self._rating_history
+        return self.history.player_ratings(self.history_idx).tolist()
+
+    def update_rating(self, delta, match_idx=-1, match_date=None):
         """
         Update a players rating with delta and player rating history
         :param delta - float - delta of player's rating:
+        :param match_idx - int - position of the match in the results table, recorded in a shared RatingHistory:
+        :param match_date - datetime like - date of the match, recorded in a shared RatingHistory:
         :return: none
         """
         self.rating += delta
-        self.rating_history.append(self.rating)
+        self.match_count += 1
+        if self.history is None:
+            self._rating_history.append(self.rating)
+        else:
+            self.history.append(self.history_idx, match_idx, self.rating, match_date)
 
     def visualize_competitor(self, p2):
         """
-        2D Plot of distribution of both players
+        2D Plot of distribution of both players - see plotting.visualize_competitor
 
         args:
             p2 - Player Object of opposition
@@ -45,28 +79,12 @@ class Player:
         return:
             matplotlib fig object
         """
-        plt.rcParams.update({'font.size': 15})
-        min_rating = min(self.rating, p2.rating)
-        max_rating = max(self.rating, p2.rating)
-        min_x = round((min_rating - 4 * self.sd))
-        max_x = round((max_rating + 4 * self.sd))
-
-        x = np.arange(min_x, max_x, 1)
-        fig, ax = plt.subplots()
-        ax.plot(x, stats.norm(self.rating, self.sd).pdf(x), label=f'{self.name}\nTSID: {int(self.tsid)}\nRating: {int(self.rating)}')
-        ax.plot(x, stats.norm(p2.rating, p2.sd).pdf(x), label=f'{p2.name}\nTSID: {int(p2.tsid)}\nRating: {int(p2.rating)}')
-        ax.set_title('Comparison of Players Rating')
-        ax.set_xlabel('Rating')
-        ax.set_ylabel('Probability Density')
-        plt.legend(bbox_to_anchor=(-0.1, -0.2), loc="upper left", ncol=2)
-        plt.tight_layout()
-        plt.show()
-
-        return fig
+        from elopackage.plotting import visualize_competitor
+        return visualize_competitor(self, p2)
 
     def visualize_prob_winning(self, p2):
         """
-        2D Plot showing distribution and probability of player beating p2
+        2D Plot showing distribution and probability of player beating p2 - see plotting.visualize_prob_winning
 
         args:
             p2 - Player Object of opposition
@@ -74,45 +92,18 @@ class Player:
         return:
             matplotlib fig object
         """
-        plt.rcParams.update({'font.size': 15})
-        new_mean = self.rating - p2.rating
-        new_std = math.sqrt(self.sd ** 2 + p2.sd ** 2)
-        p_p1_winning = 1 - stats.norm(loc=new_mean, scale=new_std).cdf(0)
-
-        x = np.arange(round(new_mean - 4 * new_std), round(new_mean + 4 * new_std), 1)
-
-        fig, ax = plt.subplots()
-        ax.plot(x, stats.norm(new_mean, new_std).pdf(x), label=f'P({self.name} beating {p2.name}) = {p_p1_winning:.3f}')
-
-        x_fill_max = np.arange(0, round(new_mean + 4 * new_std))
-        y1 = stats.norm(loc=new_mean, scale=new_std).pdf(x_fill_max)
-        ax.fill_between(x_fill_max, y1, alpha=0.3)
-        plt.legend(bbox_to_anchor=(0, 1.04), loc="lower left")
-        ax.get_xaxis().set_visible(False)
-        ax.get_yaxis().set_visible(False)
-        plt.tight_layout()
-        plt.show()
-
-        return fig
+        from elopackage.plotting import visualize_prob_winning
+        return visualize_prob_winning(self, p2)
 
     def visualize_rating_hist(self):
         """
-        2D Plot showing player ELO rating changes overtime
+        2D Plot showing player ELO rating changes overtime - see plotting.visualize_rating_hist
 
         args:None
         return: matplotlib fig object
         """
-        plt.rcParams.update({'font.size': 15})
-        fig, ax = plt.subplots()
-        ax.plot(np.arange(len(self.rating_history)), self.rating_history, label=f'{self.name} ELO Rating History')
-        ax.scatter(np.arange(len(self.rating_history)), self.rating_history)
-        plt.legend(bbox_to_anchor=(0, 1.04), loc="lower left")
-        ax.set_xlabel('Number of Games Played')
-        ax.set_ylabel('Player Rating');
-        plt.tight_layout()
-        plt.show()
-
-        return fig
+        from elopackage.plotting import visualize_rating_hist
+        return visualize_rating_hist(self)
 
     def combine(self, p2):
         """
@@ -128,3 +119,42 @@ class Player:
         tsid_combined = self.tsid + "_" + p2.tsid
 
         return Player(name_combined, tsid_combined, rating=rating_combined, sd=sd_combined)
+
+
+class Team:
+    # Only references to the two players are stored - nothing is copied or allocated per match
+    __slots__ = ('p1', 'p2')
+
+    def __init__(self, p1, p2):
+        """
+        Doubles pair treated as a single player by Elo.expected / Elo.rating_diff_mov
+
+        Rating, sd and kfactor follow ResultsTable.convert_double_to_single: the mean rating of the pair, an sd of
+        sqrt(2) * p1.sd and the default kfactor. They are read from the players when accessed, so a Team stays current
+        as player ratings change.
+
+        p1 - Player object
+        p2 - Player object
+        """
+        self.p1 = p1
+        self.p2 = p2
+
+    @property
+    def rating(self):
+        return (self.p1.rating + self.p2.rating) / 2
+
+    @property
+    def sd(self):
+        return math.sqrt((self.p1.sd ** 2) + (self.p1.sd ** 2))
+
+    @property
+    def kfactor(self):
+        return DEFAULT_KFACTOR
+
+    @property
+    def name(self):
+        return self.p1.name + '_' + self.p2.name
+
+    @property
+    def tsid(self):
+        return str(self.p1.tsid) + '_' + str(self.p2.tsid)
@@ -0,0 +1,90 @@
+# matplotlib and scipy.stats are imported by this module only - Player loads it on the first plot
+import math
+import matplotlib.pyplot as plt
+import numpy as np
+import scipy.stats as stats
+
+
+def visualize_competitor(p1, p2):
+    """
+    2D Plot of distribution of both players
+
+    args:
+        p1 - Player Object
+        p2 - Player Object of opposition
+
+    return:
+        matplotlib fig object
+    """
+    plt.rcParams.update({'font.size': 15})
+    min_rating = min(p1.rating, p2.rating)
+    max_rating = max(p1.rating, p2.rating)
+    min_x = round((min_rating - 4 * p1.sd))
+    max_x = round((max_rating + 4 * p1.sd))
+
+    x = np.arange(min_x, max_x, 1)
+    fig, ax = plt.subplots()
+    ax.plot(x, stats.norm(p1.rating, p1.sd).pdf(x), label=f'{p1.name}\nTSID: {int(p1.tsid)}\nRating: {int(p1.rating)}')
+    ax.plot(x, stats.norm(p2.rating, p2.sd).pdf(x), label=f'{p2.name}\nTSID: {int(p2.tsid)}\nRating: {int(p2.rating)}')
+    ax.set_title('Comparison of Players Rating')
+    ax.set_xlabel('Rating')
+    ax.set_ylabel('Probability Density')
+    plt.legend(bbox_to_anchor=(-0.1, -0.2), loc="upper left", ncol=2)
+    plt.tight_layout()
+    plt.show()
+
+    return fig
+
+
+def visualize_prob_winning(p1, p2):
+    """
+    2D Plot showing distribution and probability of player beating p2
+
+    args:
+        p1 - Player Object
+        p2 - Player Object of opposition
+
+    return:
+        matplotlib fig object
+    """
+    plt.rcParams.update({'font.size': 15})
+    new_mean = p1.rating - p2.rating
+    new_std = math.sqrt(p1.sd ** 2 + p2.sd ** 2)
+    p_p1_winning = 1 - stats.norm(loc=new_mean, scale=new_std).cdf(0)
+
+    x = np.arange(round(new_mean - 4 * new_std), round(new_mean + 4 * new_std), 1)
+
+    fig, ax = plt.subplots()
+    ax.plot(x, stats.norm(new_mean, new_std).pdf(x), label=f'P({p1.name} beating {p2.name}) = {p_p1_winning:.3f}')
+
+    x_fill_max = np.arange(0, round(new_mean + 4 * new_std))
+    y1 = stats.norm(loc=new_mean, scale=new_std).pdf(x_fill_max)
+    ax.fill_between(x_fill_max, y1, alpha=0.3)
+    plt.legend(bbox_to_anchor=(0, 1.04), loc="lower left")
+    ax.get_xaxis().set_visible(False)
+    ax.get_yaxis().set_visible(False)
+    plt.tight_layout()
+    plt.show()
+
+    return fig
+
+
+def visualize_rating_hist(player):
+    """
+    2D Plot showing player ELO rating changes overtime
+
+    args:
+        player - Player Object
+    return: matplotlib fig object
+    """
+    plt.rcParams.update({'font.size': 15})
+    fig, ax = plt.subplots()
+    ax.plot(np.arange(len(player.rating_history)), player.rating_history, label=f'{player.name} ELO Rating History')
+    ax.scatter(np.arange(len(player.rating_history)), player.rating_history)
+    plt.legend(bbox_to_anchor=(0, 1.04), loc="lower left")
+    ax.set_xlabel('Number of Games Played')
+    ax.set_ylabel('Player Rating');
+    plt.tight_layout()
+    plt.show()
+
+    return fig
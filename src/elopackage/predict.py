@@ -0,0 +1,201 @@
+import asyncio
+from collections import OrderedDict
+import numpy as np
+from elopackage.elo import Elo
+from elopackage.player import DEFAULT_RATING, DEFAULT_SD
+
+
+class PredictionService:
+    def __init__(self, engine, maxsize=100000, rv=False):
+        """
+        Win probability queries over a snapshot of current ratings, memoized in a bounded LRU cache
+
+        A team is a tsid for singles or a (p1 tsid, p2 tsid) tuple for doubles, combined as in Team. Cache entries are
+        keyed by the teams and the rating version of every player in them, so refresh only evicts the entries of
+        players whose ratings changed.
+
+        :param engine: RatingEngine - ratings to answer from, e.g ResultsTable.to_engine() - copied
+        :param maxsize: int - maximum number of cached predictions. Default 100,000
+        :param rv: bool - use the normal CDF (Elo.expected_rv) rather than the logistic function (Elo.expected).
+                   Default False
+        """
+        self.maxsize = maxsize
+        self.rv = rv
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        # tsid -> cache keys involving that player
+        self._keys_by_player = {}
+        self._pending = []
+        self._flush_handle = None
+        self._load(engine)
+        self.versions = np.zeros(len(self.ratings), dtype=np.int64)
+
+    def _load(self, engine):
+        self.index = dict(engine.index)
+        self.ratings = np.array(engine.ratings, dtype=np.float64)
+        self.sds = np.array(engine.sds, dtype=np.float64)
+
+    def __len__(self):
+        return len(self._cache)
+
+    def refresh(self, engine):
+        """
+        Take a new rating snapshot, e.g after RatingEngine.ingest, and evict the cached predictions of every player
+        whose rating or sd changed
+
+        :param engine: RatingEngine
+        :return: int - number of players whose ratings changed
+        """
+        old_index, old_ratings, old_sds = self.index, self.ratings, self.sds
+        self._load(engine)
+
+        old_tsids = list(old_index)
+        old_pos = np.fromiter(old_index.values(), dtype=np.int64, count=len(old_index))
+        new_pos = np.array([self.index[t] for t in old_tsids], dtype=np.int64)
+        changed = (self.ratings[new_pos] != old_ratings[old_pos]) | (self.sds[new_pos] != old_sds[old_pos])
+
+        versions = np.zeros(len(self.ratings), dtype=np.int64)
+        versions[new_pos] = self.versions[old_pos] + changed
+        self.versions = versions
+
+        changed_tsids = [t for t, c in zip(old_tsids, changed.tolist()) if c]
+        # Players new to the snapshot were predicted with starting ratings
+        new_tsids = [t for t in self._keys_by_player if t in self.index and t not in old_index]
+        for t in changed_tsids + new_tsids:
+            for key in self._keys_by_player.pop(t, ()):
+                self._evict(key)
+        return len(changed_tsids)
+
+    def _evict(self, key):
+        if self._cache.pop(key, None) is None:
+            return
+        for t in key[0] + key[1]:
+            keys = self._keys_by_player.get(t)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_player[t]
+
+    @staticmethod
+    def _team(team):
+        return tuple(team) if isinstance(team, (tuple, list)) else (team,)
+
+    def _player_idx(self, tsid):
+        # Players not yet in the snapshot are rated as a new player would be
+        return self.index.get(tsid, -1)
+
+    def _key(self, team_a, team_b):
+        versions = tuple(int(self.versions[i]) if i >= 0 else -1
+                         for i in map(self._player_idx, team_a + team_b))
+        return team_a, team_b, versions
+
+    def predict(self, matchups):
+        """
+        Probability of team A beating team B for many matchups at once - cache misses are computed in one batch
+
+        :param matchups: list of tuple - (team_a, team_b), each a tsid or a (p1 tsid, p2 tsid) tuple for doubles
+        :return: np.array (float) - probability of team A winning (0 -> 1)
+        """
+        keys = [self._key(self._team(a), self._team(b)) for a, b in matchups]
+        out = np.empty(len(keys), dtype=np.float64)
+        missing = {}
+        for i, key in enumerate(keys):
+            p = self._cache.get(key)
+            if p is None:
+                missing.setdefault(key, []).append(i)
+            else:
+                self._cache.move_to_end(key)
+                out[i] = p
+        self.hits += len(keys) - sum(len(v) for v in missing.values())
+        self.misses += len(missing)
+
+        if missing:
+            miss_keys = list(missing)
+            probs = self._compute([k[0] for k in miss_keys], [k[1] for k in miss_keys])
+            for key, p in zip(miss_keys, probs.tolist()):
+                out[missing[key]] = p
+                self._insert(key, p)
+        return out
+
+    def predict_one(self, team_a, team_b):
+        """
+        Probability of team A beating team B
+
+        :param team_a: tsid or (p1 tsid, p2 tsid)
+        :param team_b: tsid or (p1 tsid, p2 tsid)
+        :return: float
+        """
+        return float(self.predict([(team_a, team_b)])[0])
+
+    async def predict_async(self, team_a, team_b):
+        """
+        predict_one for asyncio servers - requests made in the same event loop iteration are answered by one
+        batched predict call
+
+        :param team_a: tsid or (p1 tsid, p2 tsid)
+        :param team_b: tsid or (p1 tsid, p2 tsid)
+        :return: float
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((team_a, team_b, future))
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_soon(self._flush_pending)
+        return await future
+
+    def _flush_pending(self):
+        pending, self._pending = self._pending, []
+        self._flush_handle = None
+        try:
+            probs = self.predict([(a, b) for a, b, _ in pending]).tolist()
+        except Exception as e:
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), p in zip(pending, probs):
+            if not future.done():
+                future.set_result(p)
+
+    def _insert(self, key, p):
+        self._cache[key] = p
+        for t in key[0] + key[1]:
+            self._keys_by_player.setdefault(t, set()).add(key)
+        while len(self._cache) > self.maxsize:
+            self._evict(next(iter(self._cache)))
+
+    def team_ratings(self, teams):
+        """
+        Rating and sd of each team - doubles combined as in Team
+
+        :param teams: list - each a tsid or a (p1 tsid, p2 tsid) tuple for doubles
+        :return: tuple - np.array (float) ratings, np.array (float) sds
+        """
+        return self._team_arrays([self._team(t) for t in teams])
+
+    def _team_arrays(self, teams):
+        """
+        Rating and sd of each team - doubles combined as in Team
+        """
+        width = max(len(t) for t in teams)
+        idx = np.array([[self._player_idx(p) for p in t] + [-2] * (width - len(t)) for t in teams], dtype=np.int64)
+        # -1 unknown player and -2 no player (singles) read the starting rating appended at the end
+        idx = np.where(idx >= 0, idx, len(self.ratings))
+        ratings = np.append(self.ratings, DEFAULT_RATING)[idx]
+        sds = np.append(self.sds, DEFAULT_SD)[idx]
+        if width == 1:
+            return ratings[:, 0], sds[:, 0]
+
+        doubles = np.array([len(t) == 2 for t in teams])
+        rating = np.where(doubles, (ratings[:, 0] + ratings[:, 1]) / 2, ratings[:, 0])
+        # Team uses p1's sd for both players
+        sd = np.where(doubles, np.sqrt(sds[:, 0] ** 2 + sds[:, 0] ** 2), sds[:, 0])
+        return rating, sd
+
+    def _compute(self, teams_a, teams_b):
+        rating_a, sd_a = self._team_arrays(teams_a)
+        rating_b, sd_b = self._team_arrays(teams_b)
+        if self.rv:
+            return Elo.expected_rv_batch(rating_a - rating_b, sd_a, sd_b)
+        return Elo.expected_batch(rating_a - rating_b, sd_a)
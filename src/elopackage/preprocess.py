@@ -1,7 +1,19 @@
+import pickle
+import tempfile
+import warnings
 import numpy as np
 import pandas as pd
 from pathlib import Path
 from ast import literal_eval
+from elopackage.metrics import brier_score
+
+# Sort key given to rows without a match date, so they sort last as with sort_values
+NAT_SORT_KEY = np.iinfo(np.int64).max
+# Formats of match_date, tried in order - day first, e.g "Sat 12/01/2019"
+DATE_FORMATS = ['%a %d/%m/%Y', '%d/%m/%Y', '%Y-%m-%d', '%Y-%m-%d %H:%M:%S']
+# Fewest rows read, spilled and unpickled at a time by iter_preprocess_tour_data, so per chunk and per block
+# overheads are spread over many rows however small the chunks it yields
+MIN_BLOCK_ROWS = 4096
 
 
 def convert_scores_literal(score):
@@ -28,39 +40,354 @@ def game_pts_diff(win, lsr):
     return winner_pts - loser_pts
 
 
-def preprocess_tour_data(csv_file):
-    p = Path(csv_file).absolute()
-    df = pd.read_csv(p)
-    # Convert match date to datetime
-    df['match_date_dt'] = pd.to_datetime(df['match_date'], errors='coerce')
+class ParsedScores:
+    def __init__(self, games, n_games, malformed):
+        """
+        Scores of a column of "[21, 21]" strings parsed into arrays
 
-    # Drop matches where score not present
-    df = df[(df['losing_team_scores'] != 'n/a') & (df['winning_team_scores'] != 'n/a')]
+        :param games: np.array (int64) - shape (n_matches, max games) - points per game, padded with 0
+        :param n_games: np.array (int64) - number of games per match
+        :param malformed: np.array (bool) - True where the score string couldn't be parsed
+        """
+        self.games = games
+        self.n_games = n_games
+        self.malformed = malformed
 
-    # Convert scores to list of int and get pts diff - Drop any rows with missing pts diff
-    df['losing_team_scores_lst'] = df['losing_team_scores'].apply(lambda x: convert_scores_literal(x))
-    df['winning_team_scores_lst'] = df['winning_team_scores'].apply(lambda x: convert_scores_literal(x))
-    df['pts_diff'] = df.apply(lambda x: pts_diff(x), axis=1)
+    def __len__(self):
+        return len(self.n_games)
 
-    df.dropna(subset=['pts_diff'], inplace=True)
+    def totals(self):
+        """
+        Total points per match - 0 for malformed scores
+        """
+        return self.games.sum(axis=1)
+
+    def padded(self, max_games):
+        """
+        games padded with 0 to max_games columns
+        """
+        return np.pad(self.games, ((0, 0), (0, max_games - self.games.shape[1])))
+
+    def to_lists(self):
+        """
+        Scores as a list of python lists, as produced by convert_scores_literal - None for malformed scores
+        """
+        return [None if bad else row[:n] for row, n, bad in zip(self.games.tolist(), self.n_games.tolist(),
+                                                                 self.malformed.tolist())]
+
+
+def parse_scores(scores):
+    """
+    Vectorized parser for score strings in the format "[21, 21]"
+
+    :param scores: pd Series (str) - e.g winning_team_scores
+    :return: ParsedScores
+    """
+    s = scores.astype(str).str.replace(r'\s+', '', regex=True)
+    malformed = ~s.str.fullmatch(r'\[(?:-?\d+(?:,-?\d+)*,?)?\]').to_numpy(dtype=bool)
+
+    inner = s.str[1:-1].str.rstrip(',').mask(malformed, '')
+    n_games = np.where(inner == '', 0, inner.str.count(',') + 1).astype(np.int64)
+
+    # Parse every game score in one pass, then scatter into a (matches x max games) array. The strings were validated
+    # above, so the joined string holds only comma separated integers
+    joined = ','.join(inner[n_games > 0])
+    flat = np.fromstring(joined, dtype=np.int64, sep=',') if joined else np.empty(0, dtype=np.int64)
+    max_games = int(n_games.max()) if len(n_games) else 0
+    games = np.zeros((len(n_games), max_games), dtype=np.int64)
+    offsets = np.cumsum(n_games) - n_games
+    rows = np.repeat(np.arange(len(n_games)), n_games)
+    games[rows, np.arange(len(flat)) - offsets[rows]] = flat
+
+    return ParsedScores(games, n_games, malformed)
+
+
+def score_diffs(winning, losing):
+    """
+    Vectorized total and per game points difference to the winner
+
+    Matches where either score is malformed, or the two teams have a different number of games, are flagged invalid
+
+    :param winning: ParsedScores - winning_team_scores
+    :param losing: ParsedScores - losing_team_scores
+    :return: tuple - pts_diff np.array (float64, nan if invalid), gme_pts_diff np.array (int64) - shape (n_matches,
+                     max games), invalid np.array (bool)
+    """
+    max_games = max(winning.games.shape[1], losing.games.shape[1])
+    gme_pts_diff = winning.padded(max_games) - losing.padded(max_games)
+    invalid = winning.malformed | losing.malformed | (winning.n_games != losing.n_games)
+    pts_diff = np.where(invalid, np.nan, gme_pts_diff.sum(axis=1))
+    return pts_diff, gme_pts_diff, invalid
 
-    # Get score diff for winner of each game
-    gme_pts_diff = []
-    for row in df.itertuples():
-        gme_pts_diff.append(game_pts_diff(row.winning_team_scores_lst, row.losing_team_scores_lst))
 
-    df['gme_pts_diff'] = gme_pts_diff
+class DateParser:
+    def __init__(self, formats=DATE_FORMATS):
+        """
+        Vectorized match_date parser with explicit formats, caching the date of every distinct string seen
+
+        A results file has only a few distinct dates, so each distinct string is parsed once - across chunks too
+        when the same parser is reused.
+
+        :param formats: str or list (str) - strptime formats tried in order. Default DATE_FORMATS
+        """
+        self.formats = [formats] if isinstance(formats, str) else list(formats)
+        # date string -> ns since epoch, NAT_SORT_KEY if it matches no format
+        self.cache = {}
+
+    def _parse_new(self, values):
+        result = np.full(len(values), NAT_SORT_KEY, dtype=np.int64)
+        remaining = np.ones(len(values), dtype=bool)
+        stripped = pd.Series(values, dtype=object).str.strip()
+        for fmt in self.formats:
+            if not remaining.any():
+                break
+            parsed = pd.to_datetime(stripped[remaining], format=fmt, errors='coerce')
+            ok = parsed.notna().to_numpy()
+            idx = np.flatnonzero(remaining)[ok]
+            result[idx] = parsed[ok].to_numpy(dtype='datetime64[ns]').view(np.int64)
+            remaining[idx] = False
+        self.cache.update(zip(values.tolist(), result.tolist()))
+
+    def sort_keys(self, dates):
+        """
+        Parse a column of date strings to int64 sort keys
+
+        :param dates: pd Series (str) - e.g match_date
+        :return: tuple - np.array (int64) - ns since epoch, NAT_SORT_KEY if missing or unparseable, and
+                 np.array (bool) - True where a date string matched none of the formats
+        """
+        codes, uniques = pd.factorize(dates)
+        uniques = np.asarray(uniques, dtype=object)
+        new = np.array([u not in self.cache for u in uniques.tolist()], dtype=bool)
+        if new.any():
+            self._parse_new(uniques[new])
+        unique_keys = np.array([self.cache[u] for u in uniques.tolist()] + [NAT_SORT_KEY], dtype=np.int64)
+        # Missing dates have code -1 and take the trailing NAT_SORT_KEY
+        keys = unique_keys[codes]
+        unparsed = (keys == NAT_SORT_KEY) & (codes >= 0)
+        return keys, unparsed
+
+    def parse(self, dates):
+        """
+        :param dates: pd Series (str) - e.g match_date
+        :return: tuple - pd Series (datetime64[ns]) - NaT if missing or unparseable, and np.array (bool) - True where
+                 a date string matched none of the formats
+        """
+        keys, unparsed = self.sort_keys(dates)
+        dt = np.where(keys == NAT_SORT_KEY, np.iinfo(np.int64).min, keys).view('datetime64[ns]')
+        return pd.Series(dt, index=dates.index), unparsed
+
+
+def clean_tour_data(df, date_format=None, date_parser=None):
+    """
+    Clean a raw results table, or a chunk of one, without sorting it
+
+    Adds match_date_dt, losing_team_scores_lst, winning_team_scores_lst, pts_diff, gme_pts_diff and Doubles and drops
+    matches where the score is missing or can't be parsed. Match dates which match none of the date formats are
+    reported and left as NaT.
+
+    :param df: pd DataFrame - raw tournament results
+    :param date_format: str or list (str) - formats of match_date. Default None - DATE_FORMATS
+    :param date_parser: DateParser - parser to reuse, e.g across chunks. Default None - a new DateParser
+    :return: pd DataFrame - cleaned results
+    """
+    if date_parser is None:
+        date_parser = DateParser(DATE_FORMATS if date_format is None else date_format)
+
+    # Convert match date to datetime - each distinct string is parsed once
+    df['match_date_dt'], unparsed = date_parser.parse(df['match_date'])
+    if unparsed.any():
+        warnings.warn(f'{unparsed.sum()} match dates could not be parsed - see df.attrs["unparsed_dates"]')
+    unparsed_dates = df.loc[unparsed, ['match_date']]
+
+    # Drop matches where score not present - read_csv has already turned 'n/a' into NaN
+    missing = df['losing_team_scores'].isna() | df['winning_team_scores'].isna()
+    df = df[~missing & (df['losing_team_scores'] != 'n/a') & (df['winning_team_scores'] != 'n/a')]
+
+    # Parse scores to arrays of int and get pts diff - Drop and report any rows with invalid scores
+    winning = parse_scores(df['winning_team_scores'])
+    losing = parse_scores(df['losing_team_scores'])
+    pts, gme_pts, invalid = score_diffs(winning, losing)
+
+    if invalid.any():
+        warnings.warn(f'Dropped {invalid.sum()} matches with malformed scores - see df.attrs["malformed_scores"]')
+    malformed_scores = df.loc[invalid, ['winning_team_scores', 'losing_team_scores']]
+
+    df['losing_team_scores_lst'] = losing.to_lists()
+    df['winning_team_scores_lst'] = winning.to_lists()
+    df['pts_diff'] = pts
+    df = df[~invalid]
+    # int64 - the row wise parser left a float64 column whenever a match had been dropped
+    df['pts_diff'] = df['pts_diff'].astype(np.int64)
+
+    # Get score diff for winner of each game
+    n_games = winning.n_games[~invalid]
+    df['gme_pts_diff'] = [row[:n] for row, n in zip(gme_pts[~invalid], n_games)]
+    df.attrs['malformed_scores'] = malformed_scores
+    df.attrs['unparsed_dates'] = unparsed_dates
 
     # Add a flag for doubles games
     df['Doubles'] = ~df.losing_team_p2.isna()
 
-    df.sort_values(by=['match_date_dt'], ascending=True, inplace=True)
+    return df
+
+
+def preprocess_tour_data(csv_file):
+    p = Path(csv_file).absolute()
+    df = pd.read_csv(p)
+    df = clean_tour_data(df)
+
+    # Stable sort on the int64 date key - rows on the same date keep their file order
+    df = df.iloc[np.argsort(match_date_sort_key(df['match_date_dt']), kind='stable')]
 
     df.reset_index(drop=True, inplace=True)
 
     return df
 
 
+def match_date_sort_key(match_date_dt):
+    """
+    int64 sort key for match dates - matches without a date sort last
+
+    :param match_date_dt: pd Series (datetime64)
+    :return: np.array (int64)
+    """
+    key = match_date_dt.to_numpy(dtype='datetime64[ns]').view(np.int64).copy()
+    key[match_date_dt.isna().to_numpy()] = NAT_SORT_KEY
+    return key
+
+
+def _write_run(df, path, block_rows):
+    """
+    Sort a cleaned chunk by match date and pickle it to path as consecutive blocks of block_rows rows
+    """
+    key = match_date_sort_key(df['match_date_dt'])
+    order = np.argsort(key, kind='stable')
+    df = df.iloc[order]
+    # The per chunk reports in attrs hold DataFrames, which pd.concat can't compare when merging runs - the chunk
+    # warnings have reported them already
+    df.attrs = {}
+    with open(path, 'wb') as f:
+        for start in range(0, len(df), block_rows):
+            pickle.dump(df.iloc[start:start + block_rows], f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _read_run(path):
+    """
+    Yield the blocks of a run written by _write_run
+    """
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def _merge_runs(paths, out_rows):
+    """
+    k-way merge of sorted runs, yielding DataFrames of out_rows rows in (match date, run, position) order
+
+    Only one block per run is held in memory at a time.
+    """
+    readers = [_read_run(p) for p in paths]
+    blocks = [next(r, None) for r in readers]
+    keys = [None if b is None else match_date_sort_key(b['match_date_dt']) for b in blocks]
+    pending = []
+    n_pending = 0
+
+    while True:
+        active = [i for i, b in enumerate(blocks) if b is not None]
+        if not active:
+            break
+
+        # Everything up to the smallest (last key, run) of the current blocks can be emitted - ties between runs
+        # resolve in run order, which keeps the merge stable
+        bound_key, bound_run = min((keys[i][-1], i) for i in active)
+        taken, taken_keys = [], []
+        for i in active:
+            side = 'right' if i <= bound_run else 'left'
+            n = len(keys[i]) if i == bound_run else int(np.searchsorted(keys[i], bound_key, side=side))
+            if n:
+                taken.append(blocks[i].iloc[:n])
+                taken_keys.append(keys[i][:n])
+            if n == len(keys[i]):
+                blocks[i] = next(readers[i], None)
+                keys[i] = None if blocks[i] is None else match_date_sort_key(blocks[i]['match_date_dt'])
+            else:
+                blocks[i] = blocks[i].iloc[n:]
+                keys[i] = keys[i][n:]
+
+        order = np.argsort(np.concatenate(taken_keys), kind='stable')
+        pending.append(pd.concat(taken).iloc[order])
+        n_pending += len(order)
+
+        if n_pending >= out_rows:
+            merged = pd.concat(pending)
+            for start in range(0, len(merged) - out_rows + 1, out_rows):
+                yield merged.iloc[start:start + out_rows]
+            remainder = merged.iloc[len(merged) - len(merged) % out_rows:]
+            pending, n_pending = [remainder], len(remainder)
+
+    if n_pending:
+        yield pd.concat(pending)
+
+
+def iter_preprocess_tour_data(csv_file, chunksize=100000, max_runs=64, tmp_dir=None):
+    """
+    Streaming version of preprocess_tour_data for results files too large to load at once
+
+    The CSV is read and cleaned in chunks of chunksize rows, or MIN_BLOCK_ROWS if larger. Each chunk is sorted and
+    spilled to a temporary file in blocks of at least MIN_BLOCK_ROWS rows, then the files are merged by match_date_dt
+    (external merge sort), merging in several passes when there are more than max_runs chunk files. Small chunksizes
+    therefore only change the size of the yielded batches. Peak memory is bounded by chunksize, max_runs and
+    MIN_BLOCK_ROWS rather than the size of the file.
+
+    Rows on the same date keep their file order, as in preprocess_tour_data. One DateParser is shared by every
+    chunk, so each distinct date string is parsed once.
+
+    :param csv_file: str or Path - raw tournament results CSV
+    :param chunksize: int - number of rows yielded at a time
+    :param max_runs: int - maximum number of sorted runs merged at once
+    :param tmp_dir: str or Path - directory for temporary run files. Default system temp directory
+    :return: generator of pd DataFrame - cleaned, date sorted batches with a continuous index starting at 0
+    """
+    p = Path(csv_file).absolute()
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        tmp = Path(tmp)
+        # Blocks are sized so one block per run fits in roughly one chunk of memory during the merge, but never so
+        # small that pickling each block dominates
+        read_rows = max(chunksize, MIN_BLOCK_ROWS)
+        block_rows = max(MIN_BLOCK_ROWS, read_rows // max_runs)
+
+        runs = []
+        date_parser = DateParser()
+        for chunk in pd.read_csv(p, chunksize=read_rows):
+            chunk = clean_tour_data(chunk, date_parser=date_parser)
+            if len(chunk):
+                runs.append(tmp / f'run_{len(runs)}.pkl')
+                _write_run(chunk, runs[-1], block_rows)
+
+        n_pass = 0
+        while len(runs) > max_runs:
+            merged_runs = []
+            for start in range(0, len(runs), max_runs):
+                merged_runs.append(tmp / f'pass_{n_pass}_run_{len(merged_runs)}.pkl')
+                with open(merged_runs[-1], 'wb') as f:
+                    for block in _merge_runs(runs[start:start + max_runs], block_rows):
+                        pickle.dump(block, f, protocol=pickle.HIGHEST_PROTOCOL)
+                for r in runs[start:start + max_runs]:
+                    r.unlink()
+            runs = merged_runs
+            n_pass += 1
+
+        n_rows = 0
+        for batch in _merge_runs(runs, chunksize):
+            batch.index = pd.RangeIndex(n_rows, n_rows + len(batch))
+            n_rows += len(batch)
+            yield batch
+
+
 def briers_score(predictions, actual):
-    return sum([(ft - ot) ** 2 for ft, ot in zip(predictions, actual)]) / len(predictions)
+    return brier_score(predictions, actual)
 
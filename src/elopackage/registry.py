@@ -0,0 +1,116 @@
+import numpy as np
+
+DUMMY_TSID_START = 2000001
+
+TSID_COLS = ['winning_team_p1_tsid', 'winning_team_p2_tsid', 'losing_team_p1_tsid', 'losing_team_p2_tsid']
+NAME_COLS = ['winning_team_p1', 'winning_team_p2', 'losing_team_p1', 'losing_team_p2']
+ROLES = ['p1w', 'p2w', 'p1l', 'p2l']
+
+
+class PlayerRegistry:
+    def __init__(self, tsids, names, players, dummy_tsid, n_known=0):
+        """
+        Dense player index of a results table - see build_player_registry
+
+        :param tsids: np.array (float64) - tsid per player index, already known players first
+        :param names: np.array (object) - name per player index, nan if missing or not given for a known player
+        :param players: np.array (int64) - shape (n_matches, 4) - player index per role (p1w, p2w, p1l, p2l), -1 if
+                        empty
+        :param dummy_tsid: int - next temp tsid to assign
+        :param n_known: int - number of players which were already registered before the build
+        """
+        self.tsids = tsids
+        self.names = names
+        self.players = players
+        self.dummy_tsid = dummy_tsid
+        self.n_known = n_known
+        self._index = None
+
+    def __len__(self):
+        return len(self.tsids)
+
+    @property
+    def index(self):
+        """
+        dict - {tsid: player index}, built on first use
+        """
+        if self._index is None:
+            self._index = dict(zip(self.tsids.tolist(), range(len(self.tsids))))
+        return self._index
+
+    def new_players(self):
+        """
+        :return: list - (tsid, name) of the players which were not already known, in order of first appearance. Temp
+                 tsids are returned as int, as in ResultsTable.add_players_to_dict
+        """
+        tsids = self.tsids[self.n_known:].tolist()
+        tsids = [int(t) if t >= DUMMY_TSID_START else t for t in tsids]
+        return list(zip(tsids, self.names[self.n_known:].tolist()))
+
+    def to_frame(self):
+        """
+        Players table - one row per player index
+
+        :return: pd DataFrame - tsid, name, known
+        """
+        import pandas as pd
+        return pd.DataFrame({'tsid': self.tsids, 'name': self.names,
+                             'known': np.arange(len(self.tsids)) < self.n_known})
+
+
+def build_player_registry(df, known=(), dummy_tsid=DUMMY_TSID_START, known_names=None):
+    """
+    Factorize the tsid columns of a results table into a dense player index in one vectorized pass
+
+    Equivalent to calling ResultsTable.add_players_to_dict on every row: new players are indexed in order of first
+    appearance (row by row, p1w, p2w, p1l, p2l) after the known players, and every missing tsid is replaced in df by
+    its own temp tsid counting up from dummy_tsid. Each player keeps the name of their first appearance.
+
+    :param df: pd DataFrame - results table - tsid columns are updated in place
+    :param known: iterable - tsids which are already registered, in player index order
+    :param dummy_tsid: int - next temp tsid to assign. Default 2,000,001
+    :param known_names: iterable - names of the known players. Default None - nan
+    :return: PlayerRegistry
+    """
+    import pandas as pd
+    n = len(df)
+    doubles = df['Doubles'].to_numpy(dtype=bool)
+    present = np.ones((n, 4), dtype=bool)
+    present[:, 1] = doubles
+    present[:, 3] = doubles
+
+    tsids = np.column_stack([df[c].to_numpy(dtype=np.float64) for c in TSID_COLS]) if n else np.empty((0, 4))
+    missing = present & np.isnan(tsids)
+    n_missing = int(missing.sum())
+    # Boolean indexing walks the matrix row by row, giving the same temp tsids as the per row loop
+    tsids[missing] = np.arange(dummy_tsid, dummy_tsid + n_missing, dtype=np.float64)
+    if n_missing:
+        for j, c in enumerate(TSID_COLS):
+            if missing[:, j].any():
+                df[c] = tsids[:, j]
+
+    known = np.fromiter(known, dtype=np.float64)
+    slot_tsids = tsids[present]
+    codes, uniques = pd.factorize(np.concatenate([known, slot_tsids]))
+    slot_codes = codes[len(known):]
+
+    players = np.full((n, 4), -1, dtype=np.int64)
+    players[present] = slot_codes
+
+    # Codes are numbered in order of first appearance, so the first slot of each new player is in code order
+    first = np.flatnonzero(~pd.Series(slot_codes).duplicated().to_numpy())
+    first = first[slot_codes[first] >= len(known)]
+    names = np.full(len(uniques), np.nan, dtype=object)
+    if known_names is not None:
+        names[:len(known)] = list(known_names)
+    # Only the names at the first slot of each new player are read
+    first_slots = np.flatnonzero(present.ravel())[first]
+    rows, cols = np.divmod(first_slots, 4)
+    new_names = np.empty(len(first_slots), dtype=object)
+    for j, c in enumerate(NAME_COLS):
+        in_col = cols == j
+        new_names[in_col] = df[c].to_numpy(dtype=object)[rows[in_col]]
+    names[len(known):] = new_names
+
+    return PlayerRegistry(np.asarray(uniques, dtype=np.float64), names, players, dummy_tsid + n_missing,
+                          n_known=len(known))
@@ -1,21 +1,52 @@
+import time
 import numpy as np
 import pandas as pd
 import math
 from elopackage.elo import Elo
-from elopackage.player import Player
+from elopackage.player import Player, Team, DEFAULT_SD
+from elopackage.engine import RatingEngine, MatchArrays
+from elopackage.evaluation import EvalOutput, LEGACY_COLUMNS
+from elopackage.metrics import BrierScore, brier_score
+from elopackage.partition import rate_partitions
+from elopackage.registry import build_player_registry, TSID_COLS
+from elopackage.history import RatingHistory
 
 
 class ResultsTable:
-    def __init__(self, df):
+    def __init__(self, df, instrumentation=None, copy=True):
         """
         df - pd DataFrame of tournamenent results
+        instrumentation - Instrumentation - collects stage timers and counters from check_prediction. Default None
+        copy - bool - work on a deep copy of df. Default True
         """
         # self.df = df.sort_values(by='match_date_dt', ascending=True)
-        self.df = df.copy(deep=True)
+        self.df = df.copy(deep=True) if copy else df
+        # MatchStore the results table was built from - see from_store
+        self.store = None
         self.elo = Elo('test')
-        self.player_dict = {2000000: Player('dummy', 2000000)}
+        # Rating history of every player, shared rather than kept in a list per Player
+        self.history = RatingHistory()
+        self.player_dict = {2000000: Player('dummy', 2000000, history=self.history)}
         self.dummy_tsid = 2000001
         self.cold_start_threshold = 0
+        self.instrumentation = instrumentation
+        # EvalOutput of the last array engine check_prediction
+        self.evaluation = None
+
+    @classmethod
+    def from_store(cls, store, instrumentation=None):
+        """
+        Results table over a MatchStore, e.g from load_match_store. The array engine reads the store's interned
+        players and match columns directly rather than re-extracting them from self.df
+
+        :param store: MatchStore
+        :param instrumentation: Instrumentation - Default None
+        :return: ResultsTable
+        """
+        results = cls(store.to_frame(), instrumentation=instrumentation, copy=False)
+        results.store = store
+        results.dummy_tsid = max(results.dummy_tsid, store.dummy_tsid)
+        return results
 
     def add_players_to_dict(self, row, df_results, kfactor=None, sd=None):
         """
@@ -39,61 +70,111 @@ class ResultsTable:
 
         for ch, t, n in zip(col_headings, tsids, names):
             if np.isnan(t):
-                self.player_dict[self.dummy_tsid] = Player(n, self.dummy_tsid, kfactor=kfactor, sd=sd)
+                self.player_dict[self.dummy_tsid] = Player(n, self.dummy_tsid, kfactor=kfactor, sd=sd, history=self.history)
                 df_results.at[row['Index'], ch] = self.dummy_tsid
                 self.dummy_tsid += 1
             else:
                 if t not in self.player_dict:
-                    self.player_dict[t] = Player(n, t, kfactor=kfactor, sd=sd)
+                    self.player_dict[t] = Player(n, t, kfactor=kfactor, sd=sd, history=self.history)
+
+    def register_players(self, kfactor=None, sd=None):
+        """
+        Add all players in the results table to player_dict in one pass over pre-extracted columns
+
+        Equivalent to calling add_players_to_dict on every row: players are added in row order and missing tsids
+        are replaced in self.df by temp tsids starting at 2,000,001
+
+        :param kfactor: float - kfactor to assign to new player objects
+        :param sd: float - sd to assign to new player objects
+        :return: PlayerRegistry - player indices follow the order of player_dict
+        """
+        registry = build_player_registry(self.df, self.player_dict, self.dummy_tsid)
+        self.dummy_tsid = registry.dummy_tsid
+        for t, n in registry.new_players():
+            self.player_dict[t] = Player(n, t, kfactor=kfactor, sd=sd, history=self.history)
+        return registry
+
+    def to_engine(self):
+        """
+        Copy the current player ratings into a RatingEngine, e.g to save them and ingest later results incrementally
+
+        The high water mark is the latest match_date_dt in the results table.
+
+        :return: RatingEngine
+        """
+        engine = RatingEngine()
+        engine.load_players(self.player_dict)
+        engine.dummy_tsid = self.dummy_tsid
+        if self.df['match_date_dt'].notna().any():
+            engine.high_water_mark = np.datetime64(self.df['match_date_dt'].max(), 'ns')
+        return engine
+
+    def ratings_as_of(self, date):
+        """
+        Leaderboard as of a date - every player's rating after all matches dated on or before date, read from the
+        rating history rather than replaying the matches
+
+        :param date: datetime like - e.g '2019-06-01'
+        :return: pd DataFrame - tsid, name, rating - sorted by rating, players without a rating yet are left out
+        """
+        players = [p for p in self.player_dict.values() if p.history is self.history]
+        ratings = self.history.ratings_as_of(date)[[p.history_idx for p in players]]
+        df = pd.DataFrame({'tsid': [p.tsid for p in players], 'name': [p.name for p in players], 'rating': ratings})
+        return df.dropna(subset=['rating']).sort_values('rating', ascending=False, kind='stable').reset_index(drop=True)
+
+    def rate_partitions(self, by='event_title', kfactor=None, sd=None, mov=False, acf=None, backend='auto',
+                        max_workers=None, metrics=None):
+        """
+        Rate each value of a column (e.g each event_title) separately, in one replay rather than one ResultsTable per
+        category - see partition.rate_partitions. self.df and player_dict are left unchanged
+
+        :return: PartitionedRatings
+        """
+        return rate_partitions(self.df, by=by, kfactor=kfactor, sd=sd, mov=mov, acf=acf, backend=backend,
+                               max_workers=max_workers, metrics=metrics,
+                               cold_start_threshold=self.cold_start_threshold)
 
     def get_unique_players_in_category(self, category):
         """
         category - list (str) - tournament category e.g MS - Mens Singles
         """
         self.df = self.df[self.df['event_title'].isin(category)]
-        df_unique = pd.DataFrame()
-        for v in ['losing_team_p1', 'winning_team_p1']:
-            # Get unique players available from 2019 season
-            df_tmp = self.df[[f'{v}_tsid', v]].copy(deep=True)
-            df_tmp.drop_duplicates(subset=[f'{v}_tsid'], inplace=True)
-            df_tmp.columns = ['tsid', 'name']
-            df_unique = pd.concat([df_unique, df_tmp])
-
-        df_unique.drop_duplicates(inplace=True)
-        df_unique.reset_index(drop=True, inplace=True)
-        # Initiate all players with basic 1500 rating
-        df_unique['rating'] = 1500
-        self.df_unique = df_unique
+        self.df_unique = self._unique_players(['losing_team_p1', 'winning_team_p1'])
 
     def get_all_unique_players(self):
         """
         Find all unique players in results tables
         """
-        df_unique = pd.DataFrame()
-        for v in ['losing_team_p1', 'winning_team_p1']:
-            # Get unique players available from 2019 season
-            df_tmp = self.df[[f'{v}_tsid', v]].copy(deep=True)
-            df_tmp.drop_duplicates(subset=[f'{v}_tsid'], inplace=True)
-            df_tmp.columns = ['tsid', 'name']
-            df_unique = pd.concat([df_unique, df_tmp])
-
         # Add on doubles players
-        for v in ['losing_team_p2', 'winning_team_p2']:
-            # Get unique players available from 2019 season
-            df_tmp = self.df[self.df['Doubles'] == True][[f'{v}_tsid', v]].copy(deep=True)
-            df_tmp.drop_duplicates(subset=[f'{v}_tsid'], inplace=True)
-            df_tmp.columns = ['tsid', 'name']
-            df_unique = pd.concat([df_unique, df_tmp])
-
-        df_unique.drop_duplicates(inplace=True)
+        self.df_unique = self._unique_players(['losing_team_p1', 'winning_team_p1', 'losing_team_p2',
+                                               'winning_team_p2'])
+
+    def _unique_players(self, name_cols):
+        """
+        Unique (tsid, name) pairs over the given player columns, stacked in one frame rather than concatenated column
+        by column. p2 columns only count doubles matches. Each column keeps the first name seen per tsid
+
+        :param name_cols: list (str) - player name columns
+        :return: pd DataFrame - tsid, name, rating - all players initiated with basic 1500 rating
+        """
+        doubles = self.df['Doubles'].to_numpy(dtype=bool)
+        tsids, names, col_ids = [], [], []
+        for i, v in enumerate(name_cols):
+            rows = doubles if v.endswith('p2') else np.ones(len(self.df), dtype=bool)
+            tsids.append(self.df[f'{v}_tsid'].to_numpy()[rows])
+            names.append(self.df[v].to_numpy(dtype=object)[rows])
+            col_ids.append(np.full(rows.sum(), i))
+
+        df_unique = pd.DataFrame({'col': np.concatenate(col_ids), 'tsid': np.concatenate(tsids),
+                                  'name': np.concatenate(names)})
+        df_unique = df_unique.drop_duplicates(subset=['col', 'tsid'])[['tsid', 'name']].drop_duplicates()
         df_unique.reset_index(drop=True, inplace=True)
-        # Initiate all players with basic 1500 rating
         df_unique['rating'] = 1500
-        self.df_unique = df_unique
+        return df_unique
 
     @staticmethod
     def briers_score(predictions, actual):
-        return sum([(ft - ot) ** 2 for ft, ot in zip(predictions, actual)]) / len(predictions)
+        return brier_score(predictions, actual)
 
     @staticmethod
     def convert_double_to_single(p1, p2):
@@ -112,12 +193,14 @@ class ResultsTable:
         return tmp_p
 
     @staticmethod
-    def divide_doubles_points(p1, p2, pts_to_share):
+    def divide_doubles_points(p1, p2, pts_to_share, instrumentation=None):
         try:
             p1w_prc = (1 / (1 + math.exp((p1.rating - p2.rating) / p1.sd)))
         except OverflowError:
             print(f"{p1.name} - Rating: {p1.rating:.3f}")
             print(f"{p2.name} - Rating: {p2.rating:.3f}")
+            if instrumentation is not None:
+                instrumentation.count('overflow_errors')
             p1w_prc = 0
         p1w_pts = p1w_prc * pts_to_share
         p2w_pts = (1 - p1w_prc) * pts_to_share
@@ -183,8 +266,8 @@ class ResultsTable:
             tsids = [row[c] for c in col_headings]
             players_obj = [self.player_dict[t] for t in tsids]
 
-            team_w = self.convert_double_to_single(players_obj[0], players_obj[1])
-            team_l = self.convert_double_to_single(players_obj[2], players_obj[3])
+            team_w = Team(players_obj[0], players_obj[1])
+            team_l = Team(players_obj[2], players_obj[3])
 
             #Calculate ELO rating change and match prediction
             if mov:
@@ -195,8 +278,10 @@ class ResultsTable:
                 loser_pts_change = self.elo.rating_diff_mov(team_l, team_w, 0, auto_corr_val=acf)
 
             # Divide points between players - logistic function based on rating and sd
-            p1w_pts, p2w_pts = self.divide_doubles_points(players_obj[0], players_obj[1], winner_pts_change)
-            p1l_pts, p2l_pts = self.divide_doubles_points(players_obj[2], players_obj[3], loser_pts_change)
+            p1w_pts, p2w_pts = self.divide_doubles_points(players_obj[0], players_obj[1], winner_pts_change,
+                                                          instrumentation=self.instrumentation)
+            p1l_pts, p2l_pts = self.divide_doubles_points(players_obj[2], players_obj[3], loser_pts_change,
+                                                          instrumentation=self.instrumentation)
 
             pts = [p1w_pts, p2w_pts, p1l_pts, p2l_pts]
             pred = self.elo.expected(team_w, team_l)
@@ -224,7 +309,7 @@ class ResultsTable:
                                     }
         :return: int
         """
-        return np.min([len(p['player_obj'].rating_history) for p in result_dict['elo'].values()])
+        return np.min([p['player_obj'].match_count + 1 for p in result_dict['elo'].values()])
 
     @staticmethod
     def append_to_eval_cols(eval_cols, result_dict):
@@ -267,8 +352,8 @@ class ResultsTable:
                     eval_cols[f'{p}_rating_post'].append(var['player_obj'].rating + var['pts_chg'])
 
                     #check rating hist
-                    if len(var['player_obj'].rating_history) > min_rating_hist_len:
-                        min_rating_hist_len = len(var['player_obj'].rating_history)
+                    if var['player_obj'].match_count + 1 > min_rating_hist_len:
+                        min_rating_hist_len = var['player_obj'].match_count + 1
 
                 #Otherwise fill with np.nan
                 else:
@@ -284,13 +369,76 @@ class ResultsTable:
 
         return eval_cols
 
-    def check_prediction(self, kfactor=None, sd=None, mov=False, acf=None):
-
-        for row in self.df.itertuples():
-            #Add any new players to dict
-            self.add_players_to_dict(row, self.df, kfactor=kfactor, sd=sd)
+    def check_prediction(self, kfactor=None, sd=None, mov=False, acf=None, engine='python', backend='auto',
+                         eval_columns='all', eval_dtype=np.float64, metrics=None, decay=None, fit=None):
+        """
+        Replay every match in the results table, updating player ratings and appending evaluation columns to self.df
 
-        predictions, actual = [], []
+        :param kfactor: float - kfactor to assign to new player objects
+        :param sd: float - sd to assign to new player objects
+        :param mov: bool - Whether to include MOV in rating diff. Default to False
+        :param acf: int - Auto-corr-factor in rating diff - typically ~ 1500-2500. Default to None
+        :param engine: str - 'python' replays row by row with Player objects, 'array' replays over NumPy arrays of
+                             interned players. Both give the same results. 'batch' fits every rating at once to the
+                             whole table instead of replaying it - see batch.BradleyTerry - and scores each match
+                             with the fitted ratings (in sample). Default to 'python'
+        :param backend: str - loop used by the array engine - 'numba' (compiled, requires numba), 'python' or 'auto'
+                              for numba when it is installed. Default to 'auto'
+        :param eval_columns: str or list - evaluation columns to add to self.df. 'all' adds the columns of
+                             append_to_eval_cols, None adds none (Brier score only) and a list adds only those columns
+                             - see evaluation.LEGACY_COLUMNS and, for the array engine, the typed columns of
+                             evaluation.TYPED_COLUMNS. Default to 'all'
+        :param eval_dtype: np.dtype - dtype of prediction and rating columns from the array engine. Default np.float64
+        :param metrics: MetricSet - further metrics to accumulate over the replay, e.g log loss and calibration per
+                        match type - see metrics.MetricSet. Default None
+        :param decay: InactivityDecay - grow player sds with inactivity, applied to each player as they next play -
+                      see decay.InactivityDecay. Python engine only. Default None
+        :param fit: BradleyTerry - options of the batch engine, e.g time weighting. kfactor, mov and acf don't apply.
+                    Default None - BradleyTerry()
+        :return: float - Brier score of predictions
+        """
+        if metrics is not None and metrics.cold_start_threshold is None:
+            metrics.cold_start_threshold = self.cold_start_threshold
+        if decay is not None:
+            if engine != 'python':
+                raise ValueError("decay needs engine='python'")
+            # Default bounds follow the sd new players start with - same truthiness as Player.__init__
+            decay = decay.for_sd(sd if sd else DEFAULT_SD)
+            # Later Elo.expected(..., date=...) queries read effective sds too
+            self.elo.decay = decay
+
+        if engine == 'array':
+            return self._check_prediction_array(kfactor=kfactor, sd=sd, mov=mov, acf=acf, backend=backend,
+                                                eval_columns=eval_columns, eval_dtype=eval_dtype, metrics=metrics)
+        elif engine == 'batch':
+            # scipy (optimize, sparse) is loaded only when the batch engine is used
+            from elopackage.batch import BradleyTerry
+            return self._check_prediction_array(kfactor=kfactor, sd=sd, eval_columns=eval_columns,
+                                                eval_dtype=eval_dtype, metrics=metrics,
+                                                fit=BradleyTerry() if fit is None else fit)
+        elif engine != 'python':
+            raise ValueError("Allowable values for engine are: 'python', 'array', 'batch'")
+
+        if eval_columns == 'all':
+            eval_columns = LEGACY_COLUMNS
+        elif eval_columns is not None and not set(eval_columns) <= set(LEGACY_COLUMNS):
+            raise ValueError("Typed evaluation columns need engine='array'")
+
+        inst = self.instrumentation
+        if inst is not None:
+            start = time.perf_counter()
+            n_players, dummy_tsid = len(self.player_dict), self.dummy_tsid
+
+        #Add any new players to dict
+        self.register_players(kfactor=kfactor, sd=sd)
+
+        if inst is not None:
+            inst.add_time('register_players', time.perf_counter() - start)
+            self._count_new_players(n_players, dummy_tsid)
+            t_prediction = t_update = t_eval_cols = 0.0
+
+        # Accumulated as the matches are replayed rather than kept as a list of predictions
+        score = BrierScore()
 
         eval_cols = {'prediction': [],
                      'actual': [],
@@ -309,29 +457,167 @@ class ResultsTable:
                      'min_rating_hist_len': []
                      }
 
-        for row in self.df.itertuples():
+        # Dates as int64 nanoseconds (NaT -> NAT), converted once for the RatingHistory rather than per update
+        if 'match_date_dt' in self.df.columns:
+            dates_ns = self.df['match_date_dt'].to_numpy(dtype='datetime64[ns]').view(np.int64).tolist()
+        else:
+            dates_ns = [None] * len(self.df)
+
+        for match_idx, row in enumerate(self.df.itertuples()):
+            if inst is not None:
+                t0 = time.perf_counter()
+
             row = row._asdict()
+            if decay is not None:
+                players = [self.player_dict[row[c]] for c in (TSID_COLS if row['Doubles'] else TSID_COLS[::2])]
+                # Inactivity is applied to these players only, as of this match
+                decay.catch_up(players, row['match_date_dt'])
+
             # Account for Doubles Matches
             if row['Doubles']:
                 result_dict = self.doubles_match_update(row, mov=mov, acf=acf)
             else:
                 result_dict = self.singles_match_update(row, mov=mov, acf=acf)
 
+            if inst is not None:
+                t1 = time.perf_counter()
+                t_prediction += t1 - t0
+
             #Update eval cols
-            eval_cols = self.append_to_eval_cols(eval_cols, result_dict)
+            if eval_columns is not None:
+                eval_cols = self.append_to_eval_cols(eval_cols, result_dict)
+
+            if inst is not None:
+                t2 = time.perf_counter()
+                t_eval_cols += t2 - t1
 
             # If the results could be processed
             if result_dict:
                 # update prediction tracker
-                if self.check_min_match_history(result_dict) >= self.cold_start_threshold:
-                    predictions.append(result_dict['prediction'])
-                    actual.append(1)
+                hist_len = self.check_min_match_history(result_dict)
+                if hist_len >= self.cold_start_threshold:
+                    score.update(result_dict['prediction'])
+                if metrics is not None:
+                    metrics.update(result_dict['prediction'], hist_len, doubles=row['Doubles'], columns=row,
+                                   date=row.get('match_date_dt'))
 
                 # Update player elo ratings and history of elo rating
                 for v in result_dict['elo'].values():
-                    v['player_obj'].update_rating(v['pts_chg'])
+                    v['player_obj'].update_rating(v['pts_chg'], match_idx=match_idx, match_date=dates_ns[match_idx])
+                if decay is not None:
+                    decay.played(players, row['match_date_dt'])
+
+            if inst is not None:
+                t_update += time.perf_counter() - t2
+                inst.count('matches_processed' if result_dict else 'matches_skipped')
+
+        if inst is not None:
+            start = time.perf_counter()
+
+        if eval_columns is not None:
+            df_new_cols = pd.DataFrame.from_dict(eval_cols)[list(eval_columns)]
+            self.df = pd.concat([self.df.reset_index(drop=True), df_new_cols], axis=1)
 
-        df_new_cols = pd.DataFrame.from_dict(eval_cols)
-        self.df = pd.concat([self.df.reset_index(drop=True), df_new_cols], axis=1)
+        if inst is not None:
+            inst.add_time('prediction', t_prediction)
+            inst.add_time('update', t_update)
+            inst.add_time('eval_cols', t_eval_cols + time.perf_counter() - start)
+            inst.count('predictions_scored', score.n)
+            inst.flush()
 
-        return self.briers_score(predictions, actual)
\ No newline at end of file
+        return score.result()
+
+    def _count_new_players(self, n_players, dummy_tsid):
+        """
+        Count players and dummy tsids added to player_dict since it held n_players players
+        """
+        self.instrumentation.count('new_players', len(self.player_dict) - n_players)
+        self.instrumentation.count('dummy_tsids', self.dummy_tsid - dummy_tsid)
+
+    def _store_matches(self, kfactor=None, sd=None):
+        """
+        Register the players of self.store and map its matches onto engine indices
+
+        :return: tuple - RatingEngine, MatchArrays
+        """
+        tsids = self.store.tsids.tolist()
+        for t, n in zip(tsids, self.store.player_names().tolist()):
+            if t not in self.player_dict:
+                self.player_dict[t] = Player(n, t, kfactor=kfactor, sd=sd, history=self.history)
+
+        engine = self.to_engine()
+        mapping = np.array([engine.index[t] for t in tsids], dtype=np.int64)
+        players = np.asarray(self.store.players)
+        players = np.where(players >= 0, mapping[players], -1)
+        return engine, MatchArrays(players, np.asarray(self.store.doubles),
+                                   np.asarray(self.store.pts_diff, dtype=np.float64))
+
+    def _check_prediction_array(self, kfactor=None, sd=None, mov=False, acf=None, backend='auto', eval_columns='all',
+                                eval_dtype=np.float64, metrics=None, fit=None):
+        """
+        Array engine implementation of check_prediction - see RatingEngine. With fit, ratings are fitted by the batch
+        engine instead of replayed
+        """
+        inst = self.instrumentation
+        if inst is not None:
+            start = time.perf_counter()
+            n_players, dummy_tsid = len(self.player_dict), self.dummy_tsid
+
+        if self.store is None:
+            registry = self.register_players(kfactor=kfactor, sd=sd)
+            engine = self.to_engine()
+            matches = MatchArrays(registry.players, self.df['Doubles'].to_numpy(dtype=bool),
+                                  self.df['pts_diff'].to_numpy(dtype=np.float64))
+        else:
+            engine, matches = self._store_matches(kfactor=kfactor, sd=sd)
+
+        if inst is not None:
+            inst.add_time('register_players', time.perf_counter() - start)
+            self._count_new_players(n_players, dummy_tsid)
+            start = time.perf_counter()
+
+        dates = self.df['match_date_dt'].to_numpy(dtype='datetime64[ns]') if 'match_date_dt' in self.df else None
+        if fit is None:
+            output = engine.replay(matches, mov=mov, acf=acf, backend=backend)
+        else:
+            output = fit.fit(engine, matches, dates=dates)
+
+        if inst is not None:
+            # Predictions and updates are computed together in the replay loop
+            inst.add_time('replay', time.perf_counter() - start)
+            start = time.perf_counter()
+
+        if eval_columns == 'all':
+            eval_columns = LEGACY_COLUMNS
+        names = None
+        if eval_columns is not None and any(c.endswith('_name') for c in eval_columns):
+            names = np.array([p.name for p in self.player_dict.values()], dtype=object)
+        # Columns are built from the replay arrays when asked for - see EvalOutput
+        self.evaluation = EvalOutput(matches, output, names=names, float_dtype=eval_dtype)
+        engine.sync_players(self.player_dict, output, matches, dates=dates)
+        self.engine = engine
+
+        if eval_columns is not None:
+            # Added one at a time rather than concatenated, so the results table isn't copied
+            df = self.df.reset_index(drop=True)
+            for c in eval_columns:
+                df[c] = self.evaluation.column(c)
+            self.df = df
+
+        if metrics is not None:
+            columns = {c: self.df[c].to_numpy() for c in metrics.by if c in self.df.columns}
+            dates = self.df['match_date_dt'].to_numpy() if 'match_date_dt' in self.df.columns else None
+            metrics.update_batch(output['prediction'], output['hist_len_min'], doubles=matches.doubles,
+                                 columns=columns, dates=dates, processed=output['processed'])
+
+        scored = output['processed'] & (output['hist_len_min'] >= self.cold_start_threshold)
+
+        if inst is not None:
+            inst.add_time('eval_cols', time.perf_counter() - start)
+            inst.count('matches_processed', int(output['processed'].sum()))
+            inst.count('matches_skipped', int((~output['processed']).sum()))
+            inst.count('overflow_errors', engine.count_split_overflows(matches, output))
+            inst.count('predictions_scored', int(scored.sum()))
+            inst.flush()
+
+        return self.evaluation.briers_score(self.cold_start_threshold)
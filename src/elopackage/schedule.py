@@ -0,0 +1,259 @@
+import heapq
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from elopackage.kernels import EXP_LIMIT, POW10_LIMIT
+from elopackage.player import DEFAULT_KFACTOR
+
+OUTPUT_COLUMNS = ['prediction', 'rating_prior', 'pts_chg', 'hist_len_min', 'hist_len_max', 'processed']
+
+# NumPy's vectorized exp, log and power can differ from the C library in the last bit, which would let batched
+# ratings drift from the sequential replay. These apply the math module functions element-wise instead
+_exp = np.frompyfunc(math.exp, 1, 1)
+_log = np.frompyfunc(math.log, 1, 1)
+_pow = np.frompyfunc(math.pow, 2, 1)
+
+
+def _libm(ufunc, *args):
+    return ufunc(*args).astype(np.float64) if np.size(args[-1]) else np.empty(0)
+
+
+def empty_output(n):
+    """
+    Per match replay outputs before any match is applied - see RatingEngine.replay
+    """
+    return {'prediction': np.full(n, np.nan),
+            'rating_prior': np.full((n, 4), np.nan),
+            'pts_chg': np.full((n, 4), np.nan),
+            'hist_len_min': np.zeros(n, dtype=np.int64),
+            'hist_len_max': np.zeros(n, dtype=np.int64),
+            'processed': np.zeros(n, dtype=bool)}
+
+
+def match_waves(players):
+    """
+    Split a date sorted match stream into waves of player-disjoint matches
+
+    Each match goes in the wave after the latest wave any of its players has played in, so no player appears twice
+    in a wave and every player's matches keep their order. Applying the waves in turn gives the same ratings as
+    applying the matches one by one.
+
+    :param players: np.array (int64) - shape (n_matches, 4) - player index per role, -1 if empty
+    :return: np.array (int64) - wave number per match, from 0
+    """
+    n_players = int(players.max()) + 1 if players.size else 0
+    # Player slot -1 (empty) writes to the extra entry at the end, which is never read back for a real player
+    last = [0] * (n_players + 1)
+    waves = [0] * len(players)
+    for i, (a, b, c, d) in enumerate(players.tolist()):
+        w = max(last[a], last[b], last[c], last[d])
+        waves[i] = w
+        last[a] = last[b] = last[c] = last[d] = w + 1
+        last[-1] = 0
+    return np.array(waves, dtype=np.int64)
+
+
+def player_components(players, n_players):
+    """
+    Connected components of the player graph - players are linked when they appear in the same match
+
+    :param players: np.array (int64) - shape (n_matches, 4) - player index per role, -1 if empty
+    :param n_players: int - number of interned players
+    :return: np.array (int32) - component label per player
+    """
+    # Only needed to shard a replay - scipy is imported here rather than with the engine
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+    a = np.repeat(players[:, 0], 3)
+    others = players[:, 1:].ravel()
+    linked = others >= 0
+    graph = coo_matrix((np.ones(linked.sum(), dtype=np.int8), (a[linked], others[linked])),
+                       shape=(n_players, n_players))
+    return connected_components(graph, directed=False)[1]
+
+
+def shard_matches(players, n_players, n_shards):
+    """
+    Group the matches of whole player communities into n_shards shards of similar match counts
+
+    :param players: np.array (int64) - shape (n_matches, 4) - player index per role, -1 if empty
+    :param n_players: int - number of interned players
+    :param n_shards: int - maximum number of shards
+    :return: list of np.array (int64) - match indices per non-empty shard, in match order
+    """
+    components = player_components(players, n_players)[players[:, 0]]
+    sizes = np.bincount(components)
+
+    # Largest communities first, each to the shard with the fewest matches so far
+    shard_of = np.zeros(len(sizes), dtype=np.int64)
+    heap = [(0, s) for s in range(n_shards)]
+    for comp in np.argsort(-sizes, kind='stable').tolist():
+        if sizes[comp] == 0:
+            break
+        load, s = heapq.heappop(heap)
+        shard_of[comp] = s
+        heapq.heappush(heap, (load + int(sizes[comp]), s))
+
+    match_shard = shard_of[components]
+    shards = [np.flatnonzero(match_shard == s) for s in range(n_shards)]
+    return [s for s in shards if len(s)]
+
+
+def replay_waves(ratings, sds, kfactors, counts, players, doubles, pts_diff, mov=False, acf=None, waves=None):
+    """
+    RatingEngine.replay with each wave of player-disjoint matches applied as one batched array operation
+
+    ratings and counts are updated in place. Arithmetic follows the sequential replay term by term, and matches which
+    would raise an OverflowError there are skipped.
+
+    :param ratings: np.array (float64) - rating per player index
+    :param sds: np.array (float64) - sd per player index
+    :param kfactors: np.array (float64) - kfactor per player index
+    :param counts: np.array (int64) - match count per player index
+    :param players: np.array (int64) - shape (n_matches, 4) - player index per role, -1 if empty
+    :param doubles: np.array (bool) - doubles flag per match
+    :param pts_diff: np.array (float64) - margin of victory per match
+    :param mov: bool - Whether to include MOV in rating diff. Default to False
+    :param acf: int - Auto-corr-factor in rating diff. Default to None
+    :param waves: np.array (int64) - wave number per match. Default None - from match_waves
+    :return: dict - same per match arrays as RatingEngine.replay
+    """
+    n = len(doubles)
+    if waves is None:
+        waves = match_waves(players)
+    order = np.argsort(waves, kind='stable')
+    bounds = np.searchsorted(waves[order], np.arange(waves.max() + 2 if n else 1))
+
+    output = empty_output(n)
+
+    # Mirrors `if mov and pts_diff` - nan is truthy
+    if mov:
+        with np.errstate(invalid='ignore'):
+            mov_kfactors = np.where(pts_diff != 0, _libm(_log, 1 + np.abs(pts_diff)), 1.0)
+    else:
+        mov_kfactors = np.ones(n)
+
+    with np.errstate(over='ignore', invalid='ignore'):
+        for w in range(len(bounds) - 1):
+            idx = order[bounds[w]:bounds[w + 1]]
+            _apply_wave(idx, ratings, sds, kfactors, counts, players, doubles, mov_kfactors, acf, output)
+    return output
+
+
+def _apply_wave(idx, ratings, sds, kfactors, counts, players, doubles, mov_kfactors, acf, output):
+    a, b, c, d = players[idx].T
+    dbl = doubles[idx]
+    # Singles have no p2 (-1), read any rating and discard it
+    b, d = np.where(dbl, b, 0), np.where(dbl, d, 0)
+
+    ra, rb, rc, rd = ratings[a], ratings[b], ratings[c], ratings[d]
+    sda, sdc = sds[a], sds[c]
+    rw = np.where(dbl, (ra + rb) / 2, ra)
+    rl = np.where(dbl, (rc + rd) / 2, rc)
+    sdw = np.where(dbl, np.sqrt(sda ** 2 + sda ** 2), sda)
+    sdl = np.where(dbl, np.sqrt(sdc ** 2 + sdc ** 2), sdc)
+    # Doubles teams always have the default kfactor - see Team
+    kw = np.where(dbl, DEFAULT_KFACTOR, kfactors[a])
+    kl = np.where(dbl, DEFAULT_KFACTOR, kfactors[c])
+
+    # Matches the sequential replay would skip with an OverflowError
+    xw, xl = (rl - rw) / sdw, (rw - rl) / sdl
+    ok = ~((xw > POW10_LIMIT) | (xl > POW10_LIMIT))
+    # Overflowing matches are dropped, clip so math.pow doesn't raise
+    expected_w = 1 / (1 + _libm(_pow, 10.0, np.minimum(xw, POW10_LIMIT)))
+    expected_l = 1 / (1 + _libm(_pow, 10.0, np.minimum(xl, POW10_LIMIT)))
+    if acf:
+        aw, al = (rw - rl) / acf, (rl - rw) / acf
+        ok &= ~((aw > EXP_LIMIT) | (al > EXP_LIMIT))
+        auto_w = 2 / (1 + _libm(_exp, np.minimum(aw, EXP_LIMIT)))
+        auto_l = 2 / (1 + _libm(_exp, np.minimum(al, EXP_LIMIT)))
+    else:
+        auto_w = auto_l = 1
+
+    mov_k = mov_kfactors[idx]
+    winner_pts_change = (1 - expected_w) * kw * mov_k * auto_w
+    loser_pts_change = (0 - expected_l) * kl * mov_k * auto_l
+
+    # Split as in ResultsTable.divide_doubles_points - all points to p2 on overflow
+    x1, x2 = (ra - rb) / sda, (rc - rd) / sdc
+    p1w_prc = np.where(x1 > EXP_LIMIT, 0.0, 1 / (1 + _libm(_exp, np.minimum(x1, EXP_LIMIT))))
+    p1l_prc = np.where(x2 > EXP_LIMIT, 0.0, 1 / (1 + _libm(_exp, np.minimum(x2, EXP_LIMIT))))
+    chg = np.column_stack([np.where(dbl, p1w_prc * winner_pts_change, winner_pts_change),
+                           np.where(dbl, (1 - p1w_prc) * winner_pts_change, np.nan),
+                           np.where(dbl, p1l_prc * loser_pts_change, loser_pts_change),
+                           np.where(dbl, (1 - p1l_prc) * loser_pts_change, np.nan)])
+    prior = np.column_stack([ra, np.where(dbl, rb, np.nan), rc, np.where(dbl, rd, np.nan)])
+
+    ca, cb, cc, cd = counts[a], counts[b], counts[c], counts[d]
+    big = np.iinfo(np.int64).max
+    hist_min = np.minimum(np.minimum(ca, cc), np.minimum(np.where(dbl, cb, big), np.where(dbl, cd, big))) + 1
+    hist_max = np.maximum(np.maximum(ca, cc), np.maximum(np.where(dbl, cb, 0), np.where(dbl, cd, 0))) + 1
+
+    m = idx[ok]
+    output['prediction'][m] = expected_w[ok]
+    output['processed'][m] = True
+    output['rating_prior'][m] = prior[ok]
+    output['pts_chg'][m] = chg[ok]
+    output['hist_len_min'][m] = hist_min[ok]
+    output['hist_len_max'][m] = hist_max[ok]
+
+    # Players are distinct across the matches of a wave, so each scatter touches a player at most once. Roles are
+    # added in the sequential order, for data where one player fills two roles of a match
+    okd = ok & dbl
+    ratings[a[ok]] += chg[ok, 0]
+    ratings[b[okd]] += chg[okd, 1]
+    ratings[c[ok]] += chg[ok, 2]
+    ratings[d[okd]] += chg[okd, 3]
+    counts[a[ok]] += 1
+    counts[b[okd]] += 1
+    counts[c[ok]] += 1
+    counts[d[okd]] += 1
+
+
+def _replay_shard(ratings, sds, kfactors, counts, players, doubles, pts_diff, mov, acf):
+    """
+    Worker - replay the matches of one shard over its own players
+    """
+    output = replay_waves(ratings, sds, kfactors, counts, players, doubles, pts_diff, mov=mov, acf=acf)
+    return ratings, counts, output
+
+
+def replay_sharded(ratings, sds, kfactors, counts, players, doubles, pts_diff, mov=False, acf=None,
+                   max_workers=None):
+    """
+    replay_waves with disconnected player communities sharded across worker processes
+
+    Communities share no players, so their matches can be replayed independently and the results stitched back
+    together in match order. ratings and counts are updated in place.
+
+    :param max_workers: int - number of worker processes. 1 replays in this process. Default os.cpu_count()
+    :return: dict - same per match arrays as RatingEngine.replay
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count()
+    shards = shard_matches(players, len(ratings), max_workers)
+    if len(shards) <= 1:
+        return replay_waves(ratings, sds, kfactors, counts, players, doubles, pts_diff, mov=mov, acf=acf)
+
+    jobs = []
+    shard_players = []
+    for rows in shards:
+        p = players[rows]
+        local = np.unique(p[p >= 0])
+        shard_players.append(local)
+        p_local = np.where(p >= 0, np.searchsorted(local, p), -1)
+        jobs.append((ratings[local], sds[local], kfactors[local], counts[local], p_local, doubles[rows],
+                     pts_diff[rows], mov, acf))
+
+    n = len(doubles)
+    output = empty_output(n)
+
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(shards))) as pool:
+        results = pool.map(_replay_shard, *zip(*jobs))
+        for rows, local, (shard_ratings, shard_counts, shard_output) in zip(shards, shard_players, results):
+            ratings[local] = shard_ratings
+            counts[local] = shard_counts
+            for col in OUTPUT_COLUMNS:
+                output[col][rows] = shard_output[col]
+    return output
@@ -0,0 +1,184 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from elopackage.predict import PredictionService
+
+
+def _knockout_batch(probs, draw, n_sims, seed):
+    """
+    Worker - play n_sims brackets and count how far each entrant gets
+
+    :return: np.array (int64) - shape (n_entrants, n_rounds + 1) - sims in which each entrant won at least r matches
+    """
+    rng = np.random.default_rng(seed)
+    n_entrants = len(probs)
+    n_rounds = int(np.log2(len(draw)))
+    reached = np.zeros((n_entrants, n_rounds + 1), dtype=np.int64)
+    alive = np.broadcast_to(draw, (n_sims, len(draw)))
+    # Byes (-1) read the extra row and column and always lose
+    probs = np.pad(probs, ((0, 1), (0, 1)), constant_values=1.0)
+    probs[-1, :] = 0.0
+
+    reached[:, 0] = np.bincount(draw[draw >= 0], minlength=n_entrants) * n_sims
+    for r in range(1, n_rounds + 1):
+        a, b = alive[:, 0::2], alive[:, 1::2]
+        a_wins = rng.random(a.shape) < probs[a, b]
+        alive = np.where(a_wins, a, b)
+        winners = alive[alive >= 0]
+        reached[:, r] = np.bincount(winners, minlength=n_entrants)
+    return reached
+
+
+def _round_robin_batch(probs, n_legs, n_sims, seed):
+    """
+    Worker - play n_sims round robins and count the finishing positions of each entrant
+
+    :return: np.array (int64) - shape (n_entrants, n_entrants) - sims in which entrant i finished in position j + 1
+    """
+    rng = np.random.default_rng(seed)
+    n = len(probs)
+    i, j = np.triu_indices(n, k=1)
+    p = probs[i, j]
+    # Pair -> entrant incidence, so the wins of every sim are summed in one matrix product
+    first = np.zeros((len(p), n), dtype=np.float32)
+    first[np.arange(len(p)), i] = 1
+    second = np.zeros((len(p), n), dtype=np.float32)
+    second[np.arange(len(p)), j] = 1
+    wins = np.zeros((n_sims, n), dtype=np.float32)
+    for _ in range(n_legs):
+        i_wins = (rng.random((n_sims, len(p))) < p).astype(np.float32)
+        wins += i_wins @ first + (1 - i_wins) @ second
+    # Ties on wins are broken at random
+    order = np.lexsort((rng.random(wins.shape), -wins), axis=1)
+    positions = np.zeros((n, n), dtype=np.int64)
+    for pos in range(n):
+        positions[:, pos] = np.bincount(order[:, pos], minlength=n)
+    return positions
+
+
+def seeded_draw(n_entrants):
+    """
+    Standard seeded bracket - seed 1 and 2 can only meet in the final, 1 to 4 in the semi finals and so on
+
+    The field is padded with byes to a power of 2. Byes take the places of the lowest seeds, so they go to the top
+    seeds and never meet each other.
+
+    :param n_entrants: int
+    :return: np.array (int64) - entrant index (seed - 1) per bracket slot, -1 for a bye
+    """
+    size = 1 << max(int(np.ceil(np.log2(max(n_entrants, 2)))), 1)
+    seeds = np.array([1])
+    while len(seeds) < size:
+        # Each seed s meets 2 * len + 1 - s in the round before
+        seeds = np.column_stack([seeds, 2 * len(seeds) + 1 - seeds]).ravel()
+    return np.where(seeds <= n_entrants, seeds - 1, -1).astype(np.int64)
+
+
+class TournamentSimulator:
+    def __init__(self, engine, teams, rv=False):
+        """
+        Monte Carlo forecasts of knockout and round robin tournaments from current ratings
+
+        Win probabilities between every pair of entrants are computed once with the same team model and logistic (or
+        normal CDF) function as PredictionService. Elo.expected uses team A's sd only, so the probability of i beating
+        j is averaged over both orders - identical when the sds are equal. Simulations are drawn for whole batches of
+        brackets at once.
+
+        :param engine: RatingEngine - ratings to simulate from, e.g ResultsTable.to_engine()
+        :param teams: list - entrants, each a tsid or a (p1 tsid, p2 tsid) tuple for doubles. Unknown players are
+                      rated as new players
+        :param rv: bool - use the normal CDF (Elo.expected_rv) rather than the logistic function. Default False
+        """
+        self.teams = list(teams)
+        service = PredictionService(engine, maxsize=0, rv=rv)
+        n = len(self.teams)
+        pairs = [(a, b) for a in self.teams for b in self.teams]
+        p = service.predict(pairs).reshape(n, n) if n else np.empty((0, 0))
+        self.probs = (p + 1 - p.T) / 2
+        np.fill_diagonal(self.probs, 0.5)
+        self.ratings = service.team_ratings(self.teams)[0]
+
+    def _run(self, worker, args, n_sims, seed, max_workers, batch_size):
+        """
+        Split n_sims into batches with independent random streams, run them across max_workers processes and sum
+        the counts
+        """
+        if n_sims < 1:
+            raise ValueError(f'n_sims must be at least 1, not {n_sims}')
+        if batch_size < 1:
+            raise ValueError(f'batch_size must be at least 1, not {batch_size}')
+        sizes = [batch_size] * (n_sims // batch_size) + ([n_sims % batch_size] if n_sims % batch_size else [])
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        jobs = [args + (size, s) for size, s in zip(sizes, seeds)]
+        if max_workers is None:
+            max_workers = os.cpu_count()
+        if max_workers <= 1 or len(jobs) <= 1:
+            return sum(worker(*job) for job in jobs)
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(jobs))) as pool:
+            return sum(pool.map(worker, *zip(*jobs)))
+
+    def _frame(self, columns):
+        df = pd.DataFrame({'team': self.teams, 'rating': self.ratings})
+        for c, values in columns.items():
+            df[c] = values
+        return df
+
+    def knockout(self, draw=None, n_sims=100000, seed=None, max_workers=1, batch_size=50000):
+        """
+        Simulate a single elimination bracket
+
+        :param draw: list (int) - entrant index (position in teams) per bracket slot, -1 for a bye - slot 2k plays
+                     slot 2k + 1 in the first round. Its length must be a power of 2 and no two byes may meet.
+                     Default None - teams seeded in the order given - see seeded_draw
+        :param n_sims: int - number of simulated brackets. Default 100,000
+        :param seed: int - seed of the random streams, for reproducible forecasts. Default None
+        :param max_workers: int - processes to spread the batches over. None uses os.cpu_count(). Default 1
+        :param batch_size: int - brackets simulated at once per batch. Default 50,000
+        :return: pd DataFrame - per team: rating, probability of reaching each round (last_N, final) and of winning
+                 the title, and expected finishing position (winner 1, runner up 2, semi finalists 3, ...)
+        """
+        if draw is None:
+            draw = seeded_draw(len(self.teams))
+        else:
+            draw = np.asarray(draw, dtype=np.int64)
+            if len(draw) < 2 or len(draw) & (len(draw) - 1):
+                raise ValueError(f'draw must have a power of 2 slots, with -1 for byes - not {len(draw)}')
+            if ((draw[0::2] < 0) & (draw[1::2] < 0)).any():
+                raise ValueError('two byes meet in the first round of draw - a bye would advance unopposed')
+        size = len(draw)
+        n_rounds = int(np.log2(size))
+
+        reached = self._run(_knockout_batch, (self.probs, draw), n_sims, seed, max_workers, batch_size)
+        in_draw = np.maximum(reached[:, 0], 1)
+
+        columns = {}
+        for r in range(1, n_rounds):
+            left = size >> r
+            columns['final' if left == 2 else f'last_{left}'] = reached[:, r] / in_draw
+        columns['title'] = reached[:, n_rounds] / in_draw
+        # Losing in round r (1 = first round) finishes level with the other losers of that round
+        position = np.array([2 ** (n_rounds - r) + 1 for r in range(1, n_rounds + 1)] + [1], dtype=np.float64)
+        eliminated = reached - np.append(reached[:, 1:], np.zeros((len(reached), 1), dtype=np.int64), axis=1)
+        columns['expected_position'] = np.where(reached[:, 0] > 0, eliminated @ position / in_draw, np.nan)
+        return self._frame(columns)
+
+    def round_robin(self, n_sims=100000, n_legs=1, seed=None, max_workers=1, batch_size=10000):
+        """
+        Simulate a round robin where every pair of teams plays n_legs times - ranked on wins, ties broken at random
+
+        :param n_sims: int - number of simulated tournaments. Default 100,000
+        :param n_legs: int - matches between each pair. Default 1
+        :param seed: int - seed of the random streams, for reproducible forecasts. Default None
+        :param max_workers: int - processes to spread the batches over. None uses os.cpu_count(). Default 1
+        :param batch_size: int - tournaments simulated at once per batch. Default 10,000
+        :return: pd DataFrame - per team: rating, probability of winning the title, expected finishing position and
+                 the probability of each finishing position (position_1, position_2, ...)
+        """
+        positions = self._run(_round_robin_batch, (self.probs, n_legs), n_sims, seed, max_workers, batch_size)
+        probs = positions / n_sims
+        columns = {'title': probs[:, 0],
+                   'expected_position': probs @ np.arange(1, len(probs) + 1)}
+        for pos in range(len(probs)):
+            columns[f'position_{pos + 1}'] = probs[:, pos]
+        return self._frame(columns)
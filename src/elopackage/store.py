@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from elopackage.registry import build_player_registry, TSID_COLS, NAME_COLS
+from elopackage.preprocess import preprocess_tour_data, parse_scores, NAT_SORT_KEY, match_date_sort_key
+
+# Bump when the layout of the files written by MatchStore.save or the preprocessing they cache changes, so old
+# caches are rebuilt - 2: day first DATE_FORMATS and the int64 date sort key, 3: event_titles
+STORE_VERSION = 3
+
+ARRAY_COLUMNS = ['players', 'dates', 'doubles', 'pts_diff', 'winning_games', 'losing_games', 'n_games', 'tsids',
+                 'names', 'event_titles']
+
+
+class MatchStore:
+    def __init__(self, players, dates, doubles, pts_diff, winning_games, losing_games, n_games, tsids, names,
+                 event_titles, dummy_tsid):
+        """
+        Preprocessed results stored column by column, with players interned to integer indices
+
+        :param players: np.array (int64) - shape (n_matches, 4) - index into tsids/names per role (p1w, p2w, p1l,
+                        p2l), -1 if empty
+        :param dates: np.array (int64) - match_date_dt as ns since epoch, NAT_SORT_KEY if missing
+        :param doubles: np.array (bool) - doubles flag
+        :param pts_diff: np.array (int64) - total points difference to the winner
+        :param winning_games: np.array (int64) - shape (n_matches, max games) - winning team points per game, 0 padded
+        :param losing_games: np.array (int64) - shape (n_matches, max games) - losing team points per game, 0 padded
+        :param n_games: np.array (int64) - number of games per match
+        :param tsids: np.array (float64) - tsid per player index, temp tsids assigned from 2,000,001
+        :param names: np.array (str) - name per player index, '' if missing
+        :param event_titles: np.array (str) - event_title per match e.g MS, '' if missing - kept so metrics and
+                             partitions can slice a table built from the store by event
+        :param dummy_tsid: int - next temp tsid to assign
+        """
+        self.players = players
+        self.dates = dates
+        self.doubles = doubles
+        self.pts_diff = pts_diff
+        self.winning_games = winning_games
+        self.losing_games = losing_games
+        self.n_games = n_games
+        self.tsids = tsids
+        self.names = names
+        self.event_titles = event_titles
+        self.dummy_tsid = dummy_tsid
+
+    def __len__(self):
+        return len(self.doubles)
+
+    @classmethod
+    def from_df(cls, df):
+        """
+        Build a store from the output of preprocess_tour_data
+
+        :param df: pd DataFrame - preprocessed results
+        :return: MatchStore
+        """
+        columns = TSID_COLS + NAME_COLS + ['match_date_dt', 'Doubles', 'pts_diff', 'winning_team_scores',
+                                           'losing_team_scores', 'event_title']
+        df = df[[c for c in columns if c in df.columns]].reset_index(drop=True)
+        registry = build_player_registry(df)
+        names = registry.names.copy()
+        names[pd.isna(names)] = ''
+        doubles = df['Doubles'].to_numpy(dtype=bool)
+
+        winning = parse_scores(df['winning_team_scores'])
+        losing = parse_scores(df['losing_team_scores'])
+        max_games = max(winning.games.shape[1], losing.games.shape[1])
+        if 'event_title' in df.columns:
+            event_titles = df['event_title'].fillna('').to_numpy(dtype=str)
+        else:
+            event_titles = np.full(len(df), '')
+
+        return cls(registry.players, match_date_sort_key(df['match_date_dt']), doubles,
+                   df['pts_diff'].to_numpy(dtype=np.int64), winning.padded(max_games), losing.padded(max_games),
+                   winning.n_games, registry.tsids, names.astype(str), event_titles, registry.dummy_tsid)
+
+    def save(self, path):
+        """
+        Write every column to its own .npy file in directory path
+
+        :param path: str or Path - directory
+        :return: None
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for c in ARRAY_COLUMNS:
+            np.save(path / f'{c}.npy', getattr(self, c))
+        with open(path / 'meta.json', 'w') as f:
+            json.dump({'version': STORE_VERSION, 'n_matches': len(self), 'dummy_tsid': self.dummy_tsid}, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """
+        Load a store written by save - columns are memory-mapped read only by default
+
+        :param path: str or Path - directory
+        :param mmap_mode: str - passed to np.load. Default 'r'
+        :return: MatchStore
+        """
+        path = Path(path)
+        with open(path / 'meta.json') as f:
+            meta = json.load(f)
+        columns = {c: np.load(path / f'{c}.npy', mmap_mode=mmap_mode) for c in ARRAY_COLUMNS}
+        return cls(dummy_tsid=meta['dummy_tsid'], **columns)
+
+    def match_dates(self):
+        """
+        :return: np.array (datetime64[ns]) - match_date_dt, NaT if missing
+        """
+        dates = np.asarray(self.dates).view('datetime64[ns]').copy()
+        dates[self.dates == NAT_SORT_KEY] = np.datetime64('NaT')
+        return dates
+
+    def player_names(self):
+        """
+        :return: np.array (object) - name per player index, nan if missing
+        """
+        names = np.asarray(self.names).astype(object)
+        names[names == ''] = np.nan
+        return names
+
+    def to_frame(self):
+        """
+        Results table with the columns ResultsTable uses: tsids, names, match_date_dt, Doubles and pts_diff, plus
+        event_title for slicing metrics and partitions
+
+        Each tsid keeps the first name it appeared with, so rows where a player's name was spelt differently read
+        back with that first spelling - the same name ResultsTable gives the Player.
+
+        :return: pd DataFrame
+        """
+        names = np.append(self.player_names(), np.nan)
+        tsids = np.append(self.tsids, np.nan)
+
+        # -1 (empty slot) picks the trailing nan
+        columns = {'match_date_dt': self.match_dates()}
+        for j, (t, n) in enumerate(zip(TSID_COLS, NAME_COLS)):
+            columns[n] = names[self.players[:, j]]
+            columns[t] = tsids[self.players[:, j]]
+        columns['Doubles'] = np.asarray(self.doubles)
+        columns['pts_diff'] = np.asarray(self.pts_diff)
+        event_titles = np.asarray(self.event_titles).astype(object)
+        event_titles[event_titles == ''] = np.nan
+        columns['event_title'] = event_titles
+        return pd.DataFrame(columns)
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """
+    sha256 hex digest of a file's contents
+    """
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_match_store(csv_file, cache_dir):
+    """
+    Memory-map the MatchStore of a raw results CSV, preprocessing it and caching the store on first use
+
+    The cache is keyed by a hash of the CSV contents, so edited files are preprocessed again.
+
+    :param csv_file: str or Path - raw tournament results
+    :param cache_dir: str or Path - directory holding cached stores
+    :return: MatchStore
+    """
+    cache_dir = Path(cache_dir)
+    path = cache_dir / f'{file_hash(csv_file)}_v{STORE_VERSION}'
+    if not (path / 'meta.json').exists():
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary directory first so an interrupted build is never picked up as a cache hit
+        tmp = Path(tempfile.mkdtemp(dir=cache_dir))
+        try:
+            MatchStore.from_df(preprocess_tour_data(csv_file)).save(tmp)
+            os.replace(tmp, path)
+        except OSError:
+            # Another process built the same store first
+            if not (path / 'meta.json').exists():
+                raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return MatchStore.load(path)
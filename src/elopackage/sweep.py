@@ -0,0 +1,150 @@
+import itertools
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from elopackage.engine import MatchArrays, RatingEngine
+from elopackage.metrics import accuracy, brier_score, log_loss
+from elopackage.player import DEFAULT_RATING, DEFAULT_KFACTOR, DEFAULT_SD
+from elopackage.results import ResultsTable
+
+PARAM_NAMES = ['kfactor', 'sd', 'mov', 'acf']
+DEFAULT_CONFIG = {'kfactor': None, 'sd': None, 'mov': False, 'acf': None}
+
+# Matches loaded by each worker process from the memory-mapped sweep data
+_worker_data = None
+
+
+class SweepData:
+    def __init__(self, matches, n_players):
+        """
+        Preprocessed match data shared by every configuration in a sweep
+
+        :param matches: MatchArrays - matches with interned player indices
+        :param n_players: int - number of interned players
+        """
+        self.matches = matches
+        self.n_players = n_players
+
+    @classmethod
+    def from_df(cls, df):
+        """
+        Register players and extract match arrays once from a preprocessed results table
+
+        :param df: pd DataFrame - output of preprocess_tour_data
+        :return: SweepData
+        """
+        results = ResultsTable(df)
+        registry = results.register_players()
+        matches = MatchArrays(registry.players, results.df['Doubles'].to_numpy(dtype=bool),
+                              results.df['pts_diff'].to_numpy(dtype=np.float64))
+        return cls(matches, len(registry))
+
+    def save(self, path):
+        """
+        Write the match arrays to .npy files in directory path so workers can memory-map them
+
+        :param path: str or Path - directory
+        :return: None
+        """
+        path = Path(path)
+        np.save(path / 'players.npy', self.matches.players)
+        np.save(path / 'doubles.npy', self.matches.doubles)
+        np.save(path / 'pts_diff.npy', self.matches.pts_diff)
+        np.save(path / 'n_players.npy', np.array([self.n_players]))
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """
+        Load match arrays saved with save - memory-mapped read only by default
+
+        :param path: str or Path - directory
+        :param mmap_mode: str - passed to np.load. Default 'r'
+        :return: SweepData
+        """
+        path = Path(path)
+        matches = MatchArrays(np.load(path / 'players.npy', mmap_mode=mmap_mode),
+                              np.load(path / 'doubles.npy', mmap_mode=mmap_mode),
+                              np.load(path / 'pts_diff.npy', mmap_mode=mmap_mode))
+        return cls(matches, int(np.load(path / 'n_players.npy')[0]))
+
+
+def param_grid(kfactor=(None,), sd=(None,), mov=(False,), acf=(None,)):
+    """
+    Cartesian product of parameter values
+
+    :return: list of dict - one dict per configuration, keys kfactor, sd, mov, acf
+    """
+    return [dict(zip(PARAM_NAMES, values)) for values in itertools.product(kfactor, sd, mov, acf)]
+
+
+def evaluate_config(data, kfactor=None, sd=None, mov=False, acf=None, cold_start_threshold=0):
+    """
+    Replay all matches from 1500 with one configuration and score the predictions
+
+    :param data: SweepData
+    :param kfactor: float - kfactor of every player
+    :param sd: float - sd of every player
+    :param mov: bool - Whether to include MOV in rating diff
+    :param acf: int - Auto-corr-factor in rating diff
+    :param cold_start_threshold: int - minimum rating history length of all players for a prediction to be scored
+    :return: dict - briers_score, accuracy, log_loss, n_predictions
+    """
+    engine = RatingEngine()
+    # Same truthiness as Player.__init__
+    engine.ratings = np.full(data.n_players, DEFAULT_RATING, dtype=np.float64)
+    engine.sds = np.full(data.n_players, sd if sd else DEFAULT_SD, dtype=np.float64)
+    engine.kfactors = np.full(data.n_players, kfactor if kfactor else DEFAULT_KFACTOR, dtype=np.float64)
+    engine.match_counts = np.zeros(data.n_players, dtype=np.int64)
+
+    output = engine.replay(data.matches, mov=mov, acf=acf)
+    scored = output['processed'] & (output['hist_len_min'] >= cold_start_threshold)
+    predictions = output['prediction'][scored]
+
+    # The winner is always the first team so the actual outcome is always 1
+    return {'briers_score': brier_score(predictions),
+            'accuracy': accuracy(predictions),
+            'log_loss': log_loss(predictions),
+            'n_predictions': len(predictions)}
+
+
+def _init_worker(path):
+    global _worker_data
+    _worker_data = SweepData.load(path)
+
+
+def _evaluate_worker(config, cold_start_threshold):
+    return evaluate_config(_worker_data, cold_start_threshold=cold_start_threshold, **config)
+
+
+def run_sweep(df, configs, max_workers=None, cold_start_threshold=0):
+    """
+    Evaluate many parameter configurations in parallel over the same preprocessed results
+
+    The match arrays are extracted once, written to a temporary directory and memory-mapped by each worker process,
+    rather than pickled to every worker.
+
+    :param df: pd DataFrame or SweepData - output of preprocess_tour_data, or data already prepared for sweeping
+    :param configs: list of dict - configurations with keys from kfactor, sd, mov, acf - see param_grid
+    :param max_workers: int - number of worker processes. 1 evaluates in this process. Default os.cpu_count()
+    :param cold_start_threshold: int - minimum rating history length of all players for a prediction to be scored
+    :return: pd DataFrame - one row per configuration: kfactor, sd, mov, acf, briers_score, accuracy, log_loss,
+                            n_predictions
+    """
+    data = df if isinstance(df, SweepData) else SweepData.from_df(df)
+    configs = [{**DEFAULT_CONFIG, **c} for c in configs]
+    if max_workers is None:
+        max_workers = os.cpu_count()
+
+    if max_workers == 1:
+        scores = [evaluate_config(data, cold_start_threshold=cold_start_threshold, **c) for c in configs]
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            data.save(tmp)
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(tmp,)) as pool:
+                scores = list(pool.map(_evaluate_worker, configs, itertools.repeat(cold_start_threshold),
+                                       chunksize=max(1, len(configs) // (4 * max_workers))))
+
+    return pd.DataFrame([{**c, **s} for c, s in zip(configs, scores)])
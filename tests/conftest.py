@@ -0,0 +1,74 @@
+import importlib.util
+import sys
+import warnings
+from pathlib import Path
+import numpy as np
+import pytest
+from elopackage.preprocess import preprocess_tour_data
+
+ROOT = Path(__file__).resolve().parents[1]
+SAMPLE_CSV = ROOT / 'player_tournament_results_2019_downsampled_15_prc.csv'
+
+
+def load_benchmark(name):
+    """
+    Import a module of benchmarks/, which is not a package
+    """
+    spec = importlib.util.spec_from_file_location(name, ROOT / 'benchmarks' / f'{name}.py')
+    module = importlib.util.module_from_spec(spec)
+    # Registered first, as the benchmarks import each other by module name
+    sys.modules.setdefault(name, module)
+    spec.loader.exec_module(module)
+    return module
+
+
+def preprocess_quietly(path):
+    # The sample file has malformed scores and unparseable dates on purpose - their warnings are tested separately
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        df = preprocess_tour_data(path)
+    df.attrs = {}
+    return df
+
+
+@pytest.fixture(scope='session')
+def sample_csv():
+    return SAMPLE_CSV
+
+
+@pytest.fixture(scope='session')
+def _results_df():
+    return preprocess_quietly(SAMPLE_CSV)
+
+
+@pytest.fixture
+def results_df(_results_df):
+    """
+    Preprocessed sample results - a fresh copy per test
+    """
+    return _results_df.copy()
+
+
+@pytest.fixture
+def dated_df(results_df):
+    """
+    Sample results with a match date
+    """
+    return results_df[results_df['match_date_dt'].notna()].reset_index(drop=True)
+
+
+@pytest.fixture
+def event_df(results_df):
+    """
+    Sample results with an event_title per match - the sample file has none
+    """
+    rng = np.random.default_rng(0)
+    n = len(results_df)
+    results_df['event_title'] = np.where(results_df['Doubles'], rng.choice(['MD', 'WD', 'XD'], n),
+                                         rng.choice(['MS', 'WS'], n))
+    return results_df
+
+
+@pytest.fixture(scope='session')
+def synthetic():
+    return load_benchmark('synthetic')
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from elopackage.batch import BradleyTerry
+from elopackage.predict import PredictionService
+from elopackage.results import ResultsTable
+
+
+def fitted_ratings(df, fit=None):
+    results = ResultsTable(df)
+    score = results.check_prediction(engine='batch', fit=fit)
+    return results, score, {t: p.rating for t, p in results.player_dict.items() if p.match_count}
+
+
+def test_fit_converges_and_scores_matches_with_the_fitted_ratings(results_df):
+    fit = BradleyTerry()
+    results, score, _ = fitted_ratings(results_df, fit)
+    assert fit.result.success
+    assert score < ResultsTable(results_df).check_prediction(engine='array')
+
+    service = PredictionService(results.engine)
+    row = results.df[~results.df['Doubles']].iloc[0]
+    assert row['prediction'] == pytest.approx(service.predict_one(row['winning_team_p1_tsid'],
+                                                                  row['losing_team_p1_tsid']), rel=1e-12)
+
+
+def test_fit_does_not_depend_on_match_order(results_df):
+    _, score, ratings = fitted_ratings(results_df)
+    shuffled = results_df.sample(frac=1, random_state=0).reset_index(drop=True)
+    _, shuffled_score, shuffled_ratings = fitted_ratings(shuffled)
+    assert shuffled_score == pytest.approx(score, rel=1e-6)
+    known = [t for t in ratings if t < 2000000]
+    np.testing.assert_allclose([shuffled_ratings[t] for t in known], [ratings[t] for t in known], atol=1e-3)
+
+
+def test_a_tighter_prior_shrinks_ratings(results_df):
+    _, _, wide = fitted_ratings(results_df, BradleyTerry(prior_sd=400))
+    _, _, narrow = fitted_ratings(results_df, BradleyTerry(prior_sd=50))
+    assert np.std(list(narrow.values())) < np.std(list(wide.values()))
+
+
+def test_half_life_weights_recent_matches():
+    dates = np.array(['2019-01-01', '2019-03-02', 'NaT'], dtype='datetime64[ns]')
+    np.testing.assert_allclose(BradleyTerry(half_life=60).weights(dates), [0.5, 1, 0.5])
+    assert BradleyTerry().weights(dates) is None
@@ -0,0 +1,23 @@
+import json
+import subprocess
+import sys
+import pandas as pd
+from tests.conftest import ROOT, preprocess_quietly
+
+
+def test_synthetic_results_have_the_sample_schema(synthetic, sample_csv, tmp_path):
+    df = synthetic.generate_results(2000, seed=3)
+    assert list(df.columns) == list(pd.read_csv(sample_csv, nrows=0).columns)
+    df.to_csv(tmp_path / 'results.csv', index=False)
+    cleaned = preprocess_quietly(tmp_path / 'results.csv')
+    assert 0.9 * len(df) < len(cleaned) <= len(df)
+    assert 0.25 < cleaned['Doubles'].mean() < 0.45
+
+
+def test_bench_pipeline_reports_every_stage(tmp_path):
+    out = tmp_path / 'bench.json'
+    subprocess.run([sys.executable, str(ROOT / 'benchmarks' / 'bench_pipeline.py'), '--rows', '300',
+                    '--max-python-rows', '300', '--no-memory', '--output', str(out)], check=True, capture_output=True)
+    records = json.loads(out.read_text())['results']
+    stages = {r['stage'] for r in records}
+    assert {'preprocess_tour_data', 'check_prediction[array]', 'check_prediction[python]'} <= stages
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+from elopackage.cli import Progress, main, run
+from elopackage.engine import RatingEngine
+from elopackage.preprocess import clean_tour_data
+
+# Raised by the reader thread, out of reach of pytest.warns
+pytestmark = pytest.mark.filterwarnings('ignore:.*match dates could not be parsed')
+
+
+def final_ratings(output_dir):
+    return pd.read_csv(output_dir / 'ratings.csv').set_index('tsid')['rating']
+
+
+@pytest.fixture
+def full_ingest(results_df):
+    engine = RatingEngine()
+    return engine, engine.ingest(results_df)
+
+
+def test_run_equals_a_full_ingest(sample_csv, full_ingest, tmp_path):
+    engine, rated = full_ingest
+    progress = Progress(stream=None)
+    with pytest.warns(UserWarning, match='without a match date were not rated'):
+        run([sample_csv], tmp_path, chunksize=97, queue_size=2, progress=progress)
+
+    predictions = pd.read_csv(tmp_path / 'predictions.csv')
+    np.testing.assert_allclose(predictions['prediction'], rated['prediction'], rtol=1e-12)
+    np.testing.assert_allclose(final_ratings(tmp_path).loc[engine.tsids].to_numpy(), engine.ratings, rtol=1e-12)
+    assert progress.rows_rated == progress.rows_written == len(rated)
+    assert progress.rows_read - progress.rows_rated == progress.rows_undated > 0
+    assert set(pd.read_csv(tmp_path / 'metrics.csv')['value'].dropna()) == {'singles', 'doubles'}
+
+
+def test_state_continues_where_the_last_run_stopped(sample_csv, full_ingest, tmp_path):
+    engine, _ = full_ingest
+    raw = pd.read_csv(sample_csv)
+    with pytest.warns(UserWarning):
+        dates = clean_tour_data(raw.copy())['match_date_dt'].reindex(raw.index)
+    cut = dates.dropna().sort_values().iloc[900]
+    raw[(dates <= cut).to_numpy()].to_csv(tmp_path / 'a.csv', index=False)
+    raw[~(dates <= cut).to_numpy()].to_csv(tmp_path / 'b.csv', index=False)
+
+    with pytest.warns(UserWarning):
+        run([tmp_path / 'a.csv'], tmp_path / 'first', progress=Progress(stream=None))
+        run([tmp_path / 'b.csv'], tmp_path / 'second', state=tmp_path / 'first' / 'state.npz',
+            progress=Progress(stream=None))
+        run([tmp_path / 'a.csv', tmp_path / 'b.csv'], tmp_path / 'both', chunksize=50, progress=Progress(stream=None))
+    for output in ['second', 'both']:
+        np.testing.assert_allclose(final_ratings(tmp_path / output).loc[engine.tsids].to_numpy(), engine.ratings,
+                                   rtol=1e-12)
+
+    # Everything was rated already
+    progress = Progress(stream=None)
+    with pytest.warns(UserWarning):
+        run([sample_csv], tmp_path / 'again', state=tmp_path / 'both' / 'state.npz', progress=progress)
+    assert progress.rows_rated == 0
+    assert progress.rows_already_rated == progress.rows_read - progress.rows_undated
+
+
+def test_reader_errors_are_raised(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        run([tmp_path / 'missing.csv'], tmp_path / 'out', progress=Progress(stream=None))
+
+
+def test_writer_errors_stop_the_run(sample_csv, tmp_path, monkeypatch):
+    chunks = []
+
+    def failing_to_csv(self, *args, **kwargs):
+        chunks.append(len(self))
+        if len(chunks) == 2:
+            raise OSError('disk full')
+        return original(self, *args, **kwargs)
+
+    original = pd.DataFrame.to_csv
+    monkeypatch.setattr(pd.DataFrame, 'to_csv', failing_to_csv)
+    progress = Progress(stream=None)
+    with pytest.raises(OSError, match='disk full'):
+        run([sample_csv], tmp_path, chunksize=50, queue_size=1, progress=progress)
+    assert progress.rows_written == chunks[0]
+    # Rating stops within a few chunks of the failure rather than running through the file
+    assert progress.rows_rated <= 5 * 50
+    assert not (tmp_path / 'ratings.csv').exists()
+
+
+def test_main_writes_outputs(sample_csv, tmp_path, capsys):
+    with pytest.warns(UserWarning):
+        assert main([str(sample_csv), '-o', str(tmp_path), '--mov', '--no-save-state', '-q']) == 0
+    assert {p.name for p in tmp_path.iterdir()} == {'predictions.csv', 'ratings.csv', 'metrics.csv'}
+    assert capsys.readouterr().err == ''
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+from elopackage.decay import InactivityDecay
+from elopackage.elo import Elo
+from elopackage.player import Player
+from elopackage.results import ResultsTable
+
+
+def test_no_growth_leaves_ratings_unchanged(results_df):
+    expected = ResultsTable(results_df).check_prediction(sd=300)
+    assert ResultsTable(results_df).check_prediction(sd=300, decay=InactivityDecay(growth=0)) == expected
+
+
+def test_sds_stay_within_the_bounds(results_df):
+    results = ResultsTable(results_df)
+    results.check_prediction(sd=300, decay=InactivityDecay(growth=30))
+    sd_min, sd_max = results.elo.decay.bounds()
+    assert (sd_min, sd_max) == (300, 450)
+    sds = [p.sd for p in results.player_dict.values() if p.match_count]
+    assert sd_min <= min(sds) and max(sds) <= sd_max
+
+
+def test_effective_sd_grows_with_inactivity_only_when_read():
+    decay = InactivityDecay(growth=15)
+    player = Player('a', 1, sd=400)
+    player.last_played = pd.Timestamp('2019-01-01')
+    assert decay.player_sd(player, '2019-04-11') == pytest.approx(np.sqrt(400 ** 2 + 15 ** 2 * 100))
+    assert decay.player_sd(player, '2030-01-01') == 600
+    assert player.sd == 400
+    sds = decay.effective_sd(np.array([400.0, 400.0]), np.array(['2019-01-01', 'NaT'], dtype='datetime64[ns]'),
+                             '2019-04-11')
+    np.testing.assert_allclose(sds, [np.sqrt(400 ** 2 + 15 ** 2 * 100), 400])
+
+
+def test_elo_reads_effective_sds_on_a_date():
+    elo = Elo('test')
+    elo.decay = InactivityDecay(growth=15)
+    a, b = Player('a', 1, rating=1600), Player('b', 2)
+    a.last_played = pd.Timestamp('2019-01-01')
+    assert elo.expected(a, b, '2019-01-01') == Elo('test').expected(a, b)
+    assert 0.5 < elo.expected(a, b, '2019-06-01') < Elo('test').expected(a, b)
+
+
+def test_decay_needs_the_python_engine(results_df):
+    with pytest.raises(ValueError):
+        ResultsTable(results_df).check_prediction(engine='array', decay=InactivityDecay())
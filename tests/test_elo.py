@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from elopackage.elo import Elo
+from elopackage.player import Player
+
+
+@pytest.fixture
+def players():
+    rng = np.random.default_rng(1)
+    return [Player(f'p{i}', i, rating=r, sd=s) for i, (r, s) in
+            enumerate(zip(rng.uniform(1000, 2000, 20), rng.uniform(200, 600, 20)))]
+
+
+def test_expected_batch_matches_expected(players):
+    elo = Elo('test')
+    a, b = players[:10], players[10:]
+    diff = [x.rating - y.rating for x, y in zip(a, b)]
+    got = elo.expected_batch(diff, np.array([x.sd for x in a]))
+    np.testing.assert_allclose(got, [elo.expected(x, y) for x, y in zip(a, b)], rtol=1e-14)
+
+
+def test_expected_rv_batch_matches_expected_rv(players):
+    elo = Elo('test')
+    a, b = players[:10], players[10:]
+    diff = [x.rating - y.rating for x, y in zip(a, b)]
+    got = elo.expected_rv_batch(diff, [x.sd for x in a], [y.sd for y in b])
+    np.testing.assert_allclose(got, [elo.expected_rv(x, y) for x, y in zip(a, b)], rtol=1e-12)
+
+
+def test_expected_table_indexes_the_rating_table(players):
+    elo = Elo('test')
+    ratings = np.array([p.rating for p in players])
+    sds = np.array([p.sd for p in players])
+    idx_a, idx_b = np.arange(10), np.arange(10, 20)[::-1]
+    np.testing.assert_allclose(elo.expected_table(idx_a, idx_b, ratings, sds),
+                               [elo.expected(players[i], players[j]) for i, j in zip(idx_a, idx_b)], rtol=1e-14)
+
+
+@pytest.mark.parametrize('mov, acf', [(None, None), (12, None), (12, 530)])
+def test_rating_diff_mov_batch_matches_rating_diff_mov(players, mov, acf):
+    elo = Elo('test')
+    a, b = players[:10], players[10:]
+    scores = np.tile([1, 0], 5)
+    diff = np.array([x.rating - y.rating for x, y in zip(a, b)])
+    got = elo.rating_diff_mov_batch(diff, [x.sd for x in a], [x.kfactor for x in a], scores,
+                                    mov=None if mov is None else np.full(10, mov), auto_corr_val=acf)
+    expected = [elo.rating_diff_mov(x, y, s, mov=mov, auto_corr_val=acf) for x, y, s in zip(a, b, scores)]
+    np.testing.assert_allclose(got, expected, rtol=1e-12)
+
+
+def test_rating_diff_mov_batch_rejects_invalid_scores():
+    with pytest.raises(ValueError):
+        Elo('test').rating_diff_mov_batch([0.0], 400, 180, [2])
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+from elopackage import kernels
+from elopackage.engine import RatingEngine
+from elopackage.evaluation import LEGACY_COLUMNS
+from elopackage.registry import DUMMY_TSID_START
+from elopackage.results import ResultsTable
+
+CONFIGS = [{}, {'mov': True}, {'mov': True, 'acf': 530, 'kfactor': 125, 'sd': 545}, {'acf': 2200}]
+BACKENDS = ['python', 'waves', 'parallel',
+            pytest.param('numba', marks=pytest.mark.skipif(not kernels.HAVE_NUMBA, reason='numba is not installed'))]
+
+
+def ratings_by_tsid(results):
+    return {t: (p.rating, p.match_count) for t, p in results.player_dict.items()}
+
+
+@pytest.mark.parametrize('config', CONFIGS)
+def test_array_engine_matches_python_engine(results_df, config):
+    python = ResultsTable(results_df)
+    array = ResultsTable(results_df)
+    assert array.check_prediction(engine='array', **config) == pytest.approx(
+        python.check_prediction(engine='python', **config), rel=1e-12)
+    pd.testing.assert_frame_equal(python.df, array.df, check_exact=False, rtol=1e-9)
+    assert list(python.player_dict) == list(array.player_dict)
+    for t, p in python.player_dict.items():
+        np.testing.assert_allclose(p.rating_history, array.player_dict[t].rating_history, rtol=1e-9)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('config', CONFIGS)
+def test_backends_give_identical_ratings_and_brier_score(results_df, backend, config):
+    reference = ResultsTable(results_df)
+    expected = reference.check_prediction(engine='array', backend='python', **config)
+    other = ResultsTable(results_df)
+    assert other.check_prediction(engine='array', backend=backend, **config) == expected
+    pd.testing.assert_frame_equal(reference.df, other.df, check_exact=True)
+    assert ratings_by_tsid(reference) == ratings_by_tsid(other)
+
+
+def test_unknown_backend_is_rejected(results_df):
+    with pytest.raises(ValueError, match='backend'):
+        ResultsTable(results_df).check_prediction(engine='array', backend='sharded')
+
+
+def test_incremental_ingest_equals_full_replay(dated_df, tmp_path):
+    full = ResultsTable(dated_df)
+    full.check_prediction(engine='array', mov=True)
+
+    cut = dated_df['match_date_dt'].iloc[len(dated_df) // 2]
+    first = dated_df[dated_df['match_date_dt'] <= cut]
+    engine = RatingEngine()
+    engine.ingest(first, mov=True)
+    engine.save(tmp_path / 'state.npz')
+    engine = RatingEngine.load(tmp_path / 'state.npz')
+    assert engine.high_water_mark == np.datetime64(cut, 'ns')
+    # Matches already rated are skipped, so the whole table can be passed again
+    out = engine.ingest(dated_df, mov=True)
+
+    assert len(out) == len(dated_df) - len(first)
+    np.testing.assert_allclose(out['prediction'].to_numpy(), full.df['prediction'].to_numpy()[len(first):],
+                               rtol=1e-12)
+    reference = full.to_engine()
+    for t in reference.tsids:
+        if t < DUMMY_TSID_START and t in engine.index:
+            assert engine.ratings[engine.index[t]] == pytest.approx(reference.ratings[reference.index[t]], rel=1e-12)
+
+
+def test_ingest_skips_undated_matches(results_df):
+    engine = RatingEngine()
+    out = engine.ingest(results_df)
+    assert len(out) == results_df['match_date_dt'].notna().sum()
+    assert list(out.columns[-len(LEGACY_COLUMNS):]) == LEGACY_COLUMNS
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+from elopackage.evaluation import LEGACY_COLUMNS
+from elopackage.results import ResultsTable
+
+
+@pytest.mark.parametrize('engine', ['python', 'array'])
+def test_eval_columns_none_adds_no_columns(results_df, engine):
+    full = ResultsTable(results_df)
+    light = ResultsTable(results_df)
+    assert light.check_prediction(engine=engine, eval_columns=None) == full.check_prediction(engine=engine)
+    assert list(light.df.columns) == list(results_df.columns)
+    assert list(full.df.columns) == list(results_df.columns) + LEGACY_COLUMNS
+
+
+@pytest.mark.parametrize('engine', ['python', 'array'])
+def test_selected_eval_columns_equal_the_full_columns(results_df, engine):
+    columns = ['prediction', 'p1w_rating_post']
+    full = ResultsTable(results_df)
+    full.check_prediction(engine=engine, mov=True)
+    selected = ResultsTable(results_df)
+    selected.check_prediction(engine=engine, mov=True, eval_columns=columns)
+    pd.testing.assert_frame_equal(selected.df[columns], full.df[columns])
+
+
+def test_typed_columns_need_the_array_engine(results_df):
+    with pytest.raises(ValueError):
+        ResultsTable(results_df).check_prediction(eval_columns=['p1w_idx'])
+
+
+def test_typed_columns_and_chunked_export(results_df, tmp_path):
+    results = ResultsTable(results_df)
+    score = results.check_prediction(engine='array', eval_columns=['prediction', 'p1w_idx'], eval_dtype=np.float32)
+    assert results.df['prediction'].dtype == np.float32
+    assert results.df['p1w_idx'].dtype == np.int32
+    assert results.evaluation.briers_score() == score
+
+    results.evaluation.to_csv(tmp_path / 'eval.csv', chunksize=500)
+    exported = pd.read_csv(tmp_path / 'eval.csv')
+    full = results.evaluation.to_frame()
+    assert len(exported) == len(full)
+    np.testing.assert_allclose(exported['prediction'], full['prediction'], rtol=1e-6)
+    assert (exported['p2w_idx'] == full['p2w_idx']).all()
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+from elopackage.history import RatingHistory
+from elopackage.registry import TSID_COLS
+from elopackage.results import ResultsTable
+
+AS_OF = pd.Timestamp('2019-06-01')
+
+
+def test_history_lengths_match_match_counts(results_df):
+    results = ResultsTable(results_df)
+    results.check_prediction()
+    lengths = results.history.history_lengths()
+    assert all(lengths[p.history_idx] == p.match_count + 1 for p in results.player_dict.values())
+
+
+def test_spilled_history_keeps_growing(tmp_path):
+    history = RatingHistory(capacity=2)
+    for i in range(3):
+        history.add_player(1500.0 + i)
+    history.spill(tmp_path)
+    history.extend(np.array([0, 1, 0]), np.array([0, 0, 1]), np.array([1510.0, 1491.0, 1503.0]),
+                   np.array(['2019-01-05', '2019-01-05', '2019-01-12'], dtype='datetime64[ns]'))
+    assert history.player_ratings(0).tolist() == [1500.0, 1510.0, 1503.0]
+    assert history.rating_as_of(0, '2019-01-06') == 1510.0
+    assert np.isnan(history.rating_as_of(2, '2030-01-01'))
+    assert (tmp_path / 'rating.bin').exists()
+
+
+@pytest.mark.parametrize('engine', ['python', 'array'])
+def test_ratings_as_of_equal_a_replay_truncated_at_that_date(results_df, engine):
+    results = ResultsTable(results_df)
+    results.check_prediction(engine=engine)
+    leaderboard = results.ratings_as_of(AS_OF).set_index('tsid')['rating']
+
+    # Temp tsids are written into results.df, so the truncated table keys players the same way
+    truncated = results.df[results.df['match_date_dt'] <= AS_OF][results_df.columns].reset_index(drop=True)
+    replay = ResultsTable(truncated)
+    replay.check_prediction(engine=engine)
+    played = {t for t in truncated[TSID_COLS].to_numpy().ravel() if t == t}
+
+    assert set(leaderboard.index) == played
+    np.testing.assert_allclose(leaderboard.to_numpy(), [replay.player_dict[t].rating for t in leaderboard.index],
+                               rtol=1e-12)
+    assert leaderboard.is_monotonic_decreasing
+
+
+def test_as_of_index_checkpoints_do_not_change_results(results_df):
+    results = ResultsTable(results_df)
+    results.check_prediction(engine='array')
+    history = results.history
+    dates = pd.date_range('2018-12-01', '2020-01-01', freq='17D')
+    expected = [history.as_of_index(checkpoint_every=10 ** 9).ratings_as_of(d) for d in dates]
+    index = history.as_of_index(checkpoint_every=50)
+    for d, e in zip(dates, expected):
+        np.testing.assert_array_equal(index.ratings_as_of(d), e)
+    p = next(iter(results.player_dict.values())).history_idx
+    assert [index.rating_as_of(p, d) for d in dates] == pytest.approx([e[p] for e in expected], nan_ok=True)
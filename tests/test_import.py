@@ -0,0 +1,35 @@
+import os
+import subprocess
+import sys
+import pytest
+from tests.conftest import load_benchmark
+
+bench_import = load_benchmark('bench_import')
+
+
+@pytest.mark.parametrize('module', list(bench_import.ALLOWED))
+def test_core_modules_load_only_allowed_dependencies(module):
+    optional = bench_import.optional_dependencies()
+    result = bench_import.measure(module, repeat=1, optional=optional)
+    assert result['unexpected'] == []
+
+
+def test_engine_import_does_not_load_pandas():
+    code = 'import sys, elopackage.engine; print("pandas" in sys.modules)'
+    out = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+    assert out.strip() == 'False'
+
+
+def test_plotting_is_loaded_on_first_plot():
+    code = ('import sys, elopackage.player, elopackage.results; '
+            'print("matplotlib" in sys.modules, "elopackage.plotting" in sys.modules)')
+    out = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+    assert out.split() == ['False', 'False']
+
+
+def test_plots_still_draw(tmp_path):
+    code = ('import sys; from elopackage.player import Player; p = Player("a", 1); p.update_rating(10); '
+            'fig = p.visualize_rating_hist(); print(type(fig).__name__, "elopackage.plotting" in sys.modules)')
+    out = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True,
+                         env={**os.environ, 'MPLBACKEND': 'Agg', 'MPLCONFIGDIR': str(tmp_path)}).stdout
+    assert out.split() == ['Figure', 'True']
@@ -0,0 +1,40 @@
+import pytest
+from elopackage.instrumentation import Instrumentation
+from elopackage.results import ResultsTable
+
+
+@pytest.mark.parametrize('engine', ['python', 'array'])
+def test_check_prediction_reports_stages_and_counters(results_df, engine):
+    events = []
+    inst = Instrumentation(sink=lambda kind, name, value: events.append((kind, name)))
+    results = ResultsTable(results_df, instrumentation=inst)
+    results.check_prediction(engine=engine)
+    report = inst.report()
+
+    counters = report['counters']
+    assert counters['matches_processed'] + counters.get('matches_skipped', 0) == len(results_df)
+    assert counters['new_players'] == len(results.player_dict) - 1
+    assert {'register_players', 'eval_cols'} <= set(report['timers'])
+    assert ('timer', 'register_players') in events
+    assert ('counter', 'matches_processed') in events
+
+
+def test_engines_count_the_same(results_df):
+    counters = []
+    for engine in ['python', 'array']:
+        inst = Instrumentation()
+        ResultsTable(results_df, instrumentation=inst).check_prediction(engine=engine)
+        # The python engine only reports counters it incremented
+        counters.append({k: v for k, v in inst.report()['counters'].items() if v and k != 'predictions_scored'})
+    assert counters[0] == counters[1]
+
+
+def test_stage_times_a_block():
+    inst = Instrumentation()
+    with inst.stage('work'):
+        sum(range(1000))
+    inst.count('items', 3)
+    assert inst.report()['timers']['work'] > 0
+    assert inst.report()['counters'] == {'items': 3}
+    inst.reset()
+    assert inst.report() == {'timers': {}, 'counters': {}}
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+from elopackage.metrics import (Accuracy, BrierScore, Calibration, LogLoss, Metric, MetricSet, Rolling,
+                                TimeWindowed, accuracy, brier_score, log_loss)
+from elopackage.results import ResultsTable
+
+
+def metric_set():
+    return MetricSet([BrierScore(), LogLoss(), Accuracy(), Calibration(), Rolling(BrierScore(), 500),
+                      TimeWindowed(BrierScore(), 'M')], by=['match_type', 'event_title'])
+
+
+@pytest.mark.parametrize('cold_start_threshold', [0, 3])
+def test_python_and_array_metric_sets_agree(event_df, cold_start_threshold):
+    metrics = {}
+    for engine in ['python', 'array']:
+        results = ResultsTable(event_df)
+        results.cold_start_threshold = cold_start_threshold
+        metrics[engine] = metric_set()
+        score = results.check_prediction(engine=engine, mov=True, acf=530, metrics=metrics[engine])
+        assert metrics[engine].results().loc[('all', np.nan), 'briers_score'] == pytest.approx(score, rel=1e-12)
+
+    python, array = metrics['python'], metrics['array']
+    pd.testing.assert_frame_equal(python.results(), array.results(), check_exact=False, rtol=1e-12)
+    for key in python.slices:
+        p, a = python.metrics(key), array.metrics(key)
+        pd.testing.assert_frame_equal(p[3].result(), a[3].result())
+        assert p[4].result() == pytest.approx(a[4].result(), rel=1e-12)
+        pd.testing.assert_series_equal(p[5].result(), a[5].result(), rtol=1e-12)
+
+
+def test_cold_start_threshold_follows_the_results_table(results_df):
+    results = ResultsTable(results_df)
+    results.cold_start_threshold = 3
+    metrics = MetricSet()
+    score = results.check_prediction(engine='array', metrics=metrics)
+    assert metrics.cold_start_threshold == 3
+    output = results.evaluation.output
+    scored = output['processed'] & (output['hist_len_min'] >= 3)
+    assert 0 < scored.sum() < len(results_df)
+    assert metrics.results()['n_predictions'].iloc[0] == scored.sum()
+    assert score == pytest.approx(brier_score(output['prediction'][scored]), rel=1e-12)
+
+
+@pytest.mark.parametrize('metric, function', [(BrierScore, brier_score), (LogLoss, log_loss), (Accuracy, accuracy)])
+def test_streaming_metrics_equal_post_hoc_functions(metric, function):
+    rng = np.random.default_rng(0)
+    predictions, actual = rng.uniform(0.01, 0.99, 1000), rng.integers(0, 2, 1000)
+    one_by_one, batched = metric(), metric()
+    for p, a in zip(predictions, actual):
+        one_by_one.update(p, a)
+    batched.update_batch(predictions[:400], actual[:400])
+    batched.update_batch(predictions[400:], actual[400:])
+    assert one_by_one.result() == pytest.approx(function(predictions, actual), rel=1e-12)
+    assert batched.result() == pytest.approx(function(predictions, actual), rel=1e-12)
+
+
+def test_rolling_keeps_only_the_window():
+    predictions = np.random.default_rng(0).uniform(size=5000)
+    one_by_one, batched = Rolling(BrierScore(), 100), Rolling(BrierScore(), 100)
+    for p in predictions:
+        one_by_one.update(p)
+    batched.update_batch(predictions)
+    expected = brier_score(predictions[-100:])
+    assert one_by_one.result() == pytest.approx(expected, rel=1e-9)
+    assert batched.result() == pytest.approx(expected, rel=1e-12)
+    assert Rolling.series(BrierScore(), predictions, window=100)[-1] == pytest.approx(expected, rel=1e-12)
+
+
+def test_calibration_bins_predictions():
+    calibration = Calibration(n_bins=4, symmetric=False)
+    calibration.update_batch(np.array([0.1, 0.2, 0.6, 0.9, 0.95]), np.array([0, 1, 1, 1, 0]))
+    table = calibration.result()
+    assert table['count'].tolist() == [2, 0, 1, 2]
+    assert table['observed_rate'].tolist()[::3] == [0.5, 0.5]
+
+
+def test_metric_subclasses_must_define_their_loss():
+    class Incomplete(Metric):
+        def loss(self, prediction, actual):
+            return 0.0
+
+    with pytest.raises(TypeError):
+        Incomplete()
+    with pytest.raises(TypeError):
+        Metric()
+
+
+def test_slicing_by_a_missing_column_raises(results_df):
+    with pytest.raises(KeyError, match='event_title'):
+        ResultsTable(results_df).check_prediction(engine='array', metrics=MetricSet(by=['event_title']))
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+from elopackage.results import ResultsTable
+
+
+# The five matches without an event_title are all cold starts, so their separate run scores no predictions
+@pytest.mark.filterwarnings('ignore:Mean of empty slice', 'ignore:invalid value encountered')
+@pytest.mark.parametrize('backend', ['python', 'waves', 'parallel'])
+def test_each_partition_equals_a_run_on_that_category(event_df, backend):
+    event_df.loc[event_df.index[:5], 'event_title'] = np.nan
+    snapshot = event_df.copy()
+    results = ResultsTable(event_df)
+    results.cold_start_threshold = 2
+    partitions = results.rate_partitions(mov=True, acf=530, backend=backend, max_workers=2)
+    pd.testing.assert_frame_equal(results.df, snapshot)
+
+    assert len(partitions) == 6
+    for key in partitions.keys:
+        rows = event_df['event_title'].isna() if key != key else event_df['event_title'] == key
+        separate = ResultsTable(event_df[rows])
+        separate.cold_start_threshold = 2
+        score = separate.check_prediction(engine='array', mov=True, acf=530, eval_columns=None)
+        expected = sorted((p.rating for p in separate.player_dict.values() if p.match_count), reverse=True)
+        np.testing.assert_array_equal(partitions.ratings(key)['rating'].to_numpy(), expected)
+        if key == key:
+            assert partitions.results().loc[key, 'briers_score'] == pytest.approx(score, rel=1e-12)
+
+
+def test_partition_column_must_exist(results_df):
+    with pytest.raises(KeyError, match='event_title'):
+        ResultsTable(results_df).rate_partitions()
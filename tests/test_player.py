@@ -0,0 +1,27 @@
+from elopackage.history import RatingHistory
+from elopackage.player import Player, Team
+from elopackage.results import ResultsTable
+
+
+def test_player_has_no_instance_dict():
+    assert not hasattr(Player('a', 1), '__dict__')
+    assert not hasattr(Team(Player('a', 1), Player('b', 2)), '__dict__')
+
+
+def test_team_follows_its_players():
+    p1, p2 = Player('a', 1, rating=1600, sd=300), Player('b', 2, rating=1400)
+    team = Team(p1, p2)
+    single = ResultsTable.convert_double_to_single(p1, p2)
+    assert (team.rating, team.sd, team.kfactor) == (single.rating, single.sd, single.kfactor)
+    p1.update_rating(20)
+    assert team.rating == 1510
+
+
+def test_rating_history_is_a_list_with_or_without_a_shared_store():
+    own = Player('a', 1)
+    shared = Player('b', 2, history=RatingHistory())
+    for p in (own, shared):
+        p.update_rating(10)
+        p.update_rating(-5)
+        assert p.rating_history == [1500, 1510, 1505]
+        assert isinstance(p.rating_history, list)
@@ -0,0 +1,82 @@
+import asyncio
+import numpy as np
+import pytest
+from elopackage.elo import Elo
+from elopackage.player import Player, Team
+from elopackage.predict import PredictionService
+from elopackage.results import ResultsTable
+
+
+@pytest.fixture
+def rated(dated_df):
+    """
+    Results table rated on the first half of the dated matches, and the second half
+    """
+    cut = dated_df['match_date_dt'].quantile(0.5)
+    results = ResultsTable(dated_df[dated_df['match_date_dt'] <= cut])
+    results.check_prediction(engine='array')
+    return results, dated_df[dated_df['match_date_dt'] > cut]
+
+
+def matchups(player_dict):
+    tsids = list(player_dict)[1:60]
+    singles = [(tsids[i], tsids[i + 1]) for i in range(20)]
+    doubles = [((tsids[i], tsids[i + 2]), (tsids[i + 3], tsids[i + 5])) for i in range(20)]
+    return singles, doubles
+
+
+@pytest.mark.parametrize('rv', [False, True])
+def test_predictions_equal_elo(rated, rv):
+    results, _ = rated
+    players = results.player_dict
+    singles, doubles = matchups(players)
+    elo = Elo('test')
+    expected_fn = elo.expected_rv if rv else elo.expected
+    expected = ([expected_fn(players[a], players[b]) for a, b in singles] +
+                [expected_fn(Team(players[a[0]], players[a[1]]), Team(players[b[0]], players[b[1]]))
+                 for a, b in doubles])
+    service = PredictionService(results.to_engine(), rv=rv)
+    np.testing.assert_allclose(service.predict(singles + doubles), expected, rtol=1e-12)
+
+
+def test_unknown_players_are_rated_as_new_players(rated):
+    results, _ = rated
+    known = next(t for t, p in results.player_dict.items() if p.match_count)
+    service = PredictionService(results.to_engine())
+    assert service.predict_one(known, -1.0) == Elo('test').expected(results.player_dict[known], Player('new', -1.0))
+
+
+def test_cache_hits_and_bounded_size(rated):
+    results, _ = rated
+    singles, doubles = matchups(results.player_dict)
+    service = PredictionService(results.to_engine(), maxsize=10)
+    first = service.predict(singles)
+    assert len(service) == 10
+    np.testing.assert_array_equal(service.predict(singles[-10:]), first[-10:])
+    assert service.hits == 10
+
+
+def test_refresh_evicts_changed_players_only(rated):
+    results, later = rated
+    singles, doubles = matchups(results.player_dict)
+    queries = singles + doubles
+    engine = results.to_engine()
+    service = PredictionService(engine)
+    service.predict(queries)
+    engine.ingest(later)
+    changed = service.refresh(engine)
+    assert 0 < changed < len(engine)
+    np.testing.assert_array_equal(service.predict(queries), PredictionService(engine).predict(queries))
+    assert service.hits > 0
+
+
+def test_predict_async_batches_concurrent_queries(rated):
+    results, _ = rated
+    singles, doubles = matchups(results.player_dict)
+    queries = singles + doubles
+    service = PredictionService(results.to_engine())
+
+    async def query():
+        return await asyncio.gather(*[service.predict_async(a, b) for a, b in queries])
+
+    np.testing.assert_array_equal(asyncio.run(query()), PredictionService(results.to_engine()).predict(queries))
@@ -0,0 +1,85 @@
+import warnings
+from ast import literal_eval
+import numpy as np
+import pandas as pd
+import pytest
+from elopackage.preprocess import (DateParser, clean_tour_data, convert_scores_literal, iter_preprocess_tour_data,
+                                   parse_scores)
+from tests.conftest import preprocess_quietly
+
+
+def test_parse_scores_matches_literal_eval():
+    scores = pd.Series(['[21, 15]', '[21,19, 21]', '[ 7 ]', '[]', '[21, 15,]', '[-1, 21]', 'n/a', '[21, x]', '21'])
+    parsed = parse_scores(scores)
+    expected = [convert_scores_literal(s) for s in scores]
+    expected = [e if isinstance(e, list) else None for e in expected]
+    assert parsed.to_lists() == expected
+    assert parsed.malformed.tolist() == [e is None for e in expected]
+
+
+def test_clean_tour_data_drops_missing_and_malformed_scores():
+    raw = pd.DataFrame({'match_date': ['Sat 12/01/2019'] * 5,
+                        'winning_team_scores': ['[21, 21]', np.nan, 'n/a', '[21, x]', '[21, 21]'],
+                        'losing_team_scores': ['[15, 19]', '[10]', '[10]', '[10, 10]', '[10]'],
+                        'losing_team_p2': [np.nan] * 5})
+    with pytest.warns(UserWarning, match='Dropped 2 matches with malformed scores'):
+        df = clean_tour_data(raw)
+    assert df.index.tolist() == [0]
+    assert df.attrs['malformed_scores'].index.tolist() == [3, 4]
+    assert df['pts_diff'].dtype == np.int64
+    assert df['pts_diff'].tolist() == [8]
+    assert df['gme_pts_diff'].iloc[0].tolist() == [6, 2]
+
+
+def test_preprocess_scores_match_literal_eval(results_df):
+    winning = results_df['winning_team_scores_lst'].tolist()
+    losing = results_df['losing_team_scores_lst'].tolist()
+    assert winning == [literal_eval(s) for s in results_df['winning_team_scores']]
+    assert results_df['pts_diff'].tolist() == [sum(w) - sum(l) for w, l in zip(winning, losing)]
+
+
+def test_date_parser_matches_to_datetime(sample_csv):
+    raw = pd.read_csv(sample_csv)
+    dates, unparsed = DateParser().parse(raw['match_date'])
+    expected = pd.to_datetime(raw['match_date'], format='%a %d/%m/%Y', errors='coerce')
+    pd.testing.assert_series_equal(dates, expected.astype('datetime64[ns]'), check_names=False)
+    assert unparsed.tolist() == (expected.isna() & raw['match_date'].notna()).tolist()
+
+
+def test_preprocess_sorts_by_date_with_undated_matches_last(results_df):
+    dates = results_df['match_date_dt']
+    n_dated = dates.notna().sum()
+    assert dates.iloc[:n_dated].is_monotonic_increasing
+    assert dates.iloc[n_dated:].isna().all()
+
+
+@pytest.mark.parametrize('chunksize', [97, 100000])
+def test_iter_preprocess_equals_preprocess(sample_csv, results_df, chunksize):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        batches = list(iter_preprocess_tour_data(sample_csv, chunksize=chunksize))
+    assert max(len(b) for b in batches) <= chunksize
+    streamed = pd.concat(batches)
+    streamed.attrs = {}
+    pd.testing.assert_frame_equal(streamed, results_df)
+
+
+def test_iter_preprocess_multi_pass_merge_equals_preprocess(synthetic, tmp_path):
+    path = tmp_path / 'results.csv'
+    synthetic.generate_results(20000).to_csv(path, index=False)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        # 4096 row reads give 5 runs, merged two at a time
+        streamed = pd.concat(list(iter_preprocess_tour_data(path, chunksize=1000, max_runs=2, tmp_dir=tmp_path)))
+    streamed.attrs = {}
+    pd.testing.assert_frame_equal(streamed, preprocess_quietly(path))
+    assert [p.name for p in tmp_path.iterdir()] == ['results.csv']
+
+
+def test_clean_tour_data_reports_unparsed_dates():
+    raw = pd.DataFrame({'match_date': ['Sat 12/01/2019', 'TBC'], 'winning_team_scores': ['[21]', '[21]'],
+                        'losing_team_scores': ['[10]', '[12]'], 'losing_team_p2': [np.nan, np.nan]})
+    with pytest.warns(UserWarning, match='1 match dates could not be parsed'):
+        df = clean_tour_data(raw)
+    assert df.attrs['unparsed_dates']['match_date'].tolist() == ['TBC']
+    assert df['match_date_dt'].isna().tolist() == [False, True]
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+from elopackage.registry import build_player_registry
+from elopackage.results import ResultsTable
+
+
+def test_register_players_matches_the_row_by_row_scan(results_df):
+    scanned = ResultsTable(results_df)
+    for row in scanned.df.itertuples():
+        scanned.add_players_to_dict(row, scanned.df)
+    registered = ResultsTable(results_df)
+    registered.register_players()
+
+    pd.testing.assert_frame_equal(registered.df, scanned.df)
+    assert list(registered.player_dict) == list(scanned.player_dict)
+    assert registered.dummy_tsid == scanned.dummy_tsid
+    # Series.equals treats missing names as equal
+    assert pd.Series([p.name for p in registered.player_dict.values()]).equals(
+        pd.Series([p.name for p in scanned.player_dict.values()]))
+
+
+def test_known_players_keep_their_index(results_df):
+    first = build_player_registry(results_df.head(500).copy())
+    known = first.tsids.tolist()
+    registry = build_player_registry(results_df.copy(), known=known, dummy_tsid=first.dummy_tsid,
+                                     known_names=first.names)
+    np.testing.assert_array_equal(registry.tsids[:len(known)], known)
+    assert registry.n_known == len(known)
+    assert len(registry.new_players()) == len(registry) - len(known)
+    # p2 slots are only filled for doubles
+    doubles = results_df['Doubles'].to_numpy()
+    np.testing.assert_array_equal(registry.players >= 0, np.column_stack([np.ones_like(doubles), doubles] * 2))
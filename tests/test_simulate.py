@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+from elopackage.predict import PredictionService
+from elopackage.results import ResultsTable
+from elopackage.simulate import TournamentSimulator, seeded_draw
+
+
+@pytest.fixture(scope='module')
+def engine_and_top(_results_df):
+    results = ResultsTable(_results_df)
+    results.check_prediction(engine='array', eval_columns=None)
+    return results.to_engine(), results.ratings_as_of('2030-01-01')['tsid'].head(8).tolist()
+
+
+def test_seeded_draw():
+    assert seeded_draw(8).tolist() == [0, 7, 3, 4, 1, 6, 2, 5]
+    # Byes go to the top seeds
+    assert seeded_draw(3).tolist() == [0, -1, 1, 2]
+
+
+def test_two_team_knockout_is_one_match(engine_and_top):
+    engine, top = engine_and_top
+    forecast = TournamentSimulator(engine, top[:2]).knockout(n_sims=200000, seed=0)
+    p = PredictionService(engine).predict_one(top[0], top[1])
+    assert forecast['title'].iloc[0] == pytest.approx(p, abs=0.005)
+    assert forecast['title'].sum() == pytest.approx(1)
+
+
+def test_knockout_probabilities_are_consistent(engine_and_top):
+    engine, top = engine_and_top
+    forecast = TournamentSimulator(engine, top).knockout(n_sims=20000, seed=1)
+    assert forecast['title'].sum() == pytest.approx(1)
+    assert forecast['final'].sum() == pytest.approx(2)
+    assert (forecast['last_4'] >= forecast['final']).all() and (forecast['final'] >= forecast['title']).all()
+    assert forecast['title'].iloc[0] > forecast['title'].iloc[-1]
+
+
+def test_knockout_with_byes(engine_and_top):
+    engine, top = engine_and_top
+    forecast = TournamentSimulator(engine, top[:3]).knockout(n_sims=10000, seed=0)
+    # The top seed has a bye into the final
+    assert forecast['final'].iloc[0] == 1
+    assert forecast['title'].sum() == pytest.approx(1)
+
+
+@pytest.mark.parametrize('draw', [[0, 1, 2], [0, 1, -1, -1]])
+def test_knockout_rejects_invalid_draws(engine_and_top, draw):
+    engine, top = engine_and_top
+    with pytest.raises(ValueError):
+        TournamentSimulator(engine, top[:3]).knockout(draw=draw, n_sims=10)
+
+
+def test_round_robin_positions_sum_to_one(engine_and_top):
+    engine, top = engine_and_top
+    forecast = TournamentSimulator(engine, top[:5]).round_robin(n_sims=5000, seed=1, n_legs=2)
+    positions = forecast.filter(like='position_')
+    np.testing.assert_allclose(positions.sum(axis=0), 1)
+    np.testing.assert_allclose(positions.sum(axis=1), 1)
+    assert forecast['title'].sum() == pytest.approx(1)
+
+
+def test_seeded_forecasts_are_reproducible_across_workers(engine_and_top):
+    engine, top = engine_and_top
+    simulator = TournamentSimulator(engine, top)
+    serial = simulator.knockout(n_sims=20000, seed=5, batch_size=5000)
+    parallel = simulator.knockout(n_sims=20000, seed=5, batch_size=5000, max_workers=2)
+    pd.testing.assert_frame_equal(serial, parallel)
+
+
+def test_invalid_simulation_counts_are_rejected(engine_and_top):
+    engine, top = engine_and_top
+    with pytest.raises(ValueError):
+        TournamentSimulator(engine, top).knockout(n_sims=0)
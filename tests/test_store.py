@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+from elopackage import store as store_module
+from elopackage.metrics import MetricSet
+from elopackage.results import ResultsTable
+from elopackage.store import MatchStore, load_match_store
+from tests.conftest import preprocess_quietly
+
+
+@pytest.fixture
+def event_csv(sample_csv, tmp_path):
+    raw = pd.read_csv(sample_csv)
+    raw['event_title'] = np.where(raw['losing_team_p2'].isna(), 'MS', 'MD')
+    path = tmp_path / 'results.csv'
+    raw.to_csv(path, index=False)
+    return path
+
+
+def test_match_store_round_trips(results_df, tmp_path):
+    store = MatchStore.from_df(results_df)
+    store.save(tmp_path / 'store')
+    loaded = MatchStore.load(tmp_path / 'store')
+    assert isinstance(loaded.players, np.memmap)
+    pd.testing.assert_frame_equal(loaded.to_frame(), store.to_frame())
+
+
+@pytest.mark.parametrize('engine', ['python', 'array'])
+def test_results_from_store_equal_results_from_df(event_csv, tmp_path, engine):
+    df = preprocess_quietly(event_csv)
+    with pytest.warns(UserWarning):
+        store = load_match_store(event_csv, tmp_path / 'cache')
+    expected, got = MetricSet(by=['event_title']), MetricSet(by=['event_title'])
+    assert (ResultsTable.from_store(store).check_prediction(engine=engine, metrics=got) ==
+            ResultsTable(df).check_prediction(engine=engine, metrics=expected))
+    pd.testing.assert_frame_equal(got.results(), expected.results())
+
+
+def test_store_is_cached_by_file_contents(event_csv, tmp_path, monkeypatch):
+    cache = tmp_path / 'cache'
+    with pytest.warns(UserWarning):
+        first = load_match_store(event_csv, cache)
+
+    def fail(path):
+        raise AssertionError('cached store was preprocessed again')
+
+    monkeypatch.setattr(store_module, 'preprocess_tour_data', fail)
+    again = load_match_store(event_csv, cache)
+    np.testing.assert_array_equal(again.players, first.players)
+
+    with open(event_csv, 'a') as f:
+        f.write(',,,,[1],Sat 12/01/2019,Someone,1.0,,,[21],MS\n')
+    with pytest.raises(AssertionError, match='preprocessed again'):
+        load_match_store(event_csv, cache)
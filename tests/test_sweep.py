@@ -0,0 +1,28 @@
+import pandas as pd
+import pytest
+from elopackage.results import ResultsTable
+from elopackage.sweep import SweepData, param_grid, run_sweep
+
+
+def test_param_grid_is_the_cartesian_product():
+    grid = param_grid(kfactor=(100, 180), mov=(False, True))
+    assert len(grid) == 4
+    assert grid[1] == {'kfactor': 100, 'sd': None, 'mov': True, 'acf': None}
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_sweep_scores_equal_check_prediction(results_df, max_workers):
+    configs = param_grid(kfactor=(None, 125), mov=(False, True), acf=(None, 530))
+    scores = run_sweep(results_df, configs, max_workers=max_workers, cold_start_threshold=2)
+    for config, score in zip(configs, scores['briers_score']):
+        results = ResultsTable(results_df)
+        results.cold_start_threshold = 2
+        assert score == pytest.approx(results.check_prediction(engine='array', **config), rel=1e-12)
+
+
+def test_sweep_data_round_trips(results_df, tmp_path):
+    data = SweepData.from_df(results_df)
+    data.save(tmp_path)
+    configs = param_grid(sd=(300, 500))
+    pd.testing.assert_frame_equal(run_sweep(data, configs, max_workers=1),
+                                  run_sweep(SweepData.load(tmp_path), configs, max_workers=1))